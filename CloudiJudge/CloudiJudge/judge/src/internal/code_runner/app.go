@@ -5,23 +5,84 @@ import (
 	"log"
 	"os"
 	"strconv"
+	"time"
 
 	"github.com/gofiber/fiber/v2"
+	"github.com/gofiber/fiber/v2/middleware/pprof"
 )
 
 var queueManager *QueueManager
 
+var callbackURL = "http://judge:80/code/callback"
+
+var callbackBatches *callbackBatcher // nil posts every verdict on its own
+
 func StartListening(port int) {
 	maxConcurrent, err := strconv.Atoi(os.Getenv("MAX_CONCURRENT_RUNS"))
 	if err != nil {
 		fmt.Println("invalid MAX_CONCURRENT_RUNS value, use 10 as default value")
 		maxConcurrent = 10
 	}
-	queueManager = NewQueueManager(maxConcurrent)
+	if url := os.Getenv("JUDGE_CALLBACK_URL"); url != "" {
+		callbackURL = url
+	}
+	batchWindow := defaultBatchWindow
+	if ms, err := strconv.Atoi(os.Getenv("CALLBACK_BATCH_MS")); err == nil {
+		batchWindow = time.Duration(ms) * time.Millisecond
+	}
+	if batchWindow > 0 {
+		callbackBatches = newCallbackBatcher(batchWindow, defaultBatchSize)
+	}
+	var sandboxes *SandboxPool
+	if os.Getenv("SANDBOX_POOL") != "false" {
+		maxUses, err := strconv.Atoi(os.Getenv("SANDBOX_MAX_USES"))
+		if err != nil || maxUses < 1 {
+			maxUses = defaultMaxUses
+		}
+		// Every run slot gets a started sandbox before the runner accepts runs
+		sandboxes, err = NewSandboxPool(maxConcurrent, maxUses, defaultHealthEvery)
+		if err != nil {
+			log.Fatalf("Error starting sandbox pool: %v", err)
+		}
+		fmt.Printf("%d sandboxes ready, each recycled after %d runs\n", maxConcurrent, maxUses)
+		sandboxes.cache = newCompileCache(sandboxes)
+	}
+	queueManager = NewQueueManager(maxConcurrent, sandboxes)
 	app := fiber.New(fiber.Config{})
+	if os.Getenv("PPROF_ENABLED") == "true" {
+		app.Use(pprof.New())
+	}
 
 	app.Post("/run", runCodeView)
+	app.Get("/status", statusView)
+	app.Get("/stats", statsView)
 
 	log.Fatal(app.Listen(fmt.Sprintf(":%d", port)))
 
 }
+
+// newCompileCache is configured by COMPILE_CACHE_MB (0 disables it) and COMPILE_CACHE_DIR
+func newCompileCache(sandboxes *SandboxPool) *CompileCache {
+	cacheMb, err := strconv.Atoi(os.Getenv("COMPILE_CACHE_MB"))
+	if err != nil {
+		cacheMb = defaultCacheMb
+	}
+	if cacheMb <= 0 {
+		return nil
+	}
+	dir := os.Getenv("COMPILE_CACHE_DIR")
+	if dir == "" {
+		dir = defaultCacheDir
+	}
+	toolchain, err := sandboxes.ImageID()
+	if err != nil {
+		fmt.Printf("Error inspecting go-code-runner image, compile cache disabled: %v\n", err)
+		return nil
+	}
+	cache, err := NewCompileCache(dir, int64(cacheMb)*1024*1024, toolchain)
+	if err != nil {
+		fmt.Printf("Error opening compile cache, compile cache disabled: %v\n", err)
+		return nil
+	}
+	return cache
+}
@@ -0,0 +1,76 @@
+package code_runner
+
+import (
+	"bytes"
+	"encoding/json"
+	"fmt"
+	"net/http"
+	"time"
+)
+
+const (
+	defaultBatchWindow = 50 * time.Millisecond
+	defaultBatchSize   = 100
+)
+
+// callbackBatcher collects verdicts finished within a window and posts them to the
+// judge's /code/callback/batch in one request
+type callbackBatcher struct {
+	results chan ResultData
+	window  time.Duration
+	size    int
+}
+
+func newCallbackBatcher(window time.Duration, size int) *callbackBatcher {
+	b := &callbackBatcher{
+		results: make(chan ResultData, size),
+		window:  window,
+		size:    size,
+	}
+	go b.run()
+	return b
+}
+
+func (b *callbackBatcher) Add(result ResultData) {
+	b.results <- result
+}
+
+func (b *callbackBatcher) run() {
+	for first := range b.results {
+		batch := []ResultData{first}
+		timer := time.NewTimer(b.window)
+	collect:
+		for len(batch) < b.size {
+			select {
+			case result := <-b.results:
+				batch = append(batch, result)
+			case <-timer.C:
+				break collect
+			}
+		}
+		timer.Stop()
+		go sendBatchCallBack(batch)
+	}
+}
+
+// sendBatchCallBack falls back to one callback per verdict when the judge does not
+// accept the batch, e.g. a judge without the batch endpoint
+func sendBatchCallBack(batch []ResultData) {
+	jsonData, err := json.Marshal(ResultBatch{Results: batch})
+	if err != nil {
+		fmt.Println("Error marshalling JSON:", err)
+		return
+	}
+	resp, err := http.Post(callbackURL+"/batch", "application/json", bytes.NewBuffer(jsonData))
+	if err == nil {
+		resp.Body.Close()
+		if resp.StatusCode == http.StatusOK {
+			return
+		}
+		err = fmt.Errorf("status %d", resp.StatusCode)
+	}
+	fmt.Println("Error sending batch callback, sending verdicts one by one:", err)
+	for _, result := range batch {
+		postCallBack(result)
+	}
+}
@@ -0,0 +1,179 @@
+package code_runner
+
+import (
+	"container/list"
+	"crypto/sha256"
+	"encoding/hex"
+	"io"
+	"os"
+	"path/filepath"
+	"sort"
+	"strings"
+	"sync"
+	"time"
+)
+
+const (
+	defaultCacheDir = "/tmp/compile-cache"
+	defaultCacheMb  = 1024
+	// failedSuffix marks entries for sources that did not compile, left by older
+	// code-runners and removed on start. Only successful builds are cached: builder's
+	// exit status does not tell a compile error from an OOM kill or a full disk.
+	failedSuffix = ".failed"
+)
+
+type cacheEntry struct {
+	key  string
+	size int64
+}
+
+// CompileCache keeps compiled submissions on disk keyed by a hash of the source and
+// the toolchain, evicting the least recently used ones past maxBytes
+type CompileCache struct {
+	dir       string
+	toolchain string
+	maxBytes  int64
+
+	mu        sync.Mutex
+	entries   map[string]*list.Element
+	lru       *list.List // front is the most recently used
+	bytes     int64
+	hits      int
+	misses    int
+	evictions int
+}
+
+// NewCompileCache indexes the entries an earlier start left in dir, oldest use first
+func NewCompileCache(dir string, maxBytes int64, toolchain string) (*CompileCache, error) {
+	if err := os.MkdirAll(dir, 0755); err != nil {
+		return nil, err
+	}
+	c := &CompileCache{
+		dir:       dir,
+		toolchain: toolchain,
+		maxBytes:  maxBytes,
+		entries:   map[string]*list.Element{},
+		lru:       list.New(),
+	}
+	files, err := os.ReadDir(dir)
+	if err != nil {
+		return nil, err
+	}
+	infos := []os.FileInfo{}
+	for _, file := range files {
+		if strings.HasSuffix(file.Name(), failedSuffix) {
+			os.Remove(filepath.Join(dir, file.Name()))
+			continue
+		}
+		info, err := file.Info()
+		if err != nil || strings.HasPrefix(file.Name(), ".") {
+			continue
+		}
+		infos = append(infos, info)
+	}
+	sort.Slice(infos, func(i, j int) bool { return infos[i].ModTime().After(infos[j].ModTime()) })
+	for _, info := range infos {
+		c.entries[info.Name()] = c.lru.PushBack(&cacheEntry{key: info.Name(), size: info.Size()})
+		c.bytes += info.Size()
+	}
+	c.evict()
+	return c, nil
+}
+
+// Key of a source; the toolchain is part of it so a rebuilt go-code-runner image misses
+func (c *CompileCache) Key(source []byte) string {
+	hash := sha256.New()
+	hash.Write([]byte(c.toolchain))
+	hash.Write([]byte{0})
+	hash.Write(source)
+	return hex.EncodeToString(hash.Sum(nil))
+}
+
+// Get returns the binary of key; ok is false on a miss
+func (c *CompileCache) Get(key string) (binary []byte, ok bool) {
+	c.mu.Lock()
+	element, found := c.entries[key]
+	if !found {
+		c.misses++
+		c.mu.Unlock()
+		return nil, false
+	}
+	c.lru.MoveToFront(element)
+	c.mu.Unlock()
+
+	path := filepath.Join(c.dir, key)
+	binary, err := os.ReadFile(path)
+	if err != nil { // evicted meanwhile
+		c.count(false)
+		return nil, false
+	}
+	now := time.Now()
+	os.Chtimes(path, now, now) // the next start orders entries by last use
+	c.count(true)
+	return binary, true
+}
+
+func (c *CompileCache) count(hit bool) {
+	c.mu.Lock()
+	defer c.mu.Unlock()
+	if hit {
+		c.hits++
+	} else {
+		c.misses++
+	}
+}
+
+// Put stores the binary read from r
+func (c *CompileCache) Put(key string, r io.Reader) error {
+	tmp, err := os.CreateTemp(c.dir, ".put-*")
+	if err != nil {
+		return err
+	}
+	size, err := io.Copy(tmp, r)
+	if closeErr := tmp.Close(); err == nil {
+		err = closeErr
+	}
+	if err == nil {
+		err = os.Rename(tmp.Name(), filepath.Join(c.dir, key))
+	}
+	if err != nil {
+		os.Remove(tmp.Name())
+		return err
+	}
+
+	c.mu.Lock()
+	defer c.mu.Unlock()
+	if element, found := c.entries[key]; found { // stored by a concurrent run of the same source
+		c.bytes -= element.Value.(*cacheEntry).size
+		c.lru.Remove(element)
+	}
+	c.entries[key] = c.lru.PushFront(&cacheEntry{key: key, size: size})
+	c.bytes += size
+	c.evict()
+	return nil
+}
+
+// evict removes least recently used entries until the cache fits; the caller holds mu
+func (c *CompileCache) evict() {
+	for c.bytes > c.maxBytes && c.lru.Len() > 0 {
+		entry := c.lru.Remove(c.lru.Back()).(*cacheEntry)
+		delete(c.entries, entry.key)
+		c.bytes -= entry.size
+		c.evictions++
+		os.Remove(filepath.Join(c.dir, entry.key))
+	}
+}
+
+// Stats are the counters served on the code-runner's /stats
+func (c *CompileCache) Stats() map[string]int64 {
+	c.mu.Lock()
+	defer c.mu.Unlock()
+	return map[string]int64{
+		"hits":      int64(c.hits),
+		"misses":    int64(c.misses),
+		"evictions": int64(c.evictions),
+		"entries":   int64(c.lru.Len()),
+		"bytes":     c.bytes,
+		"max_bytes": c.maxBytes,
+	}
+}
@@ -10,6 +10,7 @@ import (
 	"os"
 	"path/filepath"
 	"strings"
+	"time"
 
 	"github.com/docker/docker/api/types/container"
 	"github.com/docker/docker/api/types/mount"
@@ -18,11 +19,33 @@ import (
 )
 
 type ResultData struct {
-	CallbackToken string `json:"callback_token"`
-	Status        string `json:"Status"`
+	CallbackToken string             `json:"callback_token"`
+	Status        string             `json:"Status"`
+	Timings       map[string]float64 `json:"timings,omitempty"`
 }
 
-func runCodeInsideContainer(run Run) string {
+// ResultBatch is the body of the judge's /code/callback/batch
+type ResultBatch struct {
+	Results []ResultData `json:"results"`
+}
+
+// stageTimer records how long each stage of a run took, in milliseconds
+type stageTimer struct {
+	last   time.Time
+	stages map[string]float64
+}
+
+func newStageTimer(start time.Time) *stageTimer {
+	return &stageTimer{last: start, stages: map[string]float64{}}
+}
+
+func (t *stageTimer) mark(stage string) {
+	now := time.Now()
+	t.stages[stage] = float64(now.Sub(t.last).Microseconds()) / 1000
+	t.last = now
+}
+
+func runCodeInsideContainer(run Run, timer *stageTimer) string {
 	timeLimit := fmt.Sprintf("%.3f", float64(run.TimeLimitMs+5000)/float64(1000))
 
 	ctx := context.Background()
@@ -78,6 +101,7 @@ func runCodeInsideContainer(run Run) string {
 		return "Compilation failed"
 	}
 	defer cli.ContainerRemove(ctx, resp.ID, container.RemoveOptions{Force: true})
+	timer.mark("create")
 
 	if err := cli.ContainerStart(ctx, resp.ID, container.StartOptions{}); err != nil {
 		fmt.Printf("Error starting container: %v\n", err)
@@ -125,6 +149,7 @@ func runCodeInsideContainer(run Run) string {
 		fmt.Println("Compilation failed")
 		return "Compilation failed"
 	}
+	timer.mark("compile")
 
 	_, err = cli.ContainerUpdate(ctx, resp.ID, container.UpdateConfig{
 		Resources: container.Resources{
@@ -152,6 +177,7 @@ func runCodeInsideContainer(run Run) string {
 			return "Compilation failed"
 		}
 	}
+	timer.mark("run")
 	logs, err := cli.ContainerLogs(ctx, resp.ID, container.LogsOptions{
 		ShowStdout: true,
 		ShowStderr: true,
@@ -181,6 +207,11 @@ func runCodeInsideContainer(run Run) string {
 		return "Compilation failed"
 	}
 
+	return judgeOutput(output, problemDirOnContainer)
+}
+
+// judgeOutput turns the runner output, lines joined without separators, into a verdict
+func judgeOutput(output string, problemDir string) string {
 	charLimit := 200
 	if len(output) < charLimit {
 		charLimit = len(output)
@@ -196,7 +227,7 @@ func runCodeInsideContainer(run Run) string {
 		return "Runtime error"
 	}
 
-	file, err := os.Open(filepath.Join(problemDirOnContainer, "output.txt"))
+	file, err := os.Open(filepath.Join(problemDir, "output.txt"))
 	if err != nil {
 		fmt.Println("Error opening file:", err)
 		return "Compilation failed"
@@ -218,18 +249,37 @@ func runCodeInsideContainer(run Run) string {
 
 }
 
-func sendRunCallBack(result string, run Run) {
+// joinLines joins the lines of an exec output the way runCodeInsideContainer reads container logs
+func joinLines(output string) string {
+	var joined string
+	scanner := bufio.NewScanner(strings.NewReader(output))
+	for scanner.Scan() {
+		joined += scanner.Text()
+	}
+	return joined
+}
+
+func sendRunCallBack(result string, run Run, timings map[string]float64) {
 	resultData := ResultData{
 		CallbackToken: run.CallbackToken,
 		Status:        result,
+		Timings:       timings,
 	}
+	if callbackBatches != nil {
+		callbackBatches.Add(resultData)
+		return
+	}
+	postCallBack(resultData)
+}
+
+func postCallBack(resultData ResultData) {
 	jsonData, err := json.Marshal(resultData)
 	if err != nil {
 		fmt.Println("Error marshalling JSON:", err)
 		return
 	}
 
-	resp, err := http.Post("http://judge:80/code/callback", "application/json", bytes.NewBuffer(jsonData))
+	resp, err := http.Post(callbackURL, "application/json", bytes.NewBuffer(jsonData))
 	if err != nil {
 		fmt.Println("Error sending request:", err)
 		return
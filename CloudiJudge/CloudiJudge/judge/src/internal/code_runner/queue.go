@@ -2,26 +2,41 @@ package code_runner
 
 import (
 	"sync"
+	"sync/atomic"
+	"time"
 )
 
 type Run struct {
-	TimeLimitMs   int    `json:"time_limit"`
-	MemoryLimitMb int    `json:"memory_limit"`
-	PproblemID    int    `json:"problem_id"`
-	SubmissionID  int    `json:"submission_id"`
-	CallbackToken string `json:"calback_token"`
+	TimeLimitMs   int       `json:"time_limit"`
+	MemoryLimitMb int       `json:"memory_limit"`
+	PproblemID    int       `json:"problem_id"`
+	SubmissionID  int       `json:"submission_id"`
+	CallbackToken string    `json:"calback_token"`
+	EnqueuedAt    time.Time `json:"-"`
+}
+
+// Status is what a code-runner reports on /status for the judge to pick the least loaded runner
+type Status struct {
+	Queued        int `json:"queued"`
+	Running       int `json:"running"`
+	Slots         int `json:"slots"`
+	FreeSlots     int `json:"free_slots"`
+	QueueCapacity int `json:"queue_capacity"`
 }
 
 type QueueManager struct {
-	tasks     chan Run
-	semaphore chan struct{}
-	wg        sync.WaitGroup
+	tasks       chan Run
+	semaphore   chan struct{}
+	wg          sync.WaitGroup
+	sandboxes   *SandboxPool // nil runs every submission in a new container
+	outstanding atomic.Int64 // accepted runs that have not called back yet
 }
 
-func NewQueueManager(maxConcurrent int) *QueueManager {
+func NewQueueManager(maxConcurrent int, sandboxes *SandboxPool) *QueueManager {
 	qm := &QueueManager{
 		tasks:     make(chan Run, 1000),
 		semaphore: make(chan struct{}, maxConcurrent),
+		sandboxes: sandboxes,
 	}
 	go qm.startWorkers()
 	return qm
@@ -34,13 +49,43 @@ func (qm *QueueManager) startWorkers() {
 		go func(r Run) {
 			defer qm.wg.Done()
 			defer func() { <-qm.semaphore }()
-			sendRunCallBack(runCodeInsideContainer(r), r)
+			timer := newStageTimer(r.EnqueuedAt)
+			timer.mark("queue")
+			var result string
+			if qm.sandboxes != nil {
+				result = runCodeInSandbox(qm.sandboxes, r, timer)
+			} else {
+				result = runCodeInsideContainer(r, timer)
+			}
+			timer.mark("judge")
+			sendRunCallBack(result, r, timer.stages)
+			qm.outstanding.Add(-1)
 		}(task)
 	}
 }
 
-func (qm *QueueManager) Enqueue(r Run) {
-	qm.tasks <- r
+// Enqueue queues a run, or returns false when the queue is full
+func (qm *QueueManager) Enqueue(r Run) bool {
+	r.EnqueuedAt = time.Now()
+	qm.outstanding.Add(1)
+	select {
+	case qm.tasks <- r:
+		return true
+	default:
+		qm.outstanding.Add(-1)
+		return false
+	}
+}
+
+func (qm *QueueManager) Status() Status {
+	running := len(qm.semaphore)
+	return Status{
+		Queued:        int(qm.outstanding.Load()) - running,
+		Running:       running,
+		Slots:         cap(qm.semaphore),
+		FreeSlots:     cap(qm.semaphore) - running,
+		QueueCapacity: cap(qm.tasks),
+	}
 }
 
 func (qm *QueueManager) Close() {
@@ -0,0 +1,359 @@
+package code_runner
+
+import (
+	"archive/tar"
+	"bytes"
+	"context"
+	"fmt"
+	"os"
+	"path/filepath"
+	"strings"
+	"time"
+
+	"github.com/docker/docker/api/types/container"
+	"github.com/docker/docker/api/types/filters"
+	"github.com/docker/docker/client"
+	"github.com/docker/docker/pkg/stdcopy"
+	"github.com/docker/go-units"
+)
+
+const (
+	sandboxLabel       = "cloudijudge.sandbox-pool"
+	buildMemory        = int64(512) * 1024 * 1024
+	compileTimeout     = 5 * time.Minute
+	execGrace          = 30 * time.Second // on top of the time limit before a stuck run recycles its sandbox
+	replaceBackoff     = 2 * time.Second
+	defaultMaxUses     = 100
+	defaultHealthEvery = 30 * time.Second
+)
+
+// resetScript kills whatever the last submission left running (kill -1 spares PID 1
+// and the shell itself) and removes every file it made in the places the runner user
+// can write to: its home, the world-writable temp dirs, shared memory and the golang
+// image's GOPATH, whose bin is on PATH. The Go build cache in the home goes too: the
+// submission could rewrite the packages it holds and so the next submission's binary.
+// Directories are made writable first so a submission can not protect its files, and
+// the script fails when anything is left, which replaces the sandbox.
+const resetScript = `kill -9 -1 2>/dev/null
+dirs="/home/runner /tmp /var/tmp /dev/shm /dev/mqueue /go"
+find $dirs -mindepth 1 -user runner -type d -exec chmod u+rwx {} + 2>/dev/null
+find $dirs -mindepth 1 -user runner -delete 2>/dev/null
+! find $dirs -mindepth 1 -user runner 2>/dev/null | grep -q .`
+
+type sandbox struct {
+	id   string
+	uses int
+}
+
+// SandboxPool keeps started go-code-runner containers and runs submissions in them
+// with docker exec, instead of creating and removing a container per run
+type SandboxPool struct {
+	cli     *client.Client
+	idle    chan *sandbox
+	owner   string
+	maxUses int
+	cache   *CompileCache // nil compiles every submission
+}
+
+func NewSandboxPool(size int, maxUses int, healthEvery time.Duration) (*SandboxPool, error) {
+	cli, err := client.NewClientWithOpts(client.FromEnv, client.WithAPIVersionNegotiation())
+	if err != nil {
+		return nil, err
+	}
+	owner, _ := os.Hostname()
+	pool := &SandboxPool{
+		cli:     cli,
+		idle:    make(chan *sandbox, size),
+		owner:   owner,
+		maxUses: maxUses,
+	}
+	pool.removeLeftovers()
+	for i := 0; i < size; i++ {
+		s, err := pool.create()
+		if err != nil {
+			return nil, err
+		}
+		pool.idle <- s
+	}
+	go pool.checkHealth(healthEvery)
+	return pool, nil
+}
+
+// removeLeftovers removes sandboxes of an earlier run of this code-runner, which
+// keeps its hostname across restarts
+func (p *SandboxPool) removeLeftovers() {
+	ctx := context.Background()
+	containers, err := p.cli.ContainerList(ctx, container.ListOptions{
+		All:     true,
+		Filters: filters.NewArgs(filters.Arg("label", sandboxLabel+"="+p.owner)),
+	})
+	if err != nil {
+		fmt.Printf("Error listing old sandboxes: %v\n", err)
+		return
+	}
+	for _, c := range containers {
+		p.cli.ContainerRemove(ctx, c.ID, container.RemoveOptions{Force: true})
+	}
+}
+
+func (p *SandboxPool) create() (*sandbox, error) {
+	ctx := context.Background()
+	config := &container.Config{
+		Image:      "go-code-runner",
+		Entrypoint: []string{"tail", "-f", "/dev/null"},
+		Labels:     map[string]string{sandboxLabel: p.owner},
+	}
+	hostConfig := &container.HostConfig{
+		Resources: container.Resources{
+			CPUCount: 1,
+			Memory:   buildMemory,
+			NanoCPUs: 1_000_000_000,
+			Ulimits:  []*units.Ulimit{{Name: "nofile", Soft: 1024, Hard: 1024}},
+		},
+		NetworkMode: "none", // No network
+		CapDrop:     []string{"ALL"},
+		SecurityOpt: []string{"no-new-privileges"},
+	}
+	resp, err := p.cli.ContainerCreate(ctx, config, hostConfig, nil, nil, "")
+	if err != nil {
+		return nil, fmt.Errorf("creating sandbox: %w", err)
+	}
+	if err := p.cli.ContainerStart(ctx, resp.ID, container.StartOptions{}); err != nil {
+		p.cli.ContainerRemove(ctx, resp.ID, container.RemoveOptions{Force: true})
+		return nil, fmt.Errorf("starting sandbox: %w", err)
+	}
+	return &sandbox{id: resp.ID}, nil
+}
+
+// Acquire waits for an idle sandbox; the queue manager never runs more submissions
+// than the pool holds, so this only waits while a used sandbox is reset or replaced
+func (p *SandboxPool) Acquire() *sandbox {
+	return <-p.idle
+}
+
+// Release returns a sandbox to the pool after a run. It is reset in the background,
+// so the run's callback does not wait for the cleanup.
+func (p *SandboxPool) Release(s *sandbox, healthy bool) {
+	go p.recycle(s, healthy)
+}
+
+// recycle resets a sandbox for the next run, or replaces it when it failed, was used up
+// or could not be cleaned
+func (p *SandboxPool) recycle(s *sandbox, healthy bool) {
+	s.uses++
+	if healthy && s.uses < p.maxUses {
+		exitCode := 0
+		_, err := p.exec(s, []string{"sh", "-c", resetScript}, nil, &exitCode, execGrace)
+		if err == nil && exitCode == 0 {
+			p.idle <- s
+			return
+		}
+	}
+	p.replace(s)
+}
+
+func (p *SandboxPool) replace(s *sandbox) {
+	p.cli.ContainerRemove(context.Background(), s.id, container.RemoveOptions{Force: true})
+	for {
+		fresh, err := p.create()
+		if err == nil {
+			p.idle <- fresh
+			return
+		}
+		fmt.Printf("Error replacing sandbox: %v\n", err)
+		time.Sleep(replaceBackoff)
+	}
+}
+
+// checkHealth takes the sandboxes idle at each tick out of the pool one by one and
+// replaces the ones that stopped or no longer run commands
+func (p *SandboxPool) checkHealth(every time.Duration) {
+	for range time.Tick(every) {
+		for i := len(p.idle); i > 0; i-- {
+			var s *sandbox
+			select {
+			case s = <-p.idle:
+			default: // taken by runs meanwhile
+			}
+			if s == nil {
+				break
+			}
+			info, err := p.cli.ContainerInspect(context.Background(), s.id)
+			if err == nil && info.State != nil && info.State.Running {
+				_, err = p.exec(s, []string{"true"}, nil, nil, execGrace)
+			} else if err == nil {
+				err = fmt.Errorf("sandbox is not running")
+			}
+			if err != nil {
+				fmt.Printf("Replacing unhealthy sandbox %.12s: %v\n", s.id, err)
+				go p.replace(s)
+				continue
+			}
+			p.idle <- s
+		}
+	}
+}
+
+// exec runs cmd in the sandbox and returns its stdout; a non-zero exit code is not an error
+func (p *SandboxPool) exec(s *sandbox, cmd []string, env []string, exitCode *int, limit time.Duration) (string, error) {
+	ctx, cancel := context.WithTimeout(context.Background(), limit)
+	defer cancel()
+	created, err := p.cli.ContainerExecCreate(ctx, s.id, container.ExecOptions{
+		Cmd:          cmd,
+		Env:          env,
+		AttachStdout: true,
+		AttachStderr: true,
+	})
+	if err != nil {
+		return "", err
+	}
+	attached, err := p.cli.ContainerExecAttach(ctx, created.ID, container.ExecAttachOptions{})
+	if err != nil {
+		return "", err
+	}
+	defer attached.Close()
+	var stdout, stderr bytes.Buffer
+	done := make(chan error, 1)
+	go func() {
+		_, err := stdcopy.StdCopy(&stdout, &stderr, attached.Reader)
+		done <- err
+	}()
+	select {
+	case err := <-done:
+		if err != nil {
+			return "", err
+		}
+	case <-ctx.Done():
+		return "", fmt.Errorf("exec %v did not finish within %v", cmd, limit)
+	}
+	info, err := p.cli.ContainerExecInspect(ctx, created.ID)
+	if err != nil {
+		return "", err
+	}
+	if exitCode != nil {
+		*exitCode = info.ExitCode
+	}
+	return stdout.String(), nil
+}
+
+// ImageID identifies the go-code-runner build, and with it the Go toolchain
+func (p *SandboxPool) ImageID() (string, error) {
+	image, err := p.cli.ImageInspect(context.Background(), "go-code-runner")
+	if err != nil {
+		return "", err
+	}
+	return image.ID, nil
+}
+
+// copyProblem puts the submission and the test input where builder expects them, and
+// the cached binary, if any; an empty one replaces the binary of an earlier run
+func (p *SandboxPool) copyProblem(s *sandbox, source []byte, inputPath string, binary []byte) error {
+	input, err := os.ReadFile(inputPath)
+	if err != nil {
+		return err
+	}
+	var archive bytes.Buffer
+	tw := tar.NewWriter(&archive)
+	tw.WriteHeader(&tar.Header{Typeflag: tar.TypeDir, Name: "problem/", Mode: 0755})
+	files := []struct {
+		name    string
+		mode    int64
+		content []byte
+	}{
+		{"problem/code.go", 0444, source},
+		{"problem/input.txt", 0444, input},
+		{"problem/code", 0555, binary},
+	}
+	for _, file := range files {
+		tw.WriteHeader(&tar.Header{Typeflag: tar.TypeReg, Name: file.name, Mode: file.mode, Size: int64(len(file.content))})
+		tw.Write(file.content)
+	}
+	if err := tw.Close(); err != nil {
+		return err
+	}
+	return p.cli.CopyToContainer(context.Background(), s.id, "/mnt", &archive, container.CopyToContainerOptions{})
+}
+
+// cacheBinary stores the binary builder just compiled in the sandbox
+func (p *SandboxPool) cacheBinary(s *sandbox, key string) error {
+	content, _, err := p.cli.CopyFromContainer(context.Background(), s.id, "/home/runner/tmp/code")
+	if err != nil {
+		return err
+	}
+	defer content.Close()
+	tr := tar.NewReader(content)
+	if _, err := tr.Next(); err != nil {
+		return err
+	}
+	return p.cache.Put(key, tr)
+}
+
+func (p *SandboxPool) setMemory(s *sandbox, memory int64) error {
+	_, err := p.cli.ContainerUpdate(context.Background(), s.id, container.UpdateConfig{
+		Resources: container.Resources{Memory: memory},
+	})
+	return err
+}
+
+func runCodeInSandbox(pool *SandboxPool, run Run, timer *stageTimer) string {
+	problemDir := filepath.Join(os.Getenv("PROBLEM_UPLOAD_FOLDER"), fmt.Sprintf("%d", run.PproblemID))
+	timeLimit := fmt.Sprintf("%.3f", float64(run.TimeLimitMs+5000)/float64(1000))
+
+	source, err := os.ReadFile(filepath.Join(problemDir, fmt.Sprintf("%d.go", run.SubmissionID)))
+	if err != nil {
+		fmt.Println("Error opening file:", err)
+		return "Compilation failed"
+	}
+	var key string
+	var binary []byte
+	if pool.cache != nil {
+		key = pool.cache.Key(source)
+		binary, _ = pool.cache.Get(key)
+	}
+
+	s := pool.Acquire()
+	timer.mark("acquire")
+	healthy := false
+	defer func() { pool.Release(s, healthy) }()
+
+	if err := pool.setMemory(s, buildMemory); err != nil {
+		fmt.Printf("error updating container memory: %v\n", err)
+		return "Compilation failed"
+	}
+	if err := pool.copyProblem(s, source, filepath.Join(problemDir, "input.txt"), binary); err != nil {
+		fmt.Printf("Error copying submission into sandbox: %v\n", err)
+		return "Compilation failed"
+	}
+	exitCode := 0
+	compileOutput, err := pool.exec(s, []string{"builder"}, nil, &exitCode, compileTimeout)
+	if err != nil {
+		fmt.Printf("Error compiling in sandbox: %v\n", err)
+		return "Compilation failed"
+	}
+	healthy = true
+	if exitCode != 0 || strings.Contains(compileOutput, "failed") {
+		fmt.Println("Compilation failed")
+		return "Compilation failed"
+	}
+	if pool.cache != nil && binary == nil {
+		if err := pool.cacheBinary(s, key); err != nil {
+			fmt.Printf("Error caching compiled submission: %v\n", err)
+		}
+	}
+	timer.mark("compile")
+
+	if err := pool.setMemory(s, int64(run.MemoryLimitMb+6)*1024*1024); err != nil { // 6 mb for container
+		fmt.Printf("error updating container memory: %v\n", err)
+		healthy = false
+		return "Compilation failed"
+	}
+	limit := time.Duration(run.TimeLimitMs)*time.Millisecond + execGrace
+	output, err := pool.exec(s, []string{"builder"}, []string{"TIME_LIMIT=" + timeLimit}, &exitCode, limit)
+	if err != nil || exitCode != 0 {
+		fmt.Println("Compilation failed", err)
+		healthy = false
+		return "Compilation failed"
+	}
+	timer.mark("run")
+	return judgeOutput(joinLines(output), problemDir)
+}
@@ -12,8 +12,25 @@ func runCodeView(c *fiber.Ctx) error {
 			"error": "Invalid JSON",
 		})
 	}
-	queueManager.Enqueue(data)
+	if !queueManager.Enqueue(data) {
+		// The judge sends the run to another code-runner
+		return c.Status(fiber.StatusServiceUnavailable).JSON(fiber.Map{
+			"error": "Queue is full",
+		})
+	}
 	return c.Status(fiber.StatusOK).JSON(fiber.Map{
 		"ok": true,
 	})
 }
+
+func statusView(c *fiber.Ctx) error {
+	return c.JSON(queueManager.Status())
+}
+
+func statsView(c *fiber.Ctx) error {
+	stats := fiber.Map{"sandbox_pool": queueManager.sandboxes != nil}
+	if queueManager.sandboxes != nil && queueManager.sandboxes.cache != nil {
+		stats["compile_cache"] = queueManager.sandboxes.cache.Stats()
+	}
+	return c.JSON(stats)
+}
@@ -3,8 +3,10 @@ package serve
 import (
 	"fmt"
 	"log"
+	"os"
 
 	"github.com/gofiber/fiber/v2"
+	"github.com/gofiber/fiber/v2/middleware/pprof"
 	"github.com/gofiber/template/html/v2"
 )
 
@@ -33,6 +35,11 @@ func StartListening(port int) {
 	})
 	app.Static("/static", "static/styles")
 
+	// profiling for load tests, /debug/pprof is not authenticated so keep it off in production
+	if os.Getenv("PPROF_ENABLED") == "true" {
+		app.Use(pprof.New())
+	}
+
 	// Landing
 	app.Get("/", landingView)
 
@@ -67,6 +74,7 @@ func StartListening(port int) {
 	app.Get("/problemset/:id/:command", isAuthenticated, handlePublishProblemView) // command is publish and unpublish
 
 	app.Post("/code/callback", runCodeCallbackView)
+	app.Post("/code/callback/batch", runCodeBatchCallbackView)
 
 	log.Fatal(app.Listen(fmt.Sprintf(":%d", port)))
 
@@ -4,17 +4,18 @@ import (
 	"fmt"
 	"log"
 	"os"
+	"sort"
 	"strings"
 	"time"
 
+	"github.com/sajjad-MoBe/CloudiJudge/judge/src/internal/code_runner"
 	"golang.org/x/crypto/bcrypt"
 	"gorm.io/driver/postgres"
 	"gorm.io/gorm"
+	"gorm.io/gorm/clause"
 )
 
 var db *gorm.DB
-var publishedProblemsCount int64
-var notPublishedProblemsCount int64
 
 func connectDatabase() {
 	dsn := fmt.Sprintf(
@@ -47,21 +48,17 @@ func connectDatabase() {
 
 	if err == nil {
 		for _, submission := range submissions {
-			sendCodeToRun(submission, submission.Problem)
+			go sendCodeToRun(submission, submission.Problem) // runners are discovered after start
 		}
 	}
-	err = db.Model(&Problem{}).
-		Where("is_published = ?", true).
-		Count(&publishedProblemsCount).Error
-	if err != nil {
-		log.Fatalf("Failed to load published problems: %v", err)
-		os.Exit(1)
+	for _, index := range keysetIndexes {
+		if err := db.Exec(index).Error; err != nil {
+			log.Fatalf("Failed to create problemset index: %v", err)
+			os.Exit(1)
+		}
 	}
-	err = db.Model(&Problem{}).
-		Where("is_published = ?", false).
-		Count(&notPublishedProblemsCount).Error
-	if err != nil {
-		log.Fatalf("Failed to load not published problems: %v", err)
+	if _, err := problemCounts.All(); err != nil {
+		log.Fatalf("Failed to count problems: %v", err)
 		os.Exit(1)
 	}
 	// log.Println("Database connected and migrated")
@@ -93,3 +90,65 @@ func CreateAdmin(email string) {
 		fmt.Println("admin was created, password:", password)
 	}
 }
+
+// applyVerdicts sets the status of the waiting submissions among results in one
+// transaction: one update per distinct status and one increment per user with accepted
+// runs. Submissions already judged are skipped, so a repeated callback counts once.
+func applyVerdicts(results []code_runner.ResultData) (int, error) {
+	statuses := map[string]string{}
+	var tokens []string
+	for _, result := range results {
+		if _, found := statuses[result.CallbackToken]; !found {
+			tokens = append(tokens, result.CallbackToken)
+		}
+		statuses[result.CallbackToken] = result.Status
+	}
+	if len(tokens) == 0 {
+		return 0, nil
+	}
+
+	applied := 0
+	err := db.Transaction(func(tx *gorm.DB) error {
+		var submissions []Submission
+		// Rows are locked in id order, so concurrent batches cannot deadlock
+		err := tx.Clauses(clause.Locking{Strength: "UPDATE"}).
+			Select("id", "token", "owner_id").
+			Where("token IN ? AND status = ?", tokens, "waiting").
+			Order("id").
+			Find(&submissions).Error
+		if err != nil {
+			return err
+		}
+
+		idsByStatus := map[string][]uint{}
+		accepted := map[uint]int{}
+		for _, submission := range submissions {
+			status := statuses[submission.Token]
+			idsByStatus[status] = append(idsByStatus[status], submission.ID)
+			if status == "Accepted" {
+				accepted[submission.OwnerID]++
+			}
+		}
+		for status, ids := range idsByStatus {
+			err := tx.Model(&Submission{}).Where("id IN ?", ids).Update("status", status).Error
+			if err != nil {
+				return err
+			}
+		}
+		owners := make([]uint, 0, len(accepted))
+		for owner := range accepted {
+			owners = append(owners, owner)
+		}
+		sort.Slice(owners, func(i, j int) bool { return owners[i] < owners[j] })
+		for _, owner := range owners {
+			err := tx.Model(&User{}).Where("id = ?", owner).
+				UpdateColumn("success_attemps", gorm.Expr("success_attemps + ?", accepted[owner])).Error
+			if err != nil {
+				return err
+			}
+		}
+		applied = len(submissions)
+		return nil
+	})
+	return applied, err
+}
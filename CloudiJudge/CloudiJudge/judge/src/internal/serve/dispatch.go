@@ -0,0 +1,248 @@
+package serve
+
+import (
+	"bytes"
+	"encoding/json"
+	"errors"
+	"fmt"
+	"log"
+	"net"
+	"net/http"
+	"os"
+	"strings"
+	"sync"
+	"time"
+
+	"github.com/sajjad-MoBe/CloudiJudge/judge/src/internal/code_runner"
+)
+
+const (
+	codeRunnerPort     = 2
+	discoveryInterval  = 10 * time.Second
+	statusInterval     = time.Second
+	dispatchRetryDelay = 5 * time.Second
+	dispatchMaxRounds  = 60 // rounds over every runner, 5 minutes, before the submission fails
+)
+
+type CodeRunner struct {
+	Address     string // base URL, e.g. http://172.18.0.5:2
+	Active      bool   // answered its last /status and has room in its queue
+	Slots       int    // concurrent runs, 0 until the first /status
+	Outstanding int    // queued and running runs at the last /status
+	Assigned    int    // runs this judge sent since the last poll
+}
+
+// load is the outstanding work per run slot, counting runs sent since the last poll
+func (r *CodeRunner) load() float64 {
+	work := float64(r.Outstanding + r.Assigned)
+	if r.Slots > 0 {
+		return work / float64(r.Slots)
+	}
+	return work
+}
+
+var (
+	codeRunners          []*CodeRunner
+	codeRunnerMutex      sync.Mutex
+	currentCodeRunnerIdx int
+
+	// CODE_RUNNER_DISPATCH=round-robin ignores the runners' load, for comparison
+	roundRobinDispatch = os.Getenv("CODE_RUNNER_DISPATCH") == "round-robin"
+	dispatchClient     = &http.Client{Timeout: 10 * time.Second}
+	statusClient       = &http.Client{Timeout: statusInterval}
+)
+
+// codeRunnerAddresses resolves the code-runner service, or reads CODE_RUNNER_ADDRS
+// (comma separated host:port) for runners outside Docker
+func codeRunnerAddresses() ([]string, error) {
+	if addrs := os.Getenv("CODE_RUNNER_ADDRS"); addrs != "" {
+		var urls []string
+		for _, addr := range strings.Split(addrs, ",") {
+			urls = append(urls, "http://"+strings.TrimSpace(addr))
+		}
+		return urls, nil
+	}
+	addrs, err := net.LookupHost("code-runner")
+	if err != nil {
+		return nil, err
+	}
+	var urls []string
+	for _, addr := range addrs {
+		urls = append(urls, fmt.Sprintf("http://%s:%d", addr, codeRunnerPort))
+	}
+	return urls, nil
+}
+
+func discoverCodeRunners() {
+	go pollCodeRunners()
+	for {
+		urls, err := codeRunnerAddresses()
+		if err != nil {
+			log.Printf("Error resolving code-runner service: %v", err)
+			time.Sleep(5 * time.Second)
+			continue
+		}
+
+		codeRunnerMutex.Lock()
+		known := map[string]*CodeRunner{}
+		for _, codeRunner := range codeRunners {
+			known[codeRunner.Address] = codeRunner
+		}
+		codeRunners = nil
+		for _, url := range urls {
+			codeRunner, found := known[url] // keeps its load across lookups
+			if !found {
+				codeRunner = &CodeRunner{Address: url, Active: true}
+			}
+			codeRunners = append(codeRunners, codeRunner)
+		}
+		codeRunnerMutex.Unlock()
+
+		time.Sleep(discoveryInterval)
+	}
+}
+
+// pollCodeRunners refreshes the load of every runner from its /status
+func pollCodeRunners() {
+	for range time.Tick(statusInterval) {
+		codeRunnerMutex.Lock()
+		runners := append([]*CodeRunner(nil), codeRunners...)
+		codeRunnerMutex.Unlock()
+		for _, codeRunner := range runners {
+			go pollCodeRunner(codeRunner)
+		}
+	}
+}
+
+func pollCodeRunner(codeRunner *CodeRunner) {
+	var status code_runner.Status
+	resp, err := statusClient.Get(codeRunner.Address + "/status")
+	if err == nil {
+		defer resp.Body.Close()
+		if resp.StatusCode == http.StatusOK {
+			err = json.NewDecoder(resp.Body).Decode(&status)
+		}
+	}
+
+	codeRunnerMutex.Lock()
+	defer codeRunnerMutex.Unlock()
+	if err != nil {
+		codeRunner.Active = false
+	} else if resp.StatusCode != http.StatusOK {
+		// A runner without /status: only the runs this judge sent since the last poll count as its load
+		codeRunner.Active = true
+		codeRunner.Assigned = 0
+	} else {
+		codeRunner.Active = status.Queued < status.QueueCapacity
+		codeRunner.Slots = status.Slots
+		codeRunner.Outstanding = status.Queued + status.Running
+		codeRunner.Assigned = 0
+	}
+}
+
+// pickCodeRunner chooses among the runners not tried yet, preferring active ones, and
+// counts the run against it; the lock is released before the run is sent
+func pickCodeRunner(tried map[*CodeRunner]bool) *CodeRunner {
+	codeRunnerMutex.Lock()
+	defer codeRunnerMutex.Unlock()
+	var best *CodeRunner
+	for i := range codeRunners {
+		// Starting after the last pick spreads runs over equally loaded runners
+		codeRunner := codeRunners[(currentCodeRunnerIdx+1+i)%len(codeRunners)]
+		if tried[codeRunner] {
+			continue
+		}
+		if best == nil || (codeRunner.Active && !best.Active) {
+			best = codeRunner
+		} else if !roundRobinDispatch && codeRunner.Active == best.Active && codeRunner.load() < best.load() {
+			best = codeRunner
+		}
+	}
+	if best == nil {
+		return nil
+	}
+	for i, codeRunner := range codeRunners {
+		if codeRunner == best {
+			currentCodeRunnerIdx = i
+		}
+	}
+	best.Assigned++
+	return best
+}
+
+func sendCodeToRun(submission Submission, problem Problem) {
+	run := code_runner.Run{
+		TimeLimitMs:   problem.TimeLimit,
+		MemoryLimitMb: int(problem.MemoryLimit),
+		PproblemID:    int(problem.ID),
+		SubmissionID:  int(submission.ID),
+		CallbackToken: submission.Token,
+	}
+	jsonData, err := json.Marshal(run)
+	if err != nil {
+		log.Println("Error marshalling JSON:", err)
+		return
+	}
+
+	for round := 0; round < dispatchMaxRounds; round++ {
+		if round > 0 {
+			// No runner known yet, or every runner is down or full
+			time.Sleep(dispatchRetryDelay)
+		}
+		if dispatchRound(submission, jsonData) {
+			return
+		}
+	}
+	log.Println("No code-runner accepted submission", submission.ID)
+	db.Model(&Submission{}).
+		Where("id = ? AND status = ?", submission.ID, "waiting").
+		Update("status", "Compilation failed")
+}
+
+// dispatchRound offers the run to every runner once, least loaded first, and tells
+// whether one took it
+func dispatchRound(submission Submission, jsonData []byte) bool {
+	tried := map[*CodeRunner]bool{}
+	for {
+		codeRunner := pickCodeRunner(tried)
+		if codeRunner == nil {
+			return false
+		}
+		tried[codeRunner] = true
+		log.Println("Run code by", codeRunner.Address)
+
+		resp, err := dispatchClient.Post(codeRunner.Address+"/run", "application/json", bytes.NewBuffer(jsonData))
+		if err != nil {
+			var opErr *net.OpError
+			if !errors.As(err, &opErr) || opErr.Op != "dial" {
+				// The runner may have queued the run before the error, e.g. a timeout
+				// waiting for its answer; sending it elsewhere could run it twice
+				log.Println("Run may have been accepted by", codeRunner.Address, err)
+				return true
+			}
+			log.Println("Error sending request:", err)
+			codeRunnerMutex.Lock()
+			codeRunner.Active = false
+			codeRunnerMutex.Unlock()
+			continue
+		}
+		if resp.StatusCode == http.StatusServiceUnavailable {
+			resp.Body.Close()
+			log.Println("Queue of", codeRunner.Address, "is full")
+			codeRunnerMutex.Lock()
+			codeRunner.Active = false
+			codeRunnerMutex.Unlock()
+			continue
+		}
+
+		var responseBody map[string]interface{}
+		err = json.NewDecoder(resp.Body).Decode(&responseBody)
+		resp.Body.Close()
+		if err != nil {
+			fmt.Println("Error read response request", err)
+			submission.Status = "Compilation failed"
+			db.Save(&submission)
+		}
+		return true
+	}
+}
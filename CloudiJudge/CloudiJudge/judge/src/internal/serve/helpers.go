@@ -1,22 +1,14 @@
 package serve
 
 import (
-	"bytes"
 	"crypto/rand"
 	"encoding/base64"
-	"encoding/json"
 	"fmt"
-	"log"
-	"net"
-	"net/http"
 	"net/mail"
 	"strconv"
 	"strings"
-	"sync"
 	"time"
 	"unicode"
-
-	"github.com/sajjad-MoBe/CloudiJudge/judge/src/internal/code_runner"
 )
 
 func GenerateRandomToken(length int) string {
@@ -130,84 +122,3 @@ func TimeAgo(t time.Time) string {
 		return fmt.Sprintf("%d days ago", days)
 	}
 }
-
-type CodeRunner struct {
-	Address string
-	Active  bool
-}
-
-var (
-	codeRunners          []CodeRunner
-	codeRunnerMutex      sync.Mutex
-	currentCodeRunnerIdx int
-)
-
-func discoverCodeRunners() {
-	for {
-		addrs, err := net.LookupHost("code-runner")
-		if err != nil {
-			log.Printf("Error resolving code-runner service: %v", err)
-			time.Sleep(5 * time.Second)
-			continue
-		}
-
-		codeRunnerMutex.Lock()
-		codeRunners = nil
-		for _, addr := range addrs {
-			workerAddr := "http://" + addr + ":2/run"
-			codeRunners = append(codeRunners, CodeRunner{Address: workerAddr, Active: true})
-		}
-		codeRunnerMutex.Unlock()
-
-		time.Sleep(10 * time.Second)
-	}
-}
-func sendCodeToRun(submission Submission, problem Problem) {
-	if len(codeRunners) == 0 {
-		time.Sleep(5 * time.Second)
-		go sendCodeToRun(submission, problem)
-		return
-	}
-	run := code_runner.Run{
-		TimeLimitMs:   problem.TimeLimit,
-		MemoryLimitMb: int(problem.MemoryLimit),
-		PproblemID:    int(problem.ID),
-		SubmissionID:  int(submission.ID),
-		CallbackToken: submission.Token,
-	}
-	jsonData, err := json.Marshal(run)
-	if err != nil {
-		log.Println("Error marshalling JSON:", err)
-		return
-	}
-
-	codeRunnerMutex.Lock()
-	defer codeRunnerMutex.Unlock()
-	if len(codeRunners) == 0 {
-		log.Println("No code runner available")
-		submission.Status = "Compilation failed"
-		db.Save(&submission)
-		return
-
-	}
-
-	codeRunner := codeRunners[currentCodeRunnerIdx%len(codeRunners)]
-	currentCodeRunnerIdx = (currentCodeRunnerIdx + 1) % len(codeRunners)
-	log.Println("Run code by", codeRunner.Address)
-
-	resp, err := http.Post(codeRunner.Address, "application/json", bytes.NewBuffer(jsonData))
-	if err != nil {
-		log.Println("Error sending request:", err)
-		return
-	}
-	defer resp.Body.Close()
-
-	var responseBody map[string]interface{}
-	if err := json.NewDecoder(resp.Body).Decode(&responseBody); err != nil {
-		fmt.Println("Error read response request", err)
-		submission.Status = "Compilation failed"
-		db.Save(&submission)
-		return
-	}
-
-}
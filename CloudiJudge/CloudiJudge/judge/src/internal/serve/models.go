@@ -34,7 +34,7 @@ type Problem struct {
 type Submission struct {
 	gorm.Model
 	Status    string  `gorm:"default:waiting" json:"status"`
-	Token     string  `gorm:"type:text" json:"token"`
+	Token     string  `gorm:"type:text;index" json:"token"`
 	OwnerID   uint    `gorm:"constraint:OnDelete:CASCADE;" json:"user_id"`
 	Owner     User    `gorm:"foreignKey:OwnerID"`
 	ProblemID uint    `gorm:"constraint:OnDelete:CASCADE;" json:"problem_id"`
@@ -0,0 +1,170 @@
+package serve
+
+import (
+	"fmt"
+	"strconv"
+	"strings"
+	"sync"
+	"time"
+
+	"gorm.io/gorm"
+)
+
+// problemCountsTTL bounds how long counts may miss problems added outside this judge,
+// by another judge instance or by loading fixtures into the database
+const problemCountsTTL = time.Minute
+
+// keysetIndexes serve the problemset pages, newest first, without sorting the archive
+var keysetIndexes = []string{
+	"CREATE INDEX IF NOT EXISTS idx_problems_published_keyset ON problems (created_at, id) " +
+		"WHERE is_published AND deleted_at IS NULL",
+	"CREATE INDEX IF NOT EXISTS idx_problems_keyset ON problems (created_at, id) WHERE deleted_at IS NULL",
+	"CREATE INDEX IF NOT EXISTS idx_problems_owner_keyset ON problems (owner_id, created_at, id) " +
+		"WHERE deleted_at IS NULL",
+}
+
+// problemCounter caches the problem totals the problemset pages show, so paging does not
+// count the archive on every request. Adding and publishing problems adjust the counts;
+// they are counted again once they are older than problemCountsTTL.
+type problemCounter struct {
+	mu          sync.Mutex
+	loadedAt    time.Time
+	published   int64
+	unpublished int64
+	byOwner     map[uint]int64 // counted on the first "my problems" page of each owner
+}
+
+var problemCounts = &problemCounter{}
+
+// fresh counts the problems again when the counts are stale; the caller holds mu
+func (p *problemCounter) fresh() error {
+	if time.Since(p.loadedAt) < problemCountsTTL {
+		return nil
+	}
+	var published, unpublished int64
+	if err := db.Model(&Problem{}).Where("is_published = ?", true).Count(&published).Error; err != nil {
+		return err
+	}
+	if err := db.Model(&Problem{}).Where("is_published = ?", false).Count(&unpublished).Error; err != nil {
+		return err
+	}
+	p.published, p.unpublished = published, unpublished
+	p.byOwner = map[uint]int64{}
+	p.loadedAt = time.Now()
+	return nil
+}
+
+func (p *problemCounter) Published() (int64, error) {
+	p.mu.Lock()
+	defer p.mu.Unlock()
+	err := p.fresh()
+	return p.published, err
+}
+
+func (p *problemCounter) All() (int64, error) {
+	p.mu.Lock()
+	defer p.mu.Unlock()
+	err := p.fresh()
+	return p.published + p.unpublished, err
+}
+
+func (p *problemCounter) Owned(ownerID uint) (int64, error) {
+	p.mu.Lock()
+	defer p.mu.Unlock()
+	if err := p.fresh(); err != nil {
+		return 0, err
+	}
+	if total, found := p.byOwner[ownerID]; found {
+		return total, nil
+	}
+	var total int64
+	if err := db.Model(&Problem{}).Where("owner_id = ?", ownerID).Count(&total).Error; err != nil {
+		return 0, err
+	}
+	p.byOwner[ownerID] = total
+	return total, nil
+}
+
+// Added counts a new problem, which starts unpublished
+func (p *problemCounter) Added(ownerID uint) {
+	p.mu.Lock()
+	defer p.mu.Unlock()
+	p.unpublished++
+	if _, found := p.byOwner[ownerID]; found {
+		p.byOwner[ownerID]++
+	}
+}
+
+// Publish moves a problem between the published and unpublished counts
+func (p *problemCounter) Publish(published bool) {
+	p.mu.Lock()
+	defer p.mu.Unlock()
+	if published {
+		p.published++
+		p.unpublished--
+	} else {
+		p.published--
+		p.unpublished++
+	}
+}
+
+// Invalidate makes the next page count the problems again
+func (p *problemCounter) Invalidate() {
+	p.mu.Lock()
+	defer p.mu.Unlock()
+	p.loadedAt = time.Time{}
+}
+
+// problemCursor is the (created_at, id) of the last problem on a page, e.g. 1714000000123456_42;
+// the microseconds match the precision PostgreSQL stores
+func problemCursor(problem Problem) string {
+	return fmt.Sprintf("%d_%d", problem.CreatedAt.UnixMicro(), problem.ID)
+}
+
+func parseProblemCursor(cursor string) (time.Time, uint, bool) {
+	micros, id, found := strings.Cut(cursor, "_")
+	if !found {
+		return time.Time{}, 0, false
+	}
+	createdAt, err := strconv.ParseInt(micros, 10, 64)
+	if err != nil {
+		return time.Time{}, 0, false
+	}
+	problemID, err := strconv.ParseUint(id, 10, 64)
+	if err != nil {
+		return time.Time{}, 0, false
+	}
+	return time.UnixMicro(createdAt), uint(problemID), true
+}
+
+// problemPage reads limit problems of query newest first, after the cursor of the
+// previous page or before the cursor of the next one, and tells whether there are
+// more in either direction. Reading one problem past the page answers that without
+// a count, and the row comparison lets PostgreSQL start right at the cursor.
+func problemPage(query *gorm.DB, after string, before string, limit int) (problems []Problem, hasPrev bool, hasNext bool, err error) {
+	backward := false
+	if createdAt, id, ok := parseProblemCursor(before); ok {
+		backward = true
+		query = query.Where("(created_at, id) > (?, ?)", createdAt, id).Order("created_at, id")
+	} else if createdAt, id, ok := parseProblemCursor(after); ok {
+		hasPrev = true
+		query = query.Where("(created_at, id) < (?, ?)", createdAt, id).Order("created_at DESC, id DESC")
+	} else {
+		query = query.Order("created_at DESC, id DESC")
+	}
+	if err = query.Limit(limit + 1).Find(&problems).Error; err != nil {
+		return nil, false, false, err
+	}
+
+	more := len(problems) > limit
+	if more {
+		problems = problems[:limit]
+	}
+	if backward {
+		for i, j := 0, len(problems)-1; i < j; i, j = i+1, j-1 {
+			problems[i], problems[j] = problems[j], problems[i]
+		}
+		return problems, more, true, nil
+	}
+	return problems, hasPrev, more, nil
+}
@@ -261,49 +261,37 @@ func problemsetView(c *fiber.Ctx) error {
 		return c.Redirect("/login")
 	}
 	myproblems := c.Query("myproblems", "-")
-	limit := c.QueryInt("limit", 10)  // Default limit = 10
-	offset := c.QueryInt("offset", 0) // Default offset = 0
+	limit := c.QueryInt("limit", 10) // Default limit = 10
+	page := c.QueryInt("page", 1)    // only shown, the cursors pick the problems
 
 	if limit > 100 {
 		limit = 100 // Max limit = 100
 	} else if limit < 1 {
 		limit = 1
 	}
-	if offset < 0 {
-		offset = 0
-	}
 
-	var problems []Problem
-	total := int64(publishedProblemsCount)
+	var total int64
 	var err error
+	query := db.Model(&Problem{}).
+		Select("id, title, statement, is_published, published_at, created_at")
 	// start := time.Now()
 	if myproblems == "yes" {
 		if user.IsAdmin {
-			total = int64(publishedProblemsCount + notPublishedProblemsCount)
-			err = db.Model(&Problem{}).
-				Select("id, title, statement, is_published, published_at").
-				// Where("is_published = ?", true).
-				Offset(offset).Limit(limit).
-				Order("published_at DESC").
-				Find(&problems).Error
-
+			total, err = problemCounts.All()
 		} else {
-			err = db.Model(&Problem{}).
-				Select("id, title, statement, is_published, published_at").
-				Where("owner_id = ?", user.ID).
-				Count(&total).
-				Offset(offset).Limit(limit).
-				Order("published_at DESC").
-				Find(&problems).Error
+			total, err = problemCounts.Owned(user.ID)
+			query = query.Where("owner_id = ?", user.ID)
 		}
 	} else {
 		myproblems = "no"
-		err = db.Model(&Problem{}).
-			Select("id, title, statement, is_published, published_at").
-			Where("is_published = ?", true).
-			Offset(offset).Limit(limit).
-			Order("published_at DESC").
-			Find(&problems).Error
+		total, err = problemCounts.Published()
+		query = query.Where("is_published = ?", true)
+	}
+
+	var problems []Problem
+	var hasPrev, hasNext bool
+	if err == nil {
+		problems, hasPrev, hasNext, err = problemPage(query, c.Query("after"), c.Query("before"), limit)
 	}
 
 	// duration := time.Since(start)
@@ -316,21 +304,35 @@ func problemsetView(c *fiber.Ctx) error {
 			"Problems":   problems,
 			"Total":      int(total),
 			"Limit":      0,
-			"Offset":     0,
 			"Pages":      0,
 			"Myproblems": myproblems,
 		})
 	}
 
+	if !hasPrev || page < 1 {
+		page = 1
+	}
+	pages := (int(total) + limit - 1) / limit // Total pages
+	if page > pages || !hasNext {             // the cursors know better than a cached count
+		pages = page
+	}
+	prevCursor, nextCursor := "", ""
+	if hasPrev && len(problems) > 0 {
+		prevCursor = problemCursor(problems[0])
+	}
+	if hasNext && len(problems) > 0 {
+		nextCursor = problemCursor(problems[len(problems)-1])
+	}
 	return render(c, "problemset", fiber.Map{
 		"PageTitle":   "CloudiJudge | problemset",
 		"User":        user,
 		"Problems":    problems,
 		"Total":       int(total),
 		"Limit":       limit,
-		"Offset":      offset,
-		"CurrentPage": (offset / limit) + 1,
-		"Pages":       (int(total) + limit - 1) / limit, // Total pages
+		"PrevCursor":  prevCursor,
+		"NextCursor":  nextCursor,
+		"CurrentPage": page,
+		"Pages":       pages,
 		"Myproblems":  myproblems,
 	})
 }
@@ -403,6 +405,7 @@ func handleAddProblemView(c *fiber.Ctx) error {
 				log.Println("error in save output file for new problem", err)
 				errorMsg = "An unknown error has been occurred!"
 			} else {
+				problemCounts.Added(problem.OwnerID)
 				return c.Redirect(fmt.Sprintf("/problemset/%d", problem.ID))
 			}
 			db.Delete(&problem)
@@ -522,8 +525,14 @@ func handleEditProblemView(c *fiber.Ctx) error {
 			problem.Statement = c.FormValue("statement")
 			problem.TimeLimit = parseInt(c.FormValue("time_limit"))
 			problem.MemoryLimit = parseInt(c.FormValue("memory_limit"))
-			problem.IsPublished = false
-			db.Save(&problem)
+			wasPublished := problem.IsPublished
+			problem.IsPublished = false // an edited problem is published again by an admin
+			if err := db.Save(&problem).Error; err != nil {
+				log.Println("error in edit problem", problem.ID, err)
+				problemCounts.Invalidate()
+			} else if wasPublished {
+				problemCounts.Publish(false)
+			}
 			return c.Redirect(fmt.Sprintf("/problemset/%d", problem.ID))
 		}
 
@@ -627,20 +636,22 @@ func handlePublishProblemView(c *fiber.Ctx) error {
 		return error_403(c)
 	}
 
+	wasPublished := problem.IsPublished
 	if command == "publish" {
 		if !problem.IsPublished {
 			problem.IsPublished = true
 			now := time.Now()
 			problem.PublishedAt = &now
 		}
-		publishedProblemsCount++
-		notPublishedProblemsCount--
 	} else {
-		publishedProblemsCount--
-		notPublishedProblemsCount++
 		problem.IsPublished = false
 	}
-	db.Save(&problem)
+	if err := db.Save(&problem).Error; err != nil {
+		log.Println("error in publish problem", err)
+		problemCounts.Invalidate()
+	} else if problem.IsPublished != wasPublished { // publishing twice does not count twice
+		problemCounts.Publish(problem.IsPublished)
+	}
 	if c.Query("next", "-") == "problemset" {
 		if c.Query("myproblems", "-") == "yes" {
 			return c.Redirect("/problemset?myproblems=yes")
@@ -829,18 +840,32 @@ func runCodeCallbackView(c *fiber.Ctx) error {
 	if err := c.BodyParser(&data); err != nil {
 		return error_404(c)
 	}
-	var submission Submission
-	if err := db.Where("token = ?", data.CallbackToken).Preload("Owner").First(&submission).Error; err != nil {
+	applied, err := applyVerdicts([]code_runner.ResultData{data})
+	if err != nil || applied == 0 {
 		return error_404(c)
 	}
-	submission.Status = data.Status
-	if data.Status == "Accepted" {
-		user := submission.Owner
-		user.SuccessAttemps += 1
-		db.Save(&user)
-	}
-	db.Save(&submission)
 	return c.Status(fiber.StatusOK).JSON(fiber.Map{
 		"ok": true,
 	})
 }
+
+func runCodeBatchCallbackView(c *fiber.Ctx) error {
+	var data code_runner.ResultBatch
+
+	if err := c.BodyParser(&data); err != nil {
+		return c.Status(fiber.StatusBadRequest).JSON(fiber.Map{
+			"error": "Invalid JSON",
+		})
+	}
+	applied, err := applyVerdicts(data.Results)
+	if err != nil {
+		log.Println("error in applying verdicts", err)
+		return c.Status(fiber.StatusInternalServerError).JSON(fiber.Map{
+			"error": "An unknown error has been occurred!",
+		})
+	}
+	return c.Status(fiber.StatusOK).JSON(fiber.Map{
+		"ok":      true,
+		"applied": applied,
+	})
+}
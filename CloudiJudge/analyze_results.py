@@ -0,0 +1,277 @@
+import glob
+import json
+import math
+import os
+import sys
+import argparse
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from latency_histogram import LatencyHistogram, REPORTED_PERCENTILES, SUB_BUCKET_BITS
+
+# Configuration
+WINDOW = 10  # seconds per throughput window
+THRESHOLD = 10.0  # percent a latency percentile or throughput may get worse before it is a regression
+ERROR_THRESHOLD = 1.0  # percentage points the error rate may grow
+ALPHA = 0.01  # significance level of the latency shift test
+COMPARED_PERCENTILES = [50, 99]
+MIN_REQUESTS = 100  # fewer requests than this are too noisy to gate on error rate or throughput
+CONTAINER_KEYS = {"requests", "steps"}  # report() sections; their children are named directly
+
+_SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+
+def _bucket_values_ms(size: int) -> np.ndarray:
+    """Highest latency (ms) of every histogram bucket, same layout as latency_histogram"""
+    index = np.arange(size, dtype=np.int64)
+    exponent = np.maximum(index // _SUB_BUCKETS - 1, 0)
+    sub_bucket = index % _SUB_BUCKETS + _SUB_BUCKETS
+    values_us = np.where(index < 2 * _SUB_BUCKETS, index, ((sub_bucket + 1) << exponent) - 1)
+    return values_us / 1000
+
+
+class Metric:
+    """One latency histogram of one results file, plus its success/failure counts and timeline"""
+
+    def __init__(self, name: str, source: str, node: Dict[str, Any], total_time: float):
+        self.name = name
+        self.source = source
+        histogram = LatencyHistogram.from_dict(node["latency_histogram"])
+        self.counts = np.frombuffer(histogram.counts, dtype=np.int64)
+        self.min = histogram.min if histogram.total_count else 0.0
+        self.max = histogram.max
+        self.total_ms = histogram.total_ms
+        self.successful = _first_count(node, ("successful", "received"), histogram.total_count)
+        self.failed = _first_count(node, ("failed", "timed_out"), 0)
+        self.total_time = total_time
+        timeline = np.array(node.get("timeline") or [], dtype=np.int64).reshape(-1, 3)
+        self.seconds, self.timeline_ok, self.timeline_failed = timeline.T
+
+
+def _first_count(node: Dict[str, Any], prefixes: Tuple[str, ...], default: int) -> int:
+    for key, value in node.items():
+        if key.startswith(prefixes) and isinstance(value, int):
+            return value
+    return default
+
+
+def _walk(node: Any, path: List[str]) -> Iterator[Tuple[List[str], Dict[str, Any]]]:
+    if not isinstance(node, dict):
+        return
+    if "latency_histogram" in node:
+        yield path, node
+    for key, child in node.items():
+        yield from _walk(child, path if key in CONTAINER_KEYS else path + [key])
+
+
+def load_results(path: str) -> Dict[str, Metric]:
+    """Every histogram in a *_load_test_results_*.json file, named <test>/<section>"""
+    with open(path) as f:
+        data = json.load(f)
+    test = os.path.basename(path).split("_load_test_results")[0]
+    metrics = {}
+    for keys, node in _walk(data, []):
+        name = "/".join([test] + keys)
+        metrics[name] = Metric(name, path, node, data.get("total_time", 0.0))
+    return metrics
+
+
+class MetricTable:
+    """Columnar view of one metric across many runs: a (runs x buckets) count matrix"""
+
+    def __init__(self, metrics: List[Metric]):
+        self.counts = np.vstack([m.counts for m in metrics])
+        self.mins = np.array([m.min for m in metrics])
+        self.maxs = np.array([m.max for m in metrics])
+        self.total_ms = np.array([m.total_ms for m in metrics])
+        self.successful = np.array([m.successful for m in metrics], dtype=np.int64)
+        self.failed = np.array([m.failed for m in metrics], dtype=np.int64)
+        self.total_time = np.array([m.total_time for m in metrics])
+        self.metrics = metrics
+        self.values = _bucket_values_ms(self.counts.shape[1])
+
+    @property
+    def totals(self) -> np.ndarray:
+        return self.counts.sum(axis=1)
+
+    def percentiles(self, percentiles: List[float]) -> np.ndarray:
+        """(runs x percentiles) latencies in ms, same definition as LatencyHistogram.percentile"""
+        cumulative = self.counts.cumsum(axis=1)
+        totals = cumulative[:, -1:]
+        thresholds = np.maximum(1, np.ceil(totals * np.array(percentiles) / 100))
+        indexes = np.stack([
+            np.argmax(cumulative >= thresholds[:, [column]], axis=1) for column in range(len(percentiles))
+        ], axis=1)
+        result = np.clip(self.values[indexes], self.mins[:, None], self.maxs[:, None])
+        return np.where(totals > 0, result, 0)
+
+    def means(self) -> np.ndarray:
+        totals = self.totals
+        return np.divide(self.total_ms, totals, out=np.zeros(len(totals)), where=totals > 0)
+
+    def error_rates(self) -> np.ndarray:
+        """Failed requests as a percentage of all requests"""
+        total = self.successful + self.failed
+        return np.divide(100 * self.failed, total, out=np.zeros(len(total)), where=total > 0)
+
+    def throughput(self) -> np.ndarray:
+        total = self.successful + self.failed
+        return np.divide(total, self.total_time, out=np.zeros(len(total)), where=self.total_time > 0)
+
+    def merged(self) -> "MetricTable":
+        """All runs summed into one, e.g. to use several baseline runs together"""
+        merged = MetricTable.__new__(MetricTable)
+        merged.counts = self.counts.sum(axis=0, keepdims=True)
+        merged.mins = self.mins.min(keepdims=True)
+        merged.maxs = self.maxs.max(keepdims=True)
+        merged.total_ms = self.total_ms.sum(keepdims=True)
+        merged.successful = self.successful.sum(keepdims=True)
+        merged.failed = self.failed.sum(keepdims=True)
+        merged.total_time = self.total_time.sum(keepdims=True)
+        merged.metrics = self.metrics
+        merged.values = self.values
+        return merged
+
+
+def throughput_windows(metric: Metric, window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Requests per second and error rate (%) in consecutive windows of the run"""
+    if not len(metric.seconds):
+        return np.zeros(0), np.zeros(0)
+    slot = (metric.seconds - metric.seconds.min()) // window
+    requests = np.bincount(slot, weights=metric.timeline_ok + metric.timeline_failed)
+    failed = np.bincount(slot, weights=metric.timeline_failed)
+    error_rate = np.divide(100 * failed, requests, out=np.zeros(len(requests)), where=requests > 0)
+    return requests / window, error_rate
+
+
+def mann_whitney(baseline: np.ndarray, candidate: np.ndarray) -> Tuple[float, float]:
+    """Mann-Whitney U test on two binned samples with the same buckets
+
+    Returns z (positive when the candidate is slower) and the one-sided p value,
+    using mid ranks for samples in the same bucket and the tie-corrected variance.
+    """
+    n_baseline, n_candidate = baseline.sum(), candidate.sum()
+    total = n_baseline + n_candidate
+    if not n_baseline or not n_candidate:
+        return 0.0, 1.0
+    ties = baseline + candidate
+    mid_ranks = np.cumsum(ties) - ties + (ties + 1) / 2
+    u_candidate = float((candidate * mid_ranks).sum()) - n_candidate * (n_candidate + 1) / 2
+    tie_term = float((ties.astype(np.float64) ** 3 - ties).sum()) / (total * (total - 1)) if total > 1 else 0
+    variance = n_baseline * n_candidate / 12 * ((total + 1) - tie_term)
+    if variance <= 0:
+        return 0.0, 1.0
+    z = (u_candidate - n_baseline * n_candidate / 2) / math.sqrt(variance)
+    return z, 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def _change(baseline: float, candidate: float) -> float:
+    return (candidate - baseline) / baseline * 100 if baseline else 0.0
+
+
+def load_many(patterns: List[str]) -> List[Dict[str, Metric]]:
+    paths = sorted({path for pattern in patterns for path in glob.glob(pattern)})
+    if not paths:
+        sys.exit(f"No results files match {' '.join(patterns)}")
+    return [load_results(path) for path in paths]
+
+
+def tables_by_metric(runs: List[Dict[str, Metric]]) -> Dict[str, MetricTable]:
+    names = sorted({name for run in runs for name in run})
+    return {name: MetricTable([run[name] for run in runs if name in run]) for name in names}
+
+
+def analyze(patterns: List[str], window: int, metric_filter: Optional[str]):
+    """Print percentiles, error rates and throughput windows of every run"""
+    runs = load_many(patterns)
+    print(f"Loaded {len(runs)} results files")
+    for name, table in tables_by_metric(runs).items():
+        if metric_filter and metric_filter not in name:
+            continue
+        percentiles = table.percentiles(REPORTED_PERCENTILES)
+        error_rates = table.error_rates()
+        throughput = table.throughput()
+        means = table.means()
+        print(f"\n{name}")
+        header = " | ".join(f"p{p:g}" for p in REPORTED_PERCENTILES)
+        print(f"  {'run':<50} | count | errors % | req/s | mean | {header} | window req/s min-max")
+        for row, metric in enumerate(table.metrics):
+            label = os.path.basename(metric.source)
+            rates, _ = throughput_windows(metric, window)
+            windows = f"{rates.min():.1f}-{rates.max():.1f}" if len(rates) else "-"
+            values = " | ".join(f"{v:.1f}" for v in percentiles[row])
+            print(f"  {label:<50} | {table.totals[row]:5d} | {error_rates[row]:8.2f} | {throughput[row]:5.1f} | "
+                  f"{means[row]:.1f} | {values} | {windows}")
+
+
+def compare(baseline_patterns: List[str], candidate_patterns: List[str], threshold: float,
+            error_threshold: float, alpha: float, metric_filter: Optional[str]) -> bool:
+    """Print how the candidate differs from the baseline; True when it regressed"""
+    baseline = tables_by_metric(load_many(baseline_patterns))
+    candidate = tables_by_metric(load_many(candidate_patterns))
+    regressed = False
+    for name in sorted(set(baseline) & set(candidate)):
+        if metric_filter and metric_filter not in name:
+            continue
+        old, new = baseline[name].merged(), candidate[name].merged()
+        old_percentiles = old.percentiles(COMPARED_PERCENTILES)[0]
+        new_percentiles = new.percentiles(COMPARED_PERCENTILES)[0]
+        z, p_value = mann_whitney(old.counts[0], new.counts[0])
+        problems = []
+        for percentile, before, after in zip(COMPARED_PERCENTILES, old_percentiles, new_percentiles):
+            change = _change(before, after)
+            if change > threshold and p_value < alpha:
+                problems.append(f"p{percentile:g} +{change:.1f}%")
+        error_change = new.error_rates()[0] - old.error_rates()[0]
+        throughput_change = _change(old.throughput()[0], new.throughput()[0])
+        if min(old.totals[0], new.totals[0]) >= MIN_REQUESTS:
+            if error_change > error_threshold:
+                problems.append(f"errors +{error_change:.2f} pp")
+            if throughput_change < -threshold:
+                problems.append(f"throughput {throughput_change:.1f}%")
+
+        status = "REGRESSION" if problems else "ok"
+        print(f"\n{name}: {status}{' (' + ', '.join(problems) + ')' if problems else ''}")
+        for percentile, before, after in zip(COMPARED_PERCENTILES, old_percentiles, new_percentiles):
+            print(f"  p{percentile:g}: {before:.1f} ms -> {after:.1f} ms ({_change(before, after):+.1f}%)")
+        print(f"  errors: {old.error_rates()[0]:.2f}% -> {new.error_rates()[0]:.2f}%")
+        print(f"  throughput: {old.throughput()[0]:.1f} -> {new.throughput()[0]:.1f} req/s "
+              f"({throughput_change:+.1f}%)")
+        print(f"  latency shift: z = {z:.2f}, one-sided p = {p_value:.3g}")
+        regressed = regressed or bool(problems)
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Analyze load test results files, or compare a candidate run with a baseline')
+    parser.add_argument('results', nargs='*', help='Results files or glob patterns to analyze')
+    parser.add_argument('--baseline', nargs='+', help='Baseline results files (several are merged)')
+    parser.add_argument('--candidate', nargs='+', help='Candidate results files (several are merged)')
+    parser.add_argument('--metric', default=None, help='Only metrics whose name contains this text')
+    parser.add_argument('--window', type=int, default=WINDOW,
+                      help=f'Seconds per throughput window (default: {WINDOW})')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                      help=f'Allowed latency/throughput change in percent (default: {THRESHOLD:g})')
+    parser.add_argument('--error-threshold', type=float, default=ERROR_THRESHOLD,
+                      help=f'Allowed error rate increase in percentage points (default: {ERROR_THRESHOLD:g})')
+    parser.add_argument('--alpha', type=float, default=ALPHA,
+                      help=f'Significance level of the latency shift test (default: {ALPHA:g})')
+
+    args = parser.parse_args()
+    if args.baseline or args.candidate:
+        if not (args.baseline and args.candidate):
+            parser.error("--baseline and --candidate are used together")
+        if compare(args.baseline, args.candidate, args.threshold, args.error_threshold, args.alpha, args.metric):
+            print("\nPerformance regression detected")
+            sys.exit(1)
+        print("\nNo regression")
+    elif args.results:
+        analyze(args.results, args.window, args.metric)
+    else:
+        parser.error("give results files to analyze, or --baseline and --candidate")
+
+
+if __name__ == "__main__":
+    main()
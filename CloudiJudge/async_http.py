@@ -0,0 +1,548 @@
+import asyncio
+import json
+import ssl
+import time
+import uuid
+from collections import deque
+from http import HTTPStatus
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple, Union
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from latency_histogram import LatencyHistogram
+
+# Configuration
+DEFAULT_TIMEOUT = 10  # seconds
+DEFAULT_POOL_SIZE = 100  # connections per host
+DEFAULT_IDLE_TIMEOUT = 30  # seconds a pooled connection may stay idle before it is closed instead of reused
+SERVER_BACKLOG = 1024  # pending connections of serve(); the OS default is too small under load
+USER_AGENT = "CloudiJudge-loadtest/1.0"
+
+
+class HttpError(Exception):
+    """Raised when a response can not be read from the connection"""
+
+
+class Response:
+    """A fully read HTTP response"""
+
+    def __init__(self, status_code: int, reason: str, headers: List[Tuple[str, str]], body: bytes):
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers
+        self.content = body
+
+    def header(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        """Return the first header with the given name (case insensitive)"""
+        name = name.lower()
+        for key, value in self.headers:
+            if key.lower() == name:
+                return value
+        return default
+
+    def header_list(self, name: str) -> List[str]:
+        """Return every header with the given name (case insensitive)"""
+        name = name.lower()
+        return [value for key, value in self.headers if key.lower() == name]
+
+    @property
+    def cookies(self) -> Dict[str, str]:
+        """Name/value pairs set by Set-Cookie headers (attributes are ignored)"""
+        cookies = {}
+        for header in self.header_list("Set-Cookie"):
+            name, _, value = header.split(";", 1)[0].partition("=")
+            cookies[name.strip()] = value.strip()
+        return cookies
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+
+_CONNECTION_COUNTERS = ["requests", "reused", "pipelined", "opened", "expired", "evicted"]
+
+
+class ConnectionStats:
+    """Connection level counters of an HttpClient, kept apart from request latency
+
+    connect is the time to open a connection (TCP and TLS handshake) and ttfb the
+    time from writing a request to reading its status line, so a slow server and
+    slow connection setup can be told apart.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.reused = 0  # sent on a connection that had been used before
+        self.pipelined = 0  # written while an earlier response on the connection was still pending
+        self.opened = 0
+        self.expired = 0  # idle connections closed after idle_timeout
+        self.evicted = 0  # idle connections closed to open one to another host under max_connections
+        self.connect = LatencyHistogram()
+        self.ttfb = LatencyHistogram()
+
+    @property
+    def reuse_rate(self) -> float:
+        return self.reused / self.requests if self.requests else 0.0
+
+    def merge(self, other: "ConnectionStats"):
+        for name in _CONNECTION_COUNTERS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.connect.merge(other.connect)
+        self.ttfb.merge(other.ttfb)
+
+    def drain(self) -> "ConnectionStats":
+        """Move the counters into a new object and start over, keeping this one in use by the client"""
+        delta = ConnectionStats()
+        for name in _CONNECTION_COUNTERS:
+            setattr(delta, name, getattr(self, name))
+            setattr(self, name, 0)
+        delta.connect, self.connect = self.connect, LatencyHistogram()
+        delta.ttfb, self.ttfb = self.ttfb, LatencyHistogram()
+        return delta
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = {name: getattr(self, name) for name in _CONNECTION_COUNTERS}
+        result["connect"] = self.connect.to_dict()
+        result["ttfb"] = self.ttfb.to_dict()
+        return result
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ConnectionStats":
+        stats = cls()
+        for name in _CONNECTION_COUNTERS:
+            setattr(stats, name, data[name])
+        stats.connect = LatencyHistogram.from_dict(data["connect"])
+        stats.ttfb = LatencyHistogram.from_dict(data["ttfb"])
+        return stats
+
+
+class _Connection:
+    """One keep-alive TCP connection of a pool"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.requests = 0  # written so far
+        self.in_flight = 0
+        self.last_used = time.monotonic()
+        self.reads = asyncio.Lock()  # responses are read in the order their requests were written
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+        self.writer.close()
+
+
+class _HostPool:
+    """Connections of a single host, at most size of them open"""
+
+    def __init__(self, client: "HttpClient", host: str, port: int, use_ssl: bool, size: int):
+        self.client = client
+        self.host = host
+        self.port = port
+        self.ssl = ssl.create_default_context() if use_ssl else None
+        self.size = size
+        self.open: List[_Connection] = []
+        self.connecting = 0
+        self.idle: Deque[_Connection] = deque()
+        self.waiters: Deque[asyncio.Future] = deque()
+
+    async def acquire(self) -> _Connection:
+        while True:
+            conn = self._take_idle()
+            if conn is None and len(self.open) + self.connecting < self.size and self.client._reserve(self):
+                conn = await self._connect()
+            if conn is None:
+                conn = self._pipelined()
+            if conn is not None:
+                conn.in_flight += 1
+                conn.requests += 1
+                if self.client.pipeline > 1:
+                    self.wake()  # the next waiter may fit on this or another busy connection too
+                return conn
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if not waiter.cancelled():
+                    self.client._wake(self)  # woken but timed out before using it; pass the turn on
+                raise
+
+    def _take_idle(self) -> Optional[_Connection]:
+        now = time.monotonic()
+        while self.idle:
+            conn = self.idle.pop()
+            if now - conn.last_used > self.client.idle_timeout:
+                self.client.stats.expired += 1
+                self._close(conn)
+            elif conn.reader.at_eof():
+                self._close(conn)
+            else:
+                return conn
+        return None
+
+    def _pipelined(self) -> Optional[_Connection]:
+        """The least busy connection that can take another request before its responses are read"""
+        pipeline = self.client.pipeline
+        if pipeline <= 1:
+            return None
+        candidates = [conn for conn in self.open if 0 < conn.in_flight < pipeline and self._accepts(conn)]
+        if not candidates:
+            return None
+        self.client.stats.pipelined += 1
+        return min(candidates, key=lambda conn: conn.in_flight)
+
+    def _accepts(self, conn: _Connection) -> bool:
+        max_requests = self.client.max_requests
+        return not conn.closed and not conn.reader.at_eof() and (not max_requests or conn.requests < max_requests)
+
+    async def _connect(self) -> _Connection:
+        start_time = time.perf_counter()
+        self.connecting += 1
+        try:
+            reader, writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl)
+        except BaseException:
+            self.client._released()
+            self.client._wake(self)
+            raise
+        finally:
+            self.connecting -= 1
+        self.client.stats.opened += 1
+        self.client.stats.connect.record((time.perf_counter() - start_time) * 1000)
+        conn = _Connection(reader, writer)
+        self.open.append(conn)
+        return conn
+
+    def release(self, conn: _Connection, reusable: bool):
+        conn.in_flight -= 1
+        if not reusable:
+            self._close(conn)  # requests pipelined behind this one can no longer read their responses
+        elif conn.in_flight == 0:
+            if self._accepts(conn):
+                conn.last_used = time.monotonic()
+                self.idle.append(conn)
+            else:
+                self._close(conn)
+        self.client._wake(self)
+
+    def evict(self) -> bool:
+        """Close the least recently used idle connection"""
+        if not self.idle:
+            return False
+        self._close(self.idle.popleft())
+        return True
+
+    def _close(self, conn: _Connection):
+        if conn in self.open:
+            self.open.remove(conn)
+            self.client._released()
+        conn.close()
+        if conn in self.idle:
+            self.idle.remove(conn)
+
+    def wake(self) -> bool:
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return True
+        return False
+
+    def close(self):
+        for conn in list(self.open):
+            self._close(conn)
+
+
+class HttpClient:
+    """Asyncio HTTP/1.1 client keeping a pool of keep-alive connections per host
+
+    pool_size bounds the connections open to one host and max_connections those
+    open in total. Connections idle for longer than idle_timeout or that served
+    max_requests requests are closed. With pipeline > 1, once every connection a
+    host may have is busy, up to pipeline requests are written to a connection
+    before its responses are read.
+    """
+
+    def __init__(self, base_url: str, pool_size: int = DEFAULT_POOL_SIZE, timeout: float = DEFAULT_TIMEOUT,
+                 max_connections: Optional[int] = None, pipeline: int = 1,
+                 idle_timeout: float = DEFAULT_IDLE_TIMEOUT, max_requests: Optional[int] = None,
+                 stats: Optional[ConnectionStats] = None):
+        self.base_url = base_url.rstrip("/")
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.pipeline = pipeline
+        self.idle_timeout = idle_timeout
+        self.max_requests = max_requests
+        self.stats = stats if stats is not None else ConnectionStats()
+        self.open_connections = 0
+        self._pools: Dict[Tuple[str, str, int], _HostPool] = {}
+
+    def _pool_for(self, scheme: str, host: str, port: int) -> _HostPool:
+        key = (scheme, host, port)
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = _HostPool(self, host, port, scheme == "https", self.pool_size)
+            self._pools[key] = pool
+        return pool
+
+    def _reserve(self, pool: _HostPool) -> bool:
+        """Count a connection about to be opened, closing an idle one elsewhere if the total is reached"""
+        if self.max_connections and self.open_connections >= self.max_connections:
+            if not any(other.evict() for other in self._pools.values() if other is not pool):
+                return False
+            self.stats.evicted += 1
+        self.open_connections += 1
+        return True
+
+    def _released(self):
+        self.open_connections -= 1
+
+    def _wake(self, pool: _HostPool):
+        """Let a request waiting for a connection retry, preferring one for the same host"""
+        if not pool.wake():
+            any(other.wake() for other in self._pools.values() if other is not pool)
+
+    async def get(self, url: str, **kwargs) -> Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        json: Any = None,
+        data: Optional[Dict[str, Any]] = None,
+        body: Optional[Union[bytes, memoryview]] = None,
+        content_type: Optional[str] = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+    ) -> Response:
+        """Send a request and read the whole response; url may be a path relative to base_url"""
+        if url.startswith("/"):
+            url = self.base_url + url
+        parts = urlsplit(url)
+        scheme = parts.scheme or "http"
+        port = parts.port or (443 if scheme == "https" else 80)
+        target = parts.path or "/"
+        if parts.query:
+            target += "?" + parts.query
+
+        if json is not None:
+            body = _dump_json(json)
+            content_type = "application/json"
+        elif data is not None:
+            body = urlencode(data).encode()
+            content_type = "application/x-www-form-urlencoded"
+
+        head = [f"{method} {target} HTTP/1.1", f"Host: {parts.netloc}", f"User-Agent: {USER_AGENT}"]
+        if body is not None:
+            head.append(f"Content-Length: {len(body)}")
+            if content_type:
+                head.append(f"Content-Type: {content_type}")
+        for name, value in (headers or {}).items():
+            head.append(f"{name}: {value}")
+        payload = ("\r\n".join(head) + "\r\n\r\n").encode("latin-1")
+
+        pool = self._pool_for(scheme, parts.hostname, port)
+        return await asyncio.wait_for(
+            self._exchange(pool, method, payload, body),
+            timeout if timeout is not None else self.timeout,
+        )
+
+    async def _exchange(self, pool: _HostPool, method: str, payload: bytes,
+                        body: Optional[Union[bytes, memoryview]]) -> Response:
+        # A pooled connection may have been closed by the server while idle; retry once on a fresh one
+        for attempt in range(2):
+            conn = await pool.acquire()
+            reused = conn.requests > 1
+            reusable = False
+            try:
+                start_time = time.perf_counter()
+                conn.writer.write(payload)
+                if body:
+                    conn.writer.write(body)
+                async with conn.reads:
+                    if conn.closed:
+                        raise _ConnectionLost("an earlier request on the connection failed")
+                    await conn.writer.drain()
+                    response, reusable, first_byte = await _read_response(conn.reader, method)
+                self.stats.requests += 1
+                self.stats.reused += reused
+                self.stats.ttfb.record((first_byte - start_time) * 1000)
+                return response
+            except (ConnectionResetError, BrokenPipeError, _EmptyResponse):
+                if not reused or attempt:
+                    raise
+            finally:
+                pool.release(conn, reusable)
+        raise HttpError("unreachable")
+
+    async def close(self):
+        for pool in self._pools.values():
+            pool.close()
+        self._pools.clear()
+
+
+class _EmptyResponse(HttpError):
+    """The server closed the connection before sending a status line"""
+
+
+class _ConnectionLost(_EmptyResponse):
+    """A pipelined request whose connection was closed while it waited for its response"""
+
+
+def _dump_json(value: Any) -> bytes:
+    return json.dumps(value).encode()
+
+
+def encode_multipart(fields: Dict[str, str], files: Dict[str, Tuple[str, bytes, str]]) -> Tuple[bytes, str]:
+    """Encode form fields and (filename, content, content_type) files as multipart/form-data
+
+    Returns the body and the Content-Type header value to send it with.
+    """
+    boundary = "----CloudiJudgeBoundary" + uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        )
+    for name, (filename, content, content_type) in files.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'.encode()
+        )
+        parts.append(content)
+        parts.append(b"\r\n")
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+async def _read_response(reader: asyncio.StreamReader, method: str) -> Tuple[Response, bool, float]:
+    """The response, whether the connection can be reused, and when its status line arrived"""
+    status_line = await reader.readline()
+    first_byte = time.perf_counter()
+    if not status_line:
+        raise _EmptyResponse("connection closed by server")
+    try:
+        version, status, *reason = status_line.decode("latin-1").rstrip("\r\n").split(" ", 2)
+        status_code = int(status)
+    except ValueError:
+        raise HttpError(f"malformed status line: {status_line!r}")
+
+    headers = []
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers.append((name.strip(), value.strip()))
+    response = Response(status_code, reason[0] if reason else "", headers, b"")
+
+    keep_alive = version == "HTTP/1.1" and (response.header("Connection") or "").lower() != "close"
+    length = response.header("Content-Length")
+    if method == "HEAD" or status_code in (204, 304) or 100 <= status_code < 200:
+        pass
+    elif (response.header("Transfer-Encoding") or "").lower() == "chunked":
+        response.content = await _read_chunked(reader)
+    elif length is not None:
+        response.content = await reader.readexactly(int(length))
+    else:
+        response.content = await reader.read()
+        keep_alive = False
+    return response, keep_alive, first_byte
+
+
+async def _read_chunked(reader: asyncio.StreamReader) -> bytes:
+    chunks = []
+    while True:
+        size = int((await reader.readline()).split(b";", 1)[0].strip() or b"0", 16)
+        if size == 0:
+            # Skip trailers
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            return b"".join(chunks)
+        chunks.append(await reader.readexactly(size))
+        await reader.readexactly(2)
+
+
+class Request:
+    """A fully read HTTP request received by serve()"""
+
+    def __init__(self, method: str, target: str, headers: List[Tuple[str, str]], body: bytes):
+        parts = urlsplit(target)
+        self.method = method
+        self.path = parts.path
+        self.query = dict(parse_qsl(parts.query))
+        self.headers = headers
+        self.content = body
+
+    header = Response.header
+    json = Response.json
+
+
+Handler = Callable[[Request], Awaitable[Response]]
+
+
+def json_response(value: Any, status_code: int = 200) -> Response:
+    return Response(status_code, "", [("Content-Type", "application/json")], _dump_json(value))
+
+
+async def serve(handler: Handler, host: str, port: int) -> asyncio.AbstractServer:
+    """Start a minimal keep-alive HTTP/1.1 server, used by test doubles and metrics endpoints"""
+    async def handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                try:
+                    response = await handler(request)
+                except Exception as e:
+                    response = Response(500, "", [("Content-Type", "text/plain")], str(e).encode())
+                keep_alive = (request.header("Connection") or "").lower() != "close"
+                reason = response.reason or HTTPStatus(response.status_code).phrase
+                head = [f"HTTP/1.1 {response.status_code} {reason}", f"Content-Length: {len(response.content)}"]
+                head += [f"{name}: {value}" for name, value in response.headers]
+                if not keep_alive:
+                    head.append("Connection: close")
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + response.content)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, HttpError, asyncio.CancelledError):
+            pass  # client went away, or the server is shutting down
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle_connection, host, port, backlog=SERVER_BACKLOG)
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Optional[Request]:
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+    try:
+        method, target, _ = request_line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise HttpError(f"malformed request line: {request_line!r}")
+
+    headers = []
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers.append((name.strip(), value.strip()))
+    request = Request(method, target, headers, b"")
+
+    if (request.header("Transfer-Encoding") or "").lower() == "chunked":
+        request.content = await _read_chunked(reader)
+    elif request.header("Content-Length"):
+        request.content = await reader.readexactly(int(request.header("Content-Length")))
+    return request
@@ -0,0 +1,191 @@
+import asyncio
+import json
+import random
+import time
+import argparse
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Tuple
+
+from async_http import HttpClient
+from fake_code_runner import DEFAULT_VERDICTS, parse_verdicts
+from generate_fixtures import copy_row, default_dsn, load_table, psql
+from latency_histogram import LatencyHistogram
+from load_engine import format_percentiles
+
+# Configuration
+BASE_URL = "http://localhost:80"
+CALLBACK_ENDPOINT = "/code/callback"
+BATCH_ENDPOINT = "/code/callback/batch"
+SUBMISSION_ID_BASE = 2_000_000_000  # seeded submissions, above generate_fixtures.py ids
+TOKEN_PREFIX = "callback-bench-"
+DEFAULT_MODES = "single,batch"
+DEFAULT_RUNS = 5000
+DEFAULT_CONCURRENCY = 32
+DEFAULT_BATCH_SIZE = 50  # verdicts per batch request; the code-runner sends at most 100
+SUBMISSION_COLUMNS = ["id", "created_at", "updated_at", "status", "token", "owner_id", "problem_id"]
+
+
+def first_id(dsn: str, table: str) -> int:
+    value = psql(dsn, f"SELECT id FROM {table} ORDER BY id LIMIT 1").strip()
+    if not value:
+        raise RuntimeError(f"no rows in {table}; create a user and a problem first")
+    return int(value)
+
+
+def seed_submissions(dsn: str, first: int, count: int, owner_id: int, problem_id: int):
+    """Waiting submissions of one user, so every accepted verdict increments the same row"""
+    now = datetime.now(timezone.utc)
+    rows = "".join(copy_row([first + offset, now, now, "waiting", f"{TOKEN_PREFIX}{first + offset}", owner_id,
+                             problem_id]) for offset in range(count))
+    load_table("submissions", SUBMISSION_COLUMNS, [rows.encode()], dsn, None)
+
+
+def success_attemps(dsn: str, owner_id: int) -> int:
+    return int(psql(dsn, f"SELECT success_attemps FROM users WHERE id = {owner_id}").strip())
+
+
+def remove_submissions(dsn: str, first: int, count: int, owner_id: int, accepted: int):
+    """Delete the seeded rows and take their accepted verdicts off the user again"""
+    psql(dsn, f"DELETE FROM submissions WHERE id BETWEEN {first} AND {first + count - 1}; "
+              f"UPDATE users SET success_attemps = success_attemps - {accepted} WHERE id = {owner_id}")
+
+
+async def post_callbacks(base_url: str, mode: str, results: List[Dict[str, Any]], concurrency: int,
+                         batch_size: int) -> Dict[str, Any]:
+    """Send every verdict, one per request or batch_size per request, from concurrency workers"""
+    if mode == "batch":
+        bodies = [(BATCH_ENDPOINT, {"results": results[i:i + batch_size]}, len(results[i:i + batch_size]))
+                  for i in range(0, len(results), batch_size)]
+    else:
+        bodies = [(CALLBACK_ENDPOINT, result, 1) for result in results]
+    pending = iter(bodies)
+    latency = LatencyHistogram()
+    counts = {"applied": 0, "failed_requests": 0}
+    client = HttpClient(base_url, pool_size=concurrency)
+
+    async def worker():
+        for path, body, size in pending:
+            start_time = time.perf_counter()
+            try:
+                response = await client.post(path, json=body)
+                ok = response.status_code == 200
+            except Exception:
+                ok = False
+            latency.record((time.perf_counter() - start_time) * 1000)
+            if not ok:
+                counts["failed_requests"] += 1
+            elif mode == "batch":
+                counts["applied"] += response.json().get("applied", 0)
+            else:
+                counts["applied"] += size
+
+    start_time = time.perf_counter()
+    try:
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+    finally:
+        await client.close()
+    elapsed = time.perf_counter() - start_time
+    return {
+        "requests": len(bodies),
+        "elapsed": elapsed,
+        "callbacks_per_second": counts["applied"] / elapsed if elapsed else 0,
+        "request_latency": latency,
+        **counts
+    }
+
+
+def run_mode(args: argparse.Namespace, mode: str, first: int, owner_id: int, problem_id: int,
+             verdicts: Tuple[List[str], List[float]]) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    results = [{"callback_token": f"{TOKEN_PREFIX}{first + offset}", "Status": rng.choices(*verdicts)[0]}
+               for offset in range(args.runs)]
+    accepted = sum(result["Status"] == "Accepted" for result in results)
+    seed_submissions(args.dsn, first, args.runs, owner_id, problem_id)
+    before = success_attemps(args.dsn, owner_id)
+    try:
+        outcome = asyncio.run(post_callbacks(args.base_url, mode, results, args.concurrency, args.batch_size))
+        judged = int(psql(args.dsn, f"SELECT count(*) FROM submissions WHERE id BETWEEN {first} AND "
+                                    f"{first + args.runs - 1} AND status <> 'waiting'").strip())
+        counted = success_attemps(args.dsn, owner_id) - before
+    finally:
+        remove_submissions(args.dsn, first, args.runs, owner_id, accepted)
+    latency = outcome.pop("request_latency")
+    return {
+        "mode": mode,
+        "runs": args.runs,
+        "judged": judged,
+        "accepted": accepted,
+        "accepted_counted": counted,
+        "request_latency": latency.summary(),
+        "request_latency_text": format_percentiles(latency),
+        **outcome
+    }
+
+
+def print_mode(result: Dict[str, Any]):
+    print(f"\n{result['mode']}: {result['judged']}/{result['runs']} submissions judged in {result['elapsed']:.2f} s, "
+          f"{result['callbacks_per_second']:.0f} callbacks/s over {result['requests']} requests "
+          f"({result['failed_requests']} failed)")
+    print(f"  request latency: {result['request_latency_text']}")
+    print(f"  accepted verdicts counted on the user: {result['accepted_counted']} of {result['accepted']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Measure how many verdict callbacks per second the judge applies, one per request or batched',
+        epilog="Waiting submissions of one existing user and problem are inserted with psql, flooded with "
+               "verdicts and deleted again; the user's success count is restored.")
+    parser.add_argument('--base-url', default=BASE_URL, help=f'Judge URL (default: {BASE_URL})')
+    parser.add_argument('--dsn', default=default_dsn(),
+                      help='PostgreSQL connection string for psql (default: from POSTGRES_HOST, POSTGRES_USER, ...)')
+    parser.add_argument('--modes', default=DEFAULT_MODES,
+                      help=f'Comma separated callback modes, single and batch (default: {DEFAULT_MODES})')
+    parser.add_argument('--runs', type=int, default=DEFAULT_RUNS,
+                      help=f'Verdicts per mode (default: {DEFAULT_RUNS})')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                      help=f'Concurrent callback requests (default: {DEFAULT_CONCURRENCY})')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                      help=f'Verdicts per batch request (default: {DEFAULT_BATCH_SIZE})')
+    parser.add_argument('--verdicts', default=DEFAULT_VERDICTS,
+                      help='Comma separated STATUS=WEIGHT pairs (default: a typical contest mix)')
+    parser.add_argument('--seed', type=int, default=1)
+
+    args = parser.parse_args()
+    if not args.dsn:
+        parser.error("--dsn is required (or set POSTGRES_HOST, POSTGRES_USER, ...)")
+    modes = args.modes.split(",")
+    if any(mode not in ("single", "batch") for mode in modes):
+        parser.error("--modes takes single and batch")
+    try:
+        verdicts = parse_verdicts(args.verdicts)
+    except ValueError as e:
+        parser.error(str(e))
+    try:
+        owner_id = first_id(args.dsn, "users")
+        problem_id = first_id(args.dsn, "problems")
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        exit(1)
+
+    print(f"Sending {args.runs} verdicts per mode to {args.base_url} from {args.concurrency} connections")
+    results = []
+    for index, mode in enumerate(modes):
+        result = run_mode(args, mode, SUBMISSION_ID_BASE + index * args.runs, owner_id, problem_id, verdicts)
+        print_mode(result)
+        results.append(result)
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    results_file = f"callback_bench_results_{timestamp}.json"
+    with open(results_file, 'w') as f:
+        json.dump({
+            "timestamp": datetime.now().isoformat(),
+            "base_url": args.base_url,
+            "concurrency": args.concurrency,
+            "batch_size": args.batch_size,
+            "modes": results
+        }, f, indent=2)
+    print(f"\nDetailed results saved to {results_file}")
+
+
+if __name__ == "__main__":
+    main()
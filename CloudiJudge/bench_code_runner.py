@@ -0,0 +1,320 @@
+import asyncio
+import json
+import os
+import random
+import shlex
+import shutil
+import subprocess
+import tempfile
+import time
+import argparse
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from async_http import HttpClient, serve
+from code_corpus import (CORPUS_DIR, EXPECTED_VERDICTS, SIZE_CLASSES, load_corpus, pad_program, parse_mix,
+                         write_problem)
+from fake_code_runner import CallbackSink
+from latency_histogram import LatencyHistogram
+
+# Configuration
+RUNNER_URL = "http://localhost:2"
+SINK_PORT = 8099
+PROBLEM_ID = 999999  # problem folder created for the benchmark only
+FIRST_SUBMISSION_ID = 1000000
+TIME_LIMIT = 1000  # ms
+MEMORY_LIMIT = 64  # MB
+DEFAULT_MIX = "ok=50,wrong_answer=15,compile_error=10,runtime_error=10,tle=10,mle=5"
+REJECTED_RETRY_DELAY = 1.0  # seconds before a run rejected by the full queue (503) is sent again
+RUNNER_START_TIMEOUT = 120  # seconds, `go run` compiles the judge first
+CELL_TIMEOUT = 1800  # seconds to wait for every callback of one matrix cell
+
+
+def plan_runs(mix: Dict[str, float], runs: int, seed: int) -> List[str]:
+    """Corpus program of every run, in the same shuffled order for each matrix cell"""
+    total = sum(mix.values())
+    plan = []
+    for name, weight in mix.items():
+        plan += [name] * round(runs * weight / total)
+    while len(plan) < runs:  # rounding came up short
+        plan.append(max(mix, key=mix.get))
+    plan = plan[:runs]
+    random.Random(seed).shuffle(plan)
+    return plan
+
+
+def write_submissions(problem_dir: str, plan: List[str], corpus: Dict[str, bytes], first_id: int,
+                      unique: bool = False):
+    """Lay out the files the runner mounts: input/output of the problem and one .go file per run
+
+    Runs of the same corpus program are byte-identical, like resubmits, unless unique
+    adds a comment naming the submission, which defeats the runner's compile cache.
+    """
+    write_problem(problem_dir)
+    for offset, name in enumerate(plan):
+        with open(os.path.join(problem_dir, f"{first_id + offset}.go"), "wb") as f:
+            f.write(corpus[name])
+            if unique:
+                f.write(f"\n// submission {first_id + offset}\n".encode())
+
+
+def remove_submissions(problem_dir: str, first_id: int, count: int):
+    for submission_id in range(first_id, first_id + count):
+        try:
+            os.remove(os.path.join(problem_dir, f"{submission_id}.go"))
+        except FileNotFoundError:
+            pass
+
+
+async def wait_for_port(url: str, timeout: float):
+    parts = urlsplit(url)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"code-runner did not start listening on {url}")
+            await asyncio.sleep(0.5)
+
+
+async def compile_cache_stats(client: HttpClient) -> Optional[Dict[str, int]]:
+    """Compile cache counters from the runner's /stats, None if it has no cache"""
+    try:
+        response = await client.get("/stats")
+        return response.json().get("compile_cache") if response.status_code == 200 else None
+    except Exception:
+        return None
+
+
+async def run_cell(args: argparse.Namespace, concurrency: Optional[int], sandbox_pool: Optional[str], plan: List[str],
+                   corpus: Dict[str, bytes], first_id: int) -> Dict[str, Any]:
+    """Flood /run with every planned submission and wait for all callbacks"""
+    problem_dir = os.path.join(args.problem_folder, str(args.problem_id))
+    write_submissions(problem_dir, plan, corpus, first_id, args.unique_sources)
+    sink = CallbackSink()
+    server = await serve(sink.handle, "0.0.0.0", args.sink_port)
+    process = None
+    cache_dir = None
+    if args.runner_cmd:
+        cache_dir = tempfile.mkdtemp(prefix="compile-cache-")  # every cell starts with a cold cache
+        env = dict(os.environ, JUDGE_CALLBACK_URL=args.callback_url, MAX_CONCURRENT_RUNS=str(concurrency),
+                   PROBLEM_UPLOAD_FOLDER=args.problem_folder, PROBLEM_UPLOAD_FOLDER_SRC=args.problem_folder,
+                   COMPILE_CACHE_DIR=cache_dir)
+        if sandbox_pool:
+            env["SANDBOX_POOL"] = "true" if sandbox_pool == "on" else "false"
+        process = subprocess.Popen(shlex.split(args.runner_cmd), cwd=args.runner_cwd, env=env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    client = HttpClient(args.runner_url, pool_size=len(plan))
+    post_latency = LatencyHistogram()
+    post_failures = 0
+    rejected = 0
+    tokens = {}
+
+    async def post_run(offset: int, name: str):
+        """Send one run, again after a delay while the full queue rejects it, like the judge does"""
+        nonlocal post_failures, rejected
+        token = f"bench-{first_id + offset}"
+        tokens[token] = name
+        start_time = time.perf_counter()  # turnaround counts from the first attempt
+        deadline = time.monotonic() + CELL_TIMEOUT
+        while True:
+            sink.issued[token] = start_time
+            request_start = time.perf_counter()
+            try:
+                response = await client.post("/run", json={
+                    "time_limit": args.time_limit,
+                    "memory_limit": args.memory_limit,
+                    "problem_id": args.problem_id,
+                    "submission_id": first_id + offset,
+                    "calback_token": token
+                }, timeout=CELL_TIMEOUT)
+            except Exception:
+                post_failures += 1
+                sink.issued.pop(token, None)
+                return
+            post_latency.record((time.perf_counter() - request_start) * 1000)
+            if response.status_code == 503:
+                rejected += 1
+                sink.issued.pop(token, None)  # no callback is coming for this attempt
+                if time.monotonic() + REJECTED_RETRY_DELAY < deadline:
+                    await asyncio.sleep(REJECTED_RETRY_DELAY)
+                    continue
+                post_failures += 1
+            elif response.status_code != 200:
+                post_failures += 1
+                sink.issued.pop(token, None)
+            return
+
+    try:
+        await wait_for_port(args.runner_url, RUNNER_START_TIMEOUT)
+        cache_before = await compile_cache_stats(client)
+        start_time = time.perf_counter()
+        await asyncio.gather(*[post_run(offset, name) for offset, name in enumerate(plan)])
+        posted_time = time.perf_counter() - start_time
+        deadline = time.monotonic() + CELL_TIMEOUT
+        while sink.issued and time.monotonic() < deadline:
+            await asyncio.sleep(0.2)
+        total_time = time.perf_counter() - start_time
+        cache_after = await compile_cache_stats(client)
+    finally:
+        await client.close()
+        server.close()
+        if process:
+            process.terminate()
+            process.wait()
+        remove_submissions(problem_dir, first_id, len(plan))
+        if cache_dir:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    compile_cache = None
+    if cache_before and cache_after:
+        compile_cache = {key: cache_after[key] - cache_before[key] for key in ("hits", "misses", "evictions")}
+        compile_cache["entries"] = cache_after["entries"]
+    mismatches: Dict[str, Dict[str, int]] = {}
+    for token, status in sink.results.items():
+        expected = EXPECTED_VERDICTS.get(tokens[token])
+        if expected and status != expected:
+            counts = mismatches.setdefault(tokens[token], {})
+            counts[status] = counts.get(status, 0) + 1
+    return {
+        "max_concurrent_runs": concurrency,
+        "sandbox_pool": sandbox_pool,
+        "runs": len(plan),
+        "completed": len(sink.results),
+        "lost": len(sink.issued),
+        "post_failures": post_failures,
+        "rejected": rejected,
+        "posted_time": posted_time,
+        "total_time": total_time,
+        "runs_per_second": len(sink.results) / total_time if total_time else 0,
+        "post_latency": post_latency.summary(),
+        "turnaround": sink.turnaround.summary(),
+        "stages": {stage: histogram.summary() for stage, histogram in sink.stages.items()},
+        "verdicts": dict(sink.verdicts),
+        "compile_cache": compile_cache,
+        "unexpected_verdicts": mismatches
+    }
+
+
+def print_cell(cell: Dict[str, Any]):
+    concurrency = cell["max_concurrent_runs"] or "as deployed"
+    pool = f", sandbox pool {cell['sandbox_pool']}" if cell["sandbox_pool"] else ""
+    print(f"\nMAX_CONCURRENT_RUNS={concurrency}{pool}: {cell['completed']}/{cell['runs']} callbacks in "
+          f"{cell['total_time']:.1f} s, {cell['runs_per_second']:.2f} runs/s")
+    print(f"  all /run requests accepted after {cell['posted_time']:.1f} s; "
+          f"{cell['rejected']} rejected with a full queue and sent again, "
+          f"{cell['post_failures']} failed")
+    print(f"  /run response time: {_format_summary(cell['post_latency'])}")
+    print(f"  turnaround: {_format_summary(cell['turnaround'])}")
+    for stage, summary in cell["stages"].items():
+        print(f"  {stage}: {_format_summary(summary)}")
+    if cell["compile_cache"]:
+        cache = cell["compile_cache"]
+        print(f"  compile cache: {cache['hits']} hits, {cache['misses']} misses, {cache['evictions']} evictions")
+    if cell["lost"]:
+        print(f"  {cell['lost']} runs never called back")
+    for name, counts in cell["unexpected_verdicts"].items():
+        print(f"  {name} expected {EXPECTED_VERDICTS[name]!r}, got {counts}")
+
+
+def _format_summary(summary: Dict[str, float]) -> str:
+    return f"p50 {summary['p50']:.0f} ms | p99 {summary['p99']:.0f} ms | max {summary['max']:.0f} ms"
+
+
+async def run_matrix(args: argparse.Namespace, matrix: List[Tuple[Optional[int], Optional[str]]], plan: List[str],
+                     corpus: Dict[str, bytes]) -> List[Dict[str, Any]]:
+    cells = []
+    for index, (concurrency, sandbox_pool) in enumerate(matrix):
+        cell = await run_cell(args, concurrency, sandbox_pool, plan, corpus,
+                              args.first_submission + index * len(plan))
+        print_cell(cell)
+        cells.append(cell)
+    return cells
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Flood the code-runner /run endpoint with a Go corpus and measure throughput',
+        epilog="Without --runner-cmd the runner at --runner-url is benchmarked as deployed; it must post "
+               "callbacks to --callback-url (JUDGE_CALLBACK_URL) and see --problem-folder as both "
+               "PROBLEM_UPLOAD_FOLDER and PROBLEM_UPLOAD_FOLDER_SRC; --runner-cmd is started that way.")
+    parser.add_argument('--runner-url', default=RUNNER_URL, help=f'code-runner address (default: {RUNNER_URL})')
+    parser.add_argument('--runner-cmd', default=None,
+                      help='Command starting a code-runner, run once per matrix cell (e.g. "./judge code-runner --listen=2")')
+    parser.add_argument('--runner-cwd', default=None, help='Working directory for --runner-cmd')
+    parser.add_argument('--concurrency', default='1,2,4,8',
+                      help='Comma separated MAX_CONCURRENT_RUNS values to test with --runner-cmd (default: 1,2,4,8)')
+    parser.add_argument('--sandbox-pool', default=None,
+                      help='Comma separated SANDBOX_POOL modes to test with --runner-cmd, e.g. "on,off" to compare '
+                           'pooled sandboxes with a container per run (default: the runner\'s default)')
+    parser.add_argument('--runs', type=int, default=200, help='Runs per matrix cell (default: 200)')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Corpus weights (default: {DEFAULT_MIX})')
+    parser.add_argument('--corpus', default=CORPUS_DIR, help='Directory of .go programs (default: go_corpus)')
+    parser.add_argument('--size', choices=[c for c in SIZE_CLASSES if c != "oversized"], default='small',
+                      help='Pad every program to this size class to load the compile step (default: small)')
+    parser.add_argument('--unique-sources', action='store_true',
+                      help='Make every submission a distinct source, so the compile cache never hits '
+                           '(default: repeated corpus programs are identical, like resubmits)')
+    parser.add_argument('--problem-folder', required=True,
+                      help='Host folder the runner reads problems from '
+                           '(PROBLEM_UPLOAD_FOLDER and PROBLEM_UPLOAD_FOLDER_SRC)')
+    parser.add_argument('--problem-id', type=int, default=PROBLEM_ID)
+    parser.add_argument('--first-submission', type=int, default=FIRST_SUBMISSION_ID)
+    parser.add_argument('--time-limit', type=int, default=TIME_LIMIT, help=f'ms (default: {TIME_LIMIT})')
+    parser.add_argument('--memory-limit', type=int, default=MEMORY_LIMIT, help=f'MB (default: {MEMORY_LIMIT})')
+    parser.add_argument('--sink-port', type=int, default=SINK_PORT,
+                      help=f'Port of the local callback sink (default: {SINK_PORT})')
+    parser.add_argument('--callback-url', default=None,
+                      help='Callback URL the runner should use (default: the local sink)')
+    parser.add_argument('--seed', type=int, default=1)
+
+    args = parser.parse_args()
+    if args.callback_url is None:
+        args.callback_url = f"http://127.0.0.1:{args.sink_port}/code/callback"
+    corpus = {name: pad_program(source, SIZE_CLASSES[args.size]) for name, source in load_corpus(args.corpus).items()}
+    try:
+        mix = parse_mix(args.mix, list(corpus))
+    except ValueError as e:
+        parser.error(str(e))
+    plan = plan_runs(mix, args.runs, args.seed)
+    if args.runner_cmd:
+        pool_modes = args.sandbox_pool.split(",") if args.sandbox_pool else [None]
+        if any(mode not in ("on", "off", None) for mode in pool_modes):
+            parser.error("--sandbox-pool takes on and off")
+        matrix = [(int(c), mode) for c in args.concurrency.split(",") for mode in pool_modes]
+    else:
+        matrix = [(None, None)]
+
+    print(f"Benchmarking {args.runner_url} with {len(plan)} runs per cell "
+          f"({', '.join(f'{name} {plan.count(name)}' for name in mix)})")
+    cells = asyncio.run(run_matrix(args, matrix, plan, corpus))
+
+    if len(cells) > 1:
+        print("\nMAX_CONCURRENT_RUNS | pool | runs/s | turnaround p50 | turnaround p99 | rejected /run")
+        for cell in cells:
+            print(f"{cell['max_concurrent_runs']:>19} | {cell['sandbox_pool'] or '-':>4} | "
+                  f"{cell['runs_per_second']:6.2f} | "
+                  f"{cell['turnaround']['p50']:11.0f} ms | {cell['turnaround']['p99']:11.0f} ms | "
+                  f"{cell['rejected']:>13}")
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    results_file = f"code_runner_bench_results_{timestamp}.json"
+    with open(results_file, 'w') as f:
+        json.dump({
+            "timestamp": datetime.now().isoformat(),
+            "runner_url": args.runner_url,
+            "mix": mix,
+            "size": args.size,
+            "time_limit": args.time_limit,
+            "memory_limit": args.memory_limit,
+            "cells": cells
+        }, f, indent=2)
+    print(f"\nDetailed results saved to {results_file}")
+
+
+if __name__ == "__main__":
+    main()
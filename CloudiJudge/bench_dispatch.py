@@ -0,0 +1,182 @@
+import asyncio
+import contextlib
+import io
+import json
+import os
+import shlex
+import subprocess
+import sys
+import time
+import argparse
+import urllib.request
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import load_engine
+from bench_code_runner import wait_for_port
+from load_test_verdict import SCENARIO, load_test_users, scenario_data
+from rate_profile import RateProfile
+
+# Configuration
+BASE_URL = "http://localhost:8080"
+FIRST_RUNNER_PORT = 9001
+DEFAULT_MODES = "round-robin,least-loaded"
+# Three healthy runners and one that is four times slower, like a runner on a busy host
+DEFAULT_RUNNERS = "lognormal:1500:0.5,lognormal:1500:0.5,lognormal:1500:0.5,lognormal:6000:0.5"
+DEFAULT_MAX_CONCURRENT = 4  # run slots per fake runner
+DEFAULT_RATE = 6.0  # submissions per second, about 70% of the runners' combined capacity
+DEFAULT_DURATION = 60  # seconds
+START_TIMEOUT = 120  # seconds for the judge to listen, `go run` compiles it first
+SETTLE_TIME = 3  # seconds for the judge to poll every runner's /status before the load starts
+
+
+def start_runners(args: argparse.Namespace, latencies: List[str]) -> List[subprocess.Popen]:
+    """One fake code-runner per latency distribution, calling back to the judge"""
+    runner = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_code_runner.py")
+    processes = []
+    for index, latency in enumerate(latencies):
+        processes.append(subprocess.Popen(
+            [sys.executable, runner, "--host", "127.0.0.1", "--port", str(args.first_port + index),
+             "--callback-url", args.base_url.rstrip("/") + "/code/callback", "--latency", latency,
+             "--max-concurrent", str(args.max_concurrent), "--seed", str(args.seed + index)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+    return processes
+
+
+def runner_stats(port: int) -> Optional[Dict[str, Any]]:
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/stats", timeout=5) as response:
+            return json.load(response)
+    except OSError:
+        return None
+
+
+def stop(processes: List[subprocess.Popen]):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.wait()
+
+
+def run_mode(args: argparse.Namespace, mode: Optional[str], latencies: List[str],
+             users: List[Dict[str, str]]) -> Dict[str, Any]:
+    """Start fresh runners (and judge), submit at a constant rate and collect verdict latency"""
+    addresses = ",".join(f"127.0.0.1:{args.first_port + index}" for index in range(len(latencies)))
+    processes = start_runners(args, latencies)
+    try:
+        if args.judge_cmd:
+            env = dict(os.environ, CODE_RUNNER_ADDRS=addresses, CODE_RUNNER_DISPATCH=mode)
+            processes.append(subprocess.Popen(shlex.split(args.judge_cmd), cwd=args.judge_cwd, env=env,
+                                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+        for index in range(len(latencies)):
+            asyncio.run(wait_for_port(f"http://127.0.0.1:{args.first_port + index}", START_TIMEOUT))
+        asyncio.run(wait_for_port(args.base_url, START_TIMEOUT))
+        time.sleep(SETTLE_TIME)
+
+        output = sys.stdout if args.verbose else io.StringIO()
+        with contextlib.redirect_stdout(output):
+            stats = load_engine.run(SCENARIO, args.vus, 1, args.base_url, scenario_data(users, args.problems),
+                                    rate_profile=RateProfile.constant(args.rate, args.duration))
+        runners = [runner_stats(args.first_port + index) for index in range(len(latencies))]
+    finally:
+        stop(processes)
+
+    verdicts = stats.get("verdict")
+    return {
+        "mode": mode or "as deployed",
+        "submitted": stats.get("submit").successful,
+        "verdicts": verdicts.successful,
+        "timed_out": verdicts.failed,
+        "verdict_latency": verdicts.latency.summary(),
+        "runners": [{
+            "latency": latency,
+            "runs": runner["received"] if runner else None,
+            "rejected": runner["rejected"] if runner else None,
+            "queue_wait": runner["queue_wait"] if runner else None
+        } for latency, runner in zip(latencies, runners)]
+    }
+
+
+def print_mode(result: Dict[str, Any]):
+    latency = result["verdict_latency"]
+    print(f"\n{result['mode']}: {result['verdicts']}/{result['submitted']} verdicts, {result['timed_out']} timed out")
+    print(f"  verdict latency: p50 {latency['p50']:.0f} ms | p90 {latency['p90']:.0f} ms | "
+          f"p99 {latency['p99']:.0f} ms | max {latency['max']:.0f} ms")
+    for index, runner in enumerate(result["runners"]):
+        if runner["runs"] is None:
+            print(f"  runner {index + 1} ({runner['latency']}): no stats")
+            continue
+        print(f"  runner {index + 1} ({runner['latency']}): {runner['runs']} runs, "
+              f"queue wait p99 {runner['queue_wait']['p99']:.0f} ms, {runner['rejected']} rejected")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare how the judge spreads runs over code-runners of unequal speed',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="Starts one fake code-runner per --runners entry on 127.0.0.1 from --first-port on, and with\n"
+               "--judge-cmd a judge per dispatch mode with CODE_RUNNER_ADDRS pointing at them and\n"
+               "CODE_RUNNER_DISPATCH set to the mode. Without --judge-cmd the judge at --base-url must\n"
+               "already list the fake runners in CODE_RUNNER_ADDRS, and a single run is measured.\n"
+               "The judge needs the users of test_users.json and a published problem.")
+    parser.add_argument('--base-url', default=BASE_URL, help=f'Judge URL (default: {BASE_URL})')
+    parser.add_argument('--judge-cmd', default=None,
+                      help='Command starting a judge, run once per mode (e.g. "./judge serve --listen=8080")')
+    parser.add_argument('--judge-cwd', default=None, help='Working directory for --judge-cmd')
+    parser.add_argument('--modes', default=DEFAULT_MODES,
+                      help=f'Comma separated CODE_RUNNER_DISPATCH values to compare (default: {DEFAULT_MODES})')
+    parser.add_argument('--runners', default=DEFAULT_RUNNERS,
+                      help='Comma separated run time distribution of every fake runner, see fake_code_runner.py '
+                           '(default: three at 1.5 s and one at 6 s)')
+    parser.add_argument('--max-concurrent', type=int, default=DEFAULT_MAX_CONCURRENT,
+                      help=f'Run slots per fake runner (default: {DEFAULT_MAX_CONCURRENT})')
+    parser.add_argument('--first-port', type=int, default=FIRST_RUNNER_PORT,
+                      help=f'Port of the first fake runner (default: {FIRST_RUNNER_PORT})')
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE,
+                      help=f'Submissions per second (default: {DEFAULT_RATE:g})')
+    parser.add_argument('--duration', type=float, default=DEFAULT_DURATION,
+                      help=f'Seconds of submissions per mode (default: {DEFAULT_DURATION})')
+    parser.add_argument('--vus', type=int, default=200,
+                      help='Most submissions waiting for their verdict at once (default: 200)')
+    parser.add_argument('--problems', default=None,
+                      help='Comma separated published problem ids (default: read from /problemset)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--verbose', action='store_true', help='Show the output of every load test')
+
+    args = parser.parse_args()
+    args.problems = args.problems.split(",") if args.problems else []
+    latencies = args.runners.split(",")
+    modes = args.modes.split(",") if args.judge_cmd else [None]
+    users = load_test_users()
+
+    print(f"Dispatching {args.rate:g} submissions/s for {args.duration:g} s over {len(latencies)} fake runners "
+          f"with {args.max_concurrent} slots each")
+    results = []
+    for mode in modes:
+        result = run_mode(args, mode, latencies, users)
+        print_mode(result)
+        results.append(result)
+
+    if len(results) > 1:
+        print("\nmode           | verdict p50 | verdict p99 | max")
+        for result in results:
+            latency = result["verdict_latency"]
+            print(f"{result['mode']:<14} | {latency['p50']:8.0f} ms | {latency['p99']:8.0f} ms | "
+                  f"{latency['max']:.0f} ms")
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    results_file = f"dispatch_bench_results_{timestamp}.json"
+    with open(results_file, 'w') as f:
+        json.dump({
+            "timestamp": datetime.now().isoformat(),
+            "base_url": args.base_url,
+            "rate": args.rate,
+            "duration": args.duration,
+            "max_concurrent": args.max_concurrent,
+            "modes": results
+        }, f, indent=2)
+    print(f"\nDetailed results saved to {results_file}")
+
+
+if __name__ == "__main__":
+    main()
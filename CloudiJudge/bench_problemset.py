@@ -0,0 +1,144 @@
+import asyncio
+import html
+import json
+import re
+import time
+import argparse
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from async_http import HttpClient
+from generate_fixtures import DEFAULT_PASSWORD, fixture_email
+from latency_histogram import LatencyHistogram
+from load_engine import format_percentiles
+from load_test_verdict import LOGIN_ENDPOINT, PROBLEM_PATTERN
+from session_cache import Session
+
+# Configuration
+BASE_URL = "http://localhost:80"
+DEFAULT_LIMIT = 100  # problems per page, the most the judge serves
+NEXT_PATTERN = re.compile(r"href='(/problemset\?[^']*)' class=\"page-btn\">Next")
+PAGE_INFO_PATTERN = re.compile(r'Page (\d+) of (\d+)')
+
+
+def depth_bucket(page: int) -> str:
+    """Pages grouped by order of magnitude: 1-9, 10-99, 100-999, ..."""
+    low = 10 ** (len(str(page)) - 1)
+    return f"{low}-{low * 10 - 1}"
+
+
+async def login(client: HttpClient, email: str, password: str) -> Session:
+    response = await client.post(LOGIN_ENDPOINT, data={"email": email, "password": password})
+    if response.status_code != 302 or not response.header("Location", "").startswith("/problemset"):
+        raise RuntimeError(f"login as {email} failed with status {response.status_code}")
+    return Session(cookies=response.cookies)
+
+
+async def walk(base_url: str, email: str, password: str, limit: int, max_pages: int,
+               myproblems: bool) -> Dict[str, Any]:
+    """Follow the Next link of the problemset from the first page on, timing every page
+
+    Only the link in the page is followed, so the same walk measures a judge that pages
+    with offsets and one that pages with cursors.
+    """
+    client = HttpClient(base_url, pool_size=1)
+    try:
+        session = await login(client, email, password)
+        url: Optional[str] = f"/problemset?limit={limit}" + ("&myproblems=yes" if myproblems else "")
+        latency = LatencyHistogram()
+        by_depth: Dict[str, LatencyHistogram] = {}
+        seen = set()
+        duplicates = failed = pages = 0
+        page_info = None
+        start_time = time.perf_counter()
+        while url and (not max_pages or pages < max_pages):
+            request_start = time.perf_counter()
+            response = await client.get(url, headers=session.headers())
+            elapsed = (time.perf_counter() - request_start) * 1000
+            if response.status_code != 200:
+                failed += 1
+                break
+            pages += 1
+            latency.record(elapsed)
+            by_depth.setdefault(depth_bucket(pages), LatencyHistogram()).record(elapsed)
+            text = response.text
+            for problem_id in PROBLEM_PATTERN.findall(text):
+                duplicates += problem_id in seen
+                seen.add(problem_id)
+            page_info = PAGE_INFO_PATTERN.search(text) or page_info
+            next_link = NEXT_PATTERN.search(text)
+            url = html.unescape(next_link.group(1)) if next_link else None
+            if pages % 500 == 0:
+                print(f"  page {pages}: {elapsed:.1f} ms")
+        walk_time = time.perf_counter() - start_time
+    finally:
+        await client.close()
+
+    return {
+        "pages": pages,
+        "problems": len(seen),
+        "duplicates": duplicates,
+        "failed": failed,
+        "finished": url is None and not failed,
+        "last_page_info": page_info.group(0) if page_info else None,
+        "elapsed": walk_time,
+        "latency": latency,
+        "by_depth": by_depth
+    }
+
+
+def print_walk(result: Dict[str, Any]):
+    print(f"\n{result['pages']} pages, {result['problems']} problems in {result['elapsed']:.1f} s, "
+          f"{result['duplicates']} shown twice, {result['failed']} failed"
+          f"{'' if result['finished'] else ' (stopped before the last page)'}")
+    if result["last_page_info"]:
+        print(f"  last page: {result['last_page_info']}")
+    print(f"  page latency: {format_percentiles(result['latency'])}")
+    print("\npages       | count |    p50    |    p99    | max")
+    for depth, histogram in result["by_depth"].items():
+        print(f"{depth:<11} | {histogram.total_count:5d} | {histogram.percentile(50):6.1f} ms | "
+              f"{histogram.percentile(99):6.1f} ms | {histogram.max:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Walk the problemset page by page and show how page latency grows with depth',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="Seed a large archive first, e.g. 1M problems of which about 70% are published:\n"
+               "  python3 generate_fixtures.py --problems 1000000\n"
+               "The default login is the first fixture user.")
+    parser.add_argument('--base-url', default=BASE_URL, help=f'Judge URL (default: {BASE_URL})')
+    parser.add_argument('--email', default=fixture_email(0), help='User to log in as (default: first fixture user)')
+    parser.add_argument('--password', default=DEFAULT_PASSWORD, help='Password of --email')
+    parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT,
+                      help=f'Problems per page (default: {DEFAULT_LIMIT})')
+    parser.add_argument('--pages', type=int, default=0, help='Stop after this many pages (default: walk them all)')
+    parser.add_argument('--myproblems', action='store_true',
+                      help="Walk the user's own problems, or every problem for an admin")
+
+    args = parser.parse_args()
+    print(f"Walking {args.base_url}/problemset with {args.limit} problems per page")
+    try:
+        result = asyncio.run(walk(args.base_url, args.email, args.password, args.limit, args.pages, args.myproblems))
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        exit(1)
+    print_walk(result)
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    results_file = f"problemset_bench_results_{timestamp}.json"
+    with open(results_file, 'w') as f:
+        json.dump({
+            "timestamp": datetime.now().isoformat(),
+            "base_url": args.base_url,
+            "limit": args.limit,
+            "myproblems": args.myproblems,
+            **{key: value for key, value in result.items() if key not in ("latency", "by_depth")},
+            "latency": result["latency"].summary(),
+            "by_depth": {depth: histogram.summary() for depth, histogram in result["by_depth"].items()}
+        }, f, indent=2)
+    print(f"\nDetailed results saved to {results_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import mmap
+import os
+import random
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
+from async_http import encode_multipart
+from payload_pool import Payload
+
+# Configuration
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "go_corpus")
+PROBLEM_INPUT = "1\n2\n3"  # the corpus verdicts hold for any input of numbers whose output is their doubles
+PROBLEM_OUTPUT = "2\n4\n6"
+MAX_SUBMISSION_SIZE = 10 * 1024 * 1024  # handleSubmitProblemView rejects larger files
+REJECTED = "rejected"  # expected outcome of uploads the judge must refuse
+
+# Bytes a program is padded to in each size class; None keeps it as written
+SIZE_CLASSES: Dict[str, Optional[int]] = {
+    "small": None,
+    "large": 256 * 1024,
+    "pathological": MAX_SUBMISSION_SIZE - 64 * 1024,  # just under the upload limit
+    "oversized": MAX_SUBMISSION_SIZE + 1024
+}
+
+# Verdict each corpus program should get from a correct runner
+EXPECTED_VERDICTS = {
+    "ok": "Accepted",
+    "wrong_answer": "Wrong answer",
+    "compile_error": "Compilation failed",
+    "runtime_error": "Runtime error",
+    "tle": "Time limit exceeded",
+    "mle": "Memory limit exceeded"
+}
+
+
+def load_corpus(directory: str = CORPUS_DIR) -> Dict[str, bytes]:
+    """Go programs of the corpus keyed by file name without .go"""
+    corpus = {}
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".go"):
+            with open(os.path.join(directory, name), "rb") as f:
+                corpus[name[:-3]] = f.read()
+    return corpus
+
+
+def parse_mix(spec: str, names: List[str]) -> Dict[str, float]:
+    """Split "ok=50,tle=10" into weights, checking every name is known"""
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in names:
+            raise ValueError(f"{name!r} is not one of {', '.join(names)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def pad_program(source: bytes, size: Optional[int], seed: int = 0) -> bytes:
+    """The program followed by a package level table, so the file is about size bytes
+
+    An unused package level variable compiles without error, so the verdict does
+    not change, but the compiler still has to parse and type check every element.
+    """
+    if size is None or len(source) >= size:
+        return source
+    rng = random.Random(seed)
+    parts = [source, b"\nvar corpusPadding = [...]uint32{\n"]
+    length = len(source) + 40
+    while length < size:
+        line = ", ".join(str(rng.getrandbits(32)) for _ in range(12)).encode() + b",\n"
+        parts.append(line)
+        length += len(line)
+    parts.append(b"}\n")
+    return b"".join(parts)
+
+
+def write_problem(problem_dir: str):
+    """input.txt and output.txt the corpus verdicts are known for"""
+    os.makedirs(problem_dir, exist_ok=True)
+    with open(os.path.join(problem_dir, "input.txt"), "w") as f:
+        f.write(PROBLEM_INPUT)
+    with open(os.path.join(problem_dir, "output.txt"), "w") as f:
+        f.write(PROBLEM_OUTPUT)
+
+
+class CorpusEntry:
+    """One program in one size class, with its pre-encoded upload"""
+
+    def __init__(self, program: str, size_class: str, expected: str, upload: Payload, source: memoryview):
+        self.program = program
+        self.size_class = size_class
+        self.expected = expected
+        self.upload = upload
+        self.source = source  # the Go file inside the upload, to check downloads against
+
+    @property
+    def name(self) -> str:
+        return f"{self.program}/{self.size_class}"
+
+
+class MappedCorpus:
+    """Multipart uploads of the corpus in every requested size, kept in a memory-mapped file
+
+    Every upload body is encoded once into a scratch file which is then mapped
+    read-only; uploads are memoryview slices of the mapping, so requests neither
+    re-read files nor copy them, and forked worker processes share the pages.
+    """
+
+    def __init__(self, corpus: Dict[str, bytes], size_classes: List[str], field: str = "submit_file",
+                 directory: Optional[str] = None):
+        layout: List[Tuple[str, str, str, str, int, int, int, int]] = []
+        with tempfile.TemporaryFile(dir=directory) as f:
+            offset = 0
+            for size_class in size_classes:
+                for program, source in corpus.items():
+                    padded = pad_program(source, SIZE_CLASSES[size_class])
+                    body, content_type = encode_multipart({}, {field: ("main.go", padded, "text/x-go")})
+                    f.write(body)
+                    # The file is followed by CRLF and the closing boundary line
+                    trailer = len(content_type.split("boundary=")[1]) + 8
+                    expected = REJECTED if len(padded) > MAX_SUBMISSION_SIZE else EXPECTED_VERDICTS.get(program, "")
+                    layout.append((program, size_class, expected, content_type, offset, len(body),
+                                   len(body) - trailer - len(padded), len(padded)))
+                    offset += len(body)
+            f.flush()
+            # The mapping stays valid after the scratch file is closed and removed
+            self.mapping = mmap.mmap(f.fileno(), offset, access=mmap.ACCESS_READ)
+        view = memoryview(self.mapping)
+        self.entries: Dict[str, CorpusEntry] = {}
+        for program, size_class, expected, content_type, start, length, source_start, size in layout:
+            body = view[start:start + length]
+            entry = CorpusEntry(program, size_class, expected, Payload(body, content_type),
+                                body[source_start:source_start + size])
+            self.entries[entry.name] = entry
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.mapping)
@@ -0,0 +1,332 @@
+import asyncio
+import math
+import os
+import random
+import time
+import argparse
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from async_http import HttpClient, Request, Response, json_response, serve
+from latency_histogram import LatencyHistogram
+from load_engine import format_percentiles
+
+# Configuration
+DEFAULT_PORT = 2  # the judge posts to http://code-runner:2/run
+CALLBACK_URL = "http://judge:80/code/callback"
+QUEUE_SIZE = 1000  # buffer of the Go QueueManager channel
+DEFAULT_MAX_CONCURRENT = 10  # code-runner default when MAX_CONCURRENT_RUNS is not set
+DEFAULT_LATENCY = "lognormal:1500:0.5"  # roughly go build plus a run in a fresh container
+DEFAULT_VERDICTS = ("Accepted=60,Wrong answer=20,Compilation failed=10,Time limit exceeded=5,"
+                    "Runtime error=3,Memory limit exceeded=2")
+REPORT_INTERVAL = 5  # seconds
+CALLBACK_BATCH_MS = 50  # the code-runner's default CALLBACK_BATCH_MS
+CALLBACK_BATCH_SIZE = 100
+
+LATENCY_HELP = """Run time distribution in milliseconds:
+  fixed:MS
+  uniform:LOW:HIGH
+  exponential:MEAN
+  lognormal:MEDIAN:SIGMA"""
+
+
+class LatencyDistribution:
+    """Random run times in milliseconds following one of the shapes in LATENCY_HELP"""
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        shape, *args = spec.split(":")
+        try:
+            values = [float(v) for v in args]
+            if shape == "fixed":
+                self.sample = lambda: values[0]
+            elif shape == "uniform":
+                self.sample = lambda: random.uniform(values[0], values[1])
+            elif shape == "exponential":
+                self.sample = lambda: random.expovariate(1 / values[0])
+            elif shape == "lognormal":
+                self.sample = lambda: random.lognormvariate(math.log(values[0]), values[1])
+            else:
+                raise ValueError(shape)
+            self.sample()
+        except (ValueError, IndexError, ZeroDivisionError):
+            raise ValueError(f"Invalid latency distribution: {spec!r}")
+
+
+def parse_verdicts(spec: str) -> Tuple[List[str], List[float]]:
+    """Split "Accepted=60,Wrong answer=40" into statuses and weights"""
+    statuses, weights = [], []
+    for part in spec.split(","):
+        status, _, weight = part.rpartition("=")
+        if not status or float(weight) < 0:
+            raise ValueError(f"Invalid verdict weights: {spec!r}")
+        statuses.append(status.strip())
+        weights.append(float(weight))
+    return statuses, weights
+
+
+class CallbackSink:
+    """Receives /code/callback and /code/callback/batch requests and counts the reported verdicts"""
+
+    def __init__(self):
+        self.received = 0
+        self.verdicts: Counter = Counter()
+        self.issued: Dict[str, float] = {}  # callback token -> time the run was sent
+        self.results: Dict[str, str] = {}  # callback token -> verdict, for issued tokens
+        self.turnaround = LatencyHistogram()
+        self.stages: Dict[str, LatencyHistogram] = {}  # from the timings the runner reports
+
+    async def handle(self, request: Request) -> Response:
+        try:
+            data = request.json()
+        except ValueError:
+            return json_response({"error": "Invalid JSON"}, 400)
+        results = data["results"] if request.path.endswith("/batch") else [data]
+        for result in results:
+            self.received += 1
+            self.verdicts[result.get("Status")] += 1
+            for stage, value_ms in (result.get("timings") or {}).items():
+                self.stages.setdefault(stage, LatencyHistogram()).record(value_ms)
+            token = result.get("callback_token")
+            sent_at = self.issued.pop(token, None)
+            if sent_at is not None:
+                self.turnaround.record((time.perf_counter() - sent_at) * 1000)
+                self.results[token] = result.get("Status")
+        return json_response({"ok": True, "applied": len(results)})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "received": self.received,
+            "verdicts": dict(self.verdicts),
+            "turnaround": self.turnaround.summary(),
+            "stages": {stage: histogram.summary() for stage, histogram in self.stages.items()}
+        }
+
+
+class FakeCodeRunner:
+    """Stand-in for `code-runner`: queues runs like QueueManager and reports random verdicts"""
+
+    def __init__(self, callback_url: str, max_concurrent: int, latency: LatencyDistribution,
+                 verdicts: Tuple[List[str], List[float]], queue_size: int = QUEUE_SIZE,
+                 sink: Optional[CallbackSink] = None, batch_ms: float = 0):
+        self.callback_url = callback_url
+        self.max_concurrent = max_concurrent
+        self.latency = latency
+        self.statuses, self.weights = verdicts
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.client = HttpClient(callback_url, pool_size=max_concurrent)
+        self.sink = sink
+        self.batch_ms = batch_ms
+        self.batch: List[Dict[str, Any]] = []
+        self.batch_flushed = asyncio.Event()
+        self.received = 0
+        self.rejected = 0
+        self.running = 0
+        self.completed = 0
+        self.callbacks_failed = 0
+        self.verdicts: Counter = Counter()
+        self.queue_wait = LatencyHistogram()
+        self.callback_latency = LatencyHistogram()
+
+    async def handle(self, request: Request) -> Response:
+        if request.method == "POST" and request.path == "/run":
+            try:
+                run = request.json()
+            except ValueError:
+                return json_response({"error": "Invalid JSON"}, 400)
+            try:
+                self.queue.put_nowait((run, time.perf_counter()))
+            except asyncio.QueueFull:
+                # Like QueueManager.Enqueue; the judge tries another runner
+                self.rejected += 1
+                return json_response({"error": "Queue is full"}, 503)
+            self.received += 1
+            if self.sink is not None:
+                self.sink.issued[run.get("calback_token")] = time.perf_counter()
+            return json_response({"ok": True})
+        if request.method == "POST" and request.path.startswith("/code/callback") and self.sink is not None:
+            return await self.sink.handle(request)
+        if request.method == "GET" and request.path == "/status":
+            return json_response({
+                "queued": self.queue.qsize(),
+                "running": self.running,
+                "slots": self.max_concurrent,
+                "free_slots": self.max_concurrent - self.running,
+                "queue_capacity": self.queue.maxsize
+            })
+        if request.method == "GET" and request.path == "/stats":
+            return json_response(self.to_dict())
+        return json_response({"error": "Not found"}, 404)
+
+    async def dispatch(self):
+        """Start queued runs, at most max_concurrent at a time"""
+        while True:
+            run, received_at = await self.queue.get()
+            await self.semaphore.acquire()
+            asyncio.create_task(self.execute(run, received_at))
+
+    async def execute(self, run: Dict[str, Any], received_at: float):
+        try:
+            queue_wait = (time.perf_counter() - received_at) * 1000
+            self.queue_wait.record(queue_wait)
+            self.running += 1
+            status = random.choices(self.statuses, self.weights)[0]
+            run_time = self.latency.sample()
+            if status == "Time limit exceeded":
+                run_time = max(run_time, run.get("time_limit", 0))
+            await asyncio.sleep(run_time / 1000)
+            self.running -= 1
+            # The real runner sends the callback before giving its slot back
+            await self.send_callback(run, status, {"queue": queue_wait, "run": run_time})
+        finally:
+            self.semaphore.release()
+
+    async def send_callback(self, run: Dict[str, Any], status: str, timings: Dict[str, float]):
+        result = {"callback_token": run.get("calback_token"), "Status": status, "timings": timings}
+        if self.batch_ms:
+            # Like the code-runner's callbackBatcher: the first verdict opens a window
+            self.batch.append(result)
+            if len(self.batch) == 1:
+                asyncio.create_task(self.send_batch())
+            elif len(self.batch) >= CALLBACK_BATCH_SIZE:
+                self.batch_flushed.set()
+            return
+        await self.post_callbacks(self.callback_url, result, [result])
+
+    async def send_batch(self):
+        try:
+            await asyncio.wait_for(self.batch_flushed.wait(), self.batch_ms / 1000)
+        except asyncio.TimeoutError:
+            pass
+        self.batch_flushed.clear()
+        batch, self.batch = self.batch, []
+        await self.post_callbacks(self.callback_url + "/batch", {"results": batch}, batch)
+
+    async def post_callbacks(self, url: str, body: Dict[str, Any], results: List[Dict[str, Any]]):
+        start_time = time.perf_counter()
+        try:
+            response = await self.client.post(url, json=body)
+            ok = response.status_code == 200
+        except Exception:
+            ok = False
+        self.callback_latency.record((time.perf_counter() - start_time) * 1000)
+        for result in results:
+            self.completed += 1
+            self.verdicts[result["Status"]] += 1
+            if not ok:
+                self.callbacks_failed += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = {
+            "received": self.received,
+            "rejected": self.rejected,
+            "queued": self.queue.qsize(),
+            "running": self.running,
+            "completed": self.completed,
+            "callbacks_failed": self.callbacks_failed,
+            "verdicts": dict(self.verdicts),
+            "queue_wait": self.queue_wait.summary(),
+            "callback_latency": self.callback_latency.summary()
+        }
+        if self.sink is not None:
+            result["sink"] = self.sink.to_dict()
+        return result
+
+    async def report(self):
+        """Print progress every REPORT_INTERVAL seconds"""
+        last_completed = 0
+        while True:
+            await asyncio.sleep(REPORT_INTERVAL)
+            rate = (self.completed - last_completed) / REPORT_INTERVAL
+            last_completed = self.completed
+            print(f"received {self.received} | queued {self.queue.qsize()} | running {self.running} | "
+                  f"completed {self.completed} ({rate:.1f}/s) | callbacks failed {self.callbacks_failed}")
+
+    def print_summary(self):
+        print("\nFake code-runner summary:")
+        print(f"Runs received: {self.received}, completed: {self.completed}, "
+              f"still queued: {self.queue.qsize()}, running: {self.running}")
+        print(f"Runs rejected with a full queue: {self.rejected}")
+        print(f"Queue wait: {format_percentiles(self.queue_wait)}")
+        print(f"Callback response time: {format_percentiles(self.callback_latency)}")
+        print(f"Callbacks failed: {self.callbacks_failed}")
+        for status, count in self.verdicts.most_common():
+            print(f"  {status}: {count}")
+        if self.sink is not None:
+            print(f"Callbacks received by the sink: {self.sink.received}")
+            print(f"Run to callback turnaround: {format_percentiles(self.sink.turnaround)}")
+
+
+async def run_fake_runner(runner: FakeCodeRunner, host: str, port: int):
+    server = await serve(runner.handle, host, port)
+    print(f"Fake code-runner listening on {host}:{port}, {runner.max_concurrent} concurrent runs, "
+          f"run time {runner.latency.spec}, callbacks to {runner.callback_url}")
+    tasks = [asyncio.create_task(runner.dispatch()), asyncio.create_task(runner.report())]
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await runner.client.close()
+
+
+def default_max_concurrent() -> int:
+    try:
+        return int(os.environ["MAX_CONCURRENT_RUNS"])
+    except (KeyError, ValueError):
+        return DEFAULT_MAX_CONCURRENT
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Fake code-runner: accepts /run like the real one and posts random verdicts back to the judge',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="The judge sends runs to every address of the host name code-runner on port 2, so for a\n"
+               "judge running outside Docker add '127.0.0.1 code-runner' to /etc/hosts and start this\n"
+               "script on port 2 with --callback-url pointing at the judge, or list the fake runners in\n"
+               "the judge's CODE_RUNNER_ADDRS (e.g. 127.0.0.1:9001,127.0.0.1:9002).\n\n" + LATENCY_HELP)
+    parser.add_argument('--host', default='0.0.0.0', help='Address to listen on (default: 0.0.0.0)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'Port to listen on (default: {DEFAULT_PORT})')
+    parser.add_argument('--callback-url', default=os.environ.get("JUDGE_CALLBACK_URL"),
+                      help=f'Where verdicts are posted (default: $JUDGE_CALLBACK_URL, {CALLBACK_URL}, '
+                           f'or this process with --sink)')
+    parser.add_argument('--max-concurrent', type=int, default=default_max_concurrent(),
+                      help=f'Concurrent runs (default: $MAX_CONCURRENT_RUNS or {DEFAULT_MAX_CONCURRENT})')
+    parser.add_argument('--queue-size', type=int, default=QUEUE_SIZE,
+                      help=f'Queued runs before /run answers 503 (default: {QUEUE_SIZE})')
+    parser.add_argument('--latency', default=DEFAULT_LATENCY,
+                      help=f'Run time distribution, see below (default: {DEFAULT_LATENCY})')
+    parser.add_argument('--verdicts', default=DEFAULT_VERDICTS,
+                      help='Comma separated STATUS=WEIGHT pairs (default: a typical contest mix)')
+    parser.add_argument('--callback-batch-ms', type=float, default=0,
+                      help=f'Post verdicts finished within this window together to /code/callback/batch, like '
+                           f'the code-runner does by default with {CALLBACK_BATCH_MS} ms (default: one callback each)')
+    parser.add_argument('--sink', action='store_true',
+                      help='Also accept /code/callback and measure run to callback turnaround')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed for reproducible runs')
+
+    args = parser.parse_args()
+    if args.seed is not None:
+        random.seed(args.seed)
+    try:
+        latency = LatencyDistribution(args.latency)
+        verdicts = parse_verdicts(args.verdicts)
+    except ValueError as e:
+        parser.error(str(e))
+    callback_url = args.callback_url
+    if callback_url is None:
+        callback_url = f"http://127.0.0.1:{args.port}/code/callback" if args.sink else CALLBACK_URL
+
+    runner = FakeCodeRunner(callback_url, args.max_concurrent, latency, verdicts, args.queue_size,
+                            CallbackSink() if args.sink else None, args.callback_batch_ms)
+    try:
+        asyncio.run(run_fake_runner(runner, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    runner.print_summary()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+import contextlib
+import csv
+import importlib
+import io
+import json
+import math
+import os
+import sys
+import time
+import argparse
+from datetime import datetime
+from fnmatch import fnmatch
+from typing import Any, Dict, List, Optional, Tuple
+
+import load_engine
+from latency_histogram import LatencyHistogram
+from load_coordinator import QUESTIONS_FILE, SCRIPTS, USERS_FILE, load_json
+from load_engine import CPU_WARNING, Scenario, Stats
+from rate_profile import RateProfile
+from scenario_dsl import ScenarioDefinition
+
+# Configuration
+DSL_BASE_URL = "http://localhost:80"
+SCENARIO_FILES = {"browse": os.path.join(os.path.dirname(os.path.abspath(__file__)), "scenarios", "browse.yaml")}
+DEFAULT_SCENARIOS = "login,browse,submission,verdict"
+DEFAULT_P99_MS = 500  # latency objective for every request type without its own --slo
+DEFAULT_MAX_ERRORS = 0.01  # share of failed requests a passing probe may have
+START_RATE = 10  # iterations per second of the first probe
+GROWTH = 2  # rate multiplier until the first probe fails
+PRECISION = 0.05  # stop bisecting once the bracket is this narrow relative to the passing rate
+MAX_PROBES = 12  # per scenario
+PROBE_SECONDS = 30  # measured part of a probe
+WARMUP_SECONDS = 5  # run before measuring, so logins and new connections do not count
+COOLDOWN_SECONDS = 5  # pause between probes so queues drain
+IN_FLIGHT_SECONDS = 5  # virtual users per probe = rate x this, so slow iterations do not hold back arrivals
+KNEE_FACTOR = 2  # the knee is the first rate whose p99 reaches this multiple of the lightest probe's
+
+
+class ProbeWindow:
+    """Engine observer keeping only the results that arrive after the warmup
+
+    Results come in batches; the first batch kept holds everything since the
+    batch before it, so the measured interval starts at that earlier batch.
+    """
+
+    def __init__(self, measure_from: float):
+        self.measure_from = measure_from
+        self.stats = Stats()
+        self.last = time.time()
+        self.started: Optional[float] = None
+
+    def observe(self, delta: Stats):
+        now = time.time()
+        if now >= self.measure_from:
+            if self.started is None:
+                self.started = self.last
+            self.stats.merge(delta)
+        self.last = now
+
+    @property
+    def seconds(self) -> float:
+        return self.last - self.started if self.started is not None else 0.0
+
+
+def load_target(name: str, args: argparse.Namespace) -> Tuple[Scenario, Dict[str, Any], str]:
+    """Scenario, data and base URL of a load test script (see load_coordinator.SCRIPTS) or a scenario file"""
+    if name in SCRIPTS:
+        module_name, keys = SCRIPTS[name]
+        module = importlib.import_module(module_name)
+        files = {"users": args.users_file, "questions": args.questions_file}
+        data = module.scenario_data(**{key: load_json(files[key]) for key in keys})
+        return module.SCENARIO, data, args.base_url or module.BASE_URL
+    definition = ScenarioDefinition.load(SCENARIO_FILES.get(name, name))
+    if "users" in definition.data_files:
+        definition.data_files["users"] = os.path.abspath(args.users_file)
+    return definition.scenario(), definition.load_data(), args.base_url or definition.base_url or DSL_BASE_URL
+
+
+def parse_slos(values: List[str]) -> List[Tuple[str, float]]:
+    """PATTERN=MS pairs, e.g. "verdict*=10000" for the time to a verdict"""
+    slos = []
+    for value in values:
+        pattern, _, milliseconds = value.rpartition("=")
+        if not pattern:
+            raise ValueError(f"Invalid --slo {value!r}, expected REQUEST_PATTERN=MS")
+        slos.append((pattern, float(milliseconds)))
+    return slos
+
+
+def slo_for(name: str, slos: List[Tuple[str, float]], default: float) -> float:
+    for pattern, milliseconds in slos:
+        if fnmatch(name, pattern):
+            return milliseconds
+    return default
+
+
+def probe(scenario: Scenario, data: Dict[str, Any], base_url: str, rate: float,
+          args: argparse.Namespace) -> Dict[str, Any]:
+    """Offer rate iterations per second and measure how the server holds up after the warmup"""
+    vus = max(args.vus, math.ceil(rate * IN_FLIGHT_SECONDS))
+    window = ProbeWindow(time.time() + args.warmup)
+    output = sys.stdout if args.verbose else io.StringIO()
+    with contextlib.redirect_stdout(output):
+        stats = load_engine.run(scenario, vus, 1, base_url, data, args.connections, args.processes,
+                                RateProfile.constant(rate, args.warmup + args.duration), observers=[window])
+    measured = window.stats
+    seconds = max(window.seconds, 1e-9)
+    latency = LatencyHistogram()
+    total = failed = 0
+    p99s = {}  # request type -> (p99, share of its objective)
+    for name, request_stats in measured.requests.items():
+        latency.merge(request_stats.latency)
+        total += request_stats.total
+        failed += request_stats.failed
+        p99 = request_stats.latency.percentile(99)
+        p99s[name] = (p99, p99 / slo_for(name, args.slos, args.p99))
+    worst = max(p99s, key=lambda name: p99s[name][1], default=None)
+    error_rate = failed / total if total else 1.0
+    cpu_busy = stats.cpu_time / (stats.total_time * max(1, min(args.processes, vus))) if stats.total_time else 0
+    return {
+        "rate": rate,
+        "vus": vus,
+        "throughput": total / seconds,
+        "requests": total,
+        "p50": latency.percentile(50),
+        "p90": latency.percentile(90),
+        "p99": latency.percentile(99),
+        "worst_request": worst,
+        "worst_p99": p99s[worst][0] if worst else 0.0,
+        "error_rate": error_rate,
+        "schedule_lag_p99": measured.schedule_lag.percentile(99),
+        "generator_cpu": cpu_busy,
+        "slo_violations": [name for name, (_, share) in p99s.items() if share > 1],
+        "passed": total > 0 and all(share <= 1 for _, share in p99s.values()) and error_rate <= args.max_errors
+    }
+
+
+def knee_rate(probes: List[Dict[str, Any]]) -> Optional[float]:
+    """First offered rate whose p99 is KNEE_FACTOR times the p99 of the lightest probe"""
+    ordered = sorted(probes, key=lambda p: p["rate"])
+    if not ordered or not ordered[0]["p99"]:
+        return None
+    for result in ordered[1:]:
+        if result["p99"] >= ordered[0]["p99"] * KNEE_FACTOR:
+            return result["rate"]
+    return None
+
+
+def print_probe(name: str, result: Dict[str, Any]):
+    verdict = "ok" if result["passed"] else "FAIL"
+    print(f"  {name} @ {result['rate']:g}/s ({result['vus']} VUs): {result['throughput']:.1f} req/s, "
+          f"p50 {result['p50']:.1f} ms, p99 {result['p99']:.1f} ms "
+          f"(worst {result['worst_request']} {result['worst_p99']:.1f} ms), "
+          f"errors {result['error_rate']:.2%} -> {verdict}")
+    if result["generator_cpu"] > CPU_WARNING:
+        print(f"    Warning: load generator {result['generator_cpu']:.0%} busy, raise --processes "
+              f"before trusting this probe")
+
+
+def find_capacity(name: str, args: argparse.Namespace) -> Dict[str, Any]:
+    """Grow the offered rate until a probe misses the SLO, then bisect between the last pass and first failure"""
+    scenario, data, base_url = load_target(name, args)
+    print(f"\nSearching capacity of {name} against {base_url}")
+    probes: List[Dict[str, Any]] = []
+
+    def passes(rate: float) -> bool:
+        if probes:
+            time.sleep(args.cooldown)
+        result = probe(scenario, data, base_url, round(rate, 2), args)
+        probes.append(result)
+        print_probe(name, result)
+        return result["passed"]
+
+    low, high = 0.0, None
+    rate = args.start_rate
+    while len(probes) < args.max_probes:
+        if not passes(rate):
+            high = rate
+            break
+        low = rate
+        if rate >= args.max_rate:
+            break
+        rate = min(rate * args.growth, args.max_rate)
+    while high is not None and high - low > args.precision * max(low, 1) and len(probes) < args.max_probes:
+        rate = (low + high) / 2
+        if passes(rate):
+            low = rate
+        else:
+            high = rate
+
+    if high is None:
+        note = f"not saturated up to {low:g}/s; raise --max-rate"
+    elif low == 0:
+        note = f"already failing at {high:g}/s; lower --start-rate"
+    else:
+        note = f"fails at {high:g}/s"
+    return {
+        "scenario": name,
+        "base_url": base_url,
+        "capacity": round(low, 2),
+        "first_failing_rate": high and round(high, 2),
+        "knee": knee_rate(probes),
+        "note": note,
+        "probes": sorted(probes, key=lambda p: p["rate"])
+    }
+
+
+def save_curve(results: List[Dict[str, Any]], path: str):
+    """Every probe as one CSV row, to plot throughput and p99 against offered rate"""
+    columns = ["rate", "vus", "throughput", "requests", "p50", "p90", "p99", "worst_request", "worst_p99",
+               "error_rate", "schedule_lag_p99", "generator_cpu", "passed"]
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["scenario"] + columns)
+        for result in results:
+            for p in result["probes"]:
+                writer.writerow([result["scenario"]] + [p[column] for column in columns])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Find the highest open-loop rate each scenario sustains within a p99 latency and error budget',
+        epilog=f"Scenarios: {', '.join(list(SCRIPTS) + list(SCENARIO_FILES))} or a scenario file.\n"
+               f"Each probe offers a constant rate for --warmup + --duration seconds and only the part after the "
+               f"warmup is measured.\nExample: find_capacity.py --scenarios verdict --p99 300 "
+               f"--slo 'verdict*=15000' --base-url http://localhost:80",
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', default=DEFAULT_SCENARIOS,
+                      help=f'Comma separated scenarios to measure (default: {DEFAULT_SCENARIOS})')
+    parser.add_argument('--base-url', default=None, help="Target URL (default: each scenario's own)")
+    parser.add_argument('--p99', type=float, default=DEFAULT_P99_MS,
+                      help=f'p99 latency objective in ms for every request type (default: {DEFAULT_P99_MS})')
+    parser.add_argument('--slo', dest='slos', action='append', default=[], metavar='PATTERN=MS',
+                      help='p99 objective for matching request types, e.g. "verdict*=15000" (repeatable)')
+    parser.add_argument('--max-errors', type=float, default=DEFAULT_MAX_ERRORS,
+                      help=f'Highest share of failed requests a passing probe may have (default: {DEFAULT_MAX_ERRORS})')
+    parser.add_argument('--start-rate', type=float, default=START_RATE,
+                      help=f'Iterations per second of the first probe (default: {START_RATE})')
+    parser.add_argument('--max-rate', type=float, default=10000, help='Highest rate to try (default: 10000)')
+    parser.add_argument('--growth', type=float, default=GROWTH,
+                      help=f'Rate multiplier until a probe fails (default: {GROWTH})')
+    parser.add_argument('--precision', type=float, default=PRECISION,
+                      help=f'Relative width at which bisection stops (default: {PRECISION})')
+    parser.add_argument('--max-probes', type=int, default=MAX_PROBES,
+                      help=f'Probes per scenario (default: {MAX_PROBES})')
+    parser.add_argument('--duration', type=float, default=PROBE_SECONDS,
+                      help=f'Measured seconds per probe (default: {PROBE_SECONDS})')
+    parser.add_argument('--warmup', type=float, default=WARMUP_SECONDS,
+                      help=f'Unmeasured seconds at the start of each probe (default: {WARMUP_SECONDS})')
+    parser.add_argument('--cooldown', type=float, default=COOLDOWN_SECONDS,
+                      help=f'Pause between probes (default: {COOLDOWN_SECONDS})')
+    parser.add_argument('--vus', type=int, default=1,
+                      help=f'Minimum virtual users per probe (default: rate x {IN_FLIGHT_SECONDS})')
+    parser.add_argument('--connections', type=int, default=None,
+                      help='Max pooled keep-alive connections (default: number of virtual users)')
+    parser.add_argument('--processes', type=int, default=1,
+                      help='Number of load generator processes (default: 1)')
+    parser.add_argument('--users-file', default=USERS_FILE, help=f'Test users (default: {USERS_FILE})')
+    parser.add_argument('--questions-file', default=QUESTIONS_FILE,
+                      help=f'Test questions (default: {QUESTIONS_FILE})')
+    parser.add_argument('--verbose', action='store_true', help="Show every probe's own output")
+
+    args = parser.parse_args()
+    try:
+        args.slos = parse_slos(args.slos)
+    except ValueError as e:
+        parser.error(str(e))
+
+    results = [find_capacity(name, args) for name in args.scenarios.split(",")]
+
+    print("\nCapacity Report:")
+    slos = ", ".join([f"{args.p99:g} ms"] + [f"{pattern} {ms:g} ms" for pattern, ms in args.slos])
+    print(f"p99 objective: {slos}; error budget {args.max_errors:.2%}")
+    for result in results:
+        knee = f", knee at {result['knee']:g}/s" if result["knee"] else ""
+        print(f"  {result['scenario']}: {result['capacity']:g} iterations/s sustained{knee} ({result['note']})")
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    curve_file = f"capacity_curve_{timestamp}.csv"
+    report_file = f"capacity_report_{timestamp}.json"
+    save_curve(results, curve_file)
+    with open(report_file, 'w') as f:
+        json.dump({
+            "timestamp": datetime.now().isoformat(),
+            "p99_ms": args.p99,
+            "slos": dict(args.slos),
+            "max_errors": args.max_errors,
+            "probe_seconds": args.duration,
+            "scenarios": results
+        }, f, indent=2)
+    print(f"\nKnee-of-curve data saved to {curve_file}, report to {report_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+import asyncio
+import json
+import math
+import os
+import random
+import shutil
+import subprocess
+import time
+import argparse
+import warnings
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from multiprocessing import Pool
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+from async_http import HttpClient
+
+# Configuration
+USERS_FILE = "test_users.json"
+NUM_USERS = 10_000
+NUM_PROBLEMS = 50_000
+FIXTURE_ID_BASE = 1_000_000_000  # fixture rows get ids from here on, far above the judge's own sequences
+CHUNK_SIZE = 5_000  # rows generated per worker task
+DEFAULT_PASSWORD = "fixture123"
+EXPORT_USERS = 1_000  # users written to USERS_FILE for the load tests
+IO_SIZE = 4096  # median bytes of a problem's input.txt
+IO_SIZE_SIGMA = 1.5  # lognormal spread of test file sizes
+MAX_IO_SIZE = 8 << 20
+STATEMENT_WORDS = 150  # median words of a problem statement
+PUBLISHED_RATIO = 0.7
+HISTORY_DAYS = 365  # rows are created over this many days before REFERENCE_TIME
+REFERENCE_TIME = datetime(2025, 1, 1, tzinfo=timezone.utc)  # fixed so the same seed gives the same rows
+TIME_LIMITS = [1000, 2000, 3000, 5000]  # ms
+MEMORY_LIMITS = [64, 128, 256, 512]  # MB
+SIGNUP_CONCURRENCY = 50
+SIGNUP_ENDPOINT = "/signup"
+
+USER_COLUMNS = ["id", "created_at", "updated_at", "email", "password", "is_admin", "admin_created_by_id",
+                "solve_attemps", "success_attemps", "is_test"]
+PROBLEM_COLUMNS = ["id", "created_at", "updated_at", "title", "statement", "is_published", "published_at",
+                   "time_limit", "memory_limit", "owner_id", "is_test"]
+
+LOREM_WORDS = [
+    "lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit", "sed", "do", "eiusmod",
+    "tempor", "incididunt", "ut", "labore", "et", "dolore", "magna", "aliqua", "enim", "ad", "minim", "veniam",
+    "quis", "nostrud", "exercitation", "ullamco", "nisi", "aliquip", "ea", "commodo", "consequat", "duis",
+    "aute", "irure", "in", "reprehenderit", "voluptate", "velit", "cillum", "eu", "fugiat", "nulla", "pariatur",
+    "excepteur", "sint", "occaecat", "non", "proident", "sunt", "culpa", "qui", "officia", "deserunt", "mollit",
+    "anim", "id", "est", "laborum"
+]
+
+
+def fixture_email(index: int) -> str:
+    return f"fixture_user_{index + 1}@example.com"
+
+
+def hash_password(password: str) -> str:
+    """bcrypt hash the judge accepts at login, hashed once for every fixture user"""
+    try:
+        import bcrypt
+        return bcrypt.hashpw(password.encode(), bcrypt.gensalt(10)).decode()
+    except ImportError:
+        pass
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        import crypt  # removed in Python 3.13; pass --password-hash there
+    return crypt.crypt(password, crypt.mksalt(crypt.METHOD_BLOWFISH, rounds=1 << 10))
+
+
+def copy_value(value: Any) -> str:
+    """Encode a value for PostgreSQL's COPY text format"""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return (str(value).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+
+def copy_row(values: Iterable[Any]) -> str:
+    return "\t".join(copy_value(value) for value in values) + "\n"
+
+
+def chunk_rng(seed: int, table: str, chunk: int) -> random.Random:
+    """Independent stream per chunk so output does not depend on the number of workers"""
+    return random.Random(f"{seed}:{table}:{chunk}")
+
+
+def created_at(rng: random.Random) -> datetime:
+    return REFERENCE_TIME - timedelta(seconds=rng.uniform(0, HISTORY_DAYS * 86400))
+
+
+def user_chunk(chunk: int, seed: int, count: int, password_hash: str) -> bytes:
+    rng = chunk_rng(seed, "users", chunk)
+    rows = []
+    for index in range(chunk * CHUNK_SIZE, min((chunk + 1) * CHUNK_SIZE, count)):
+        created = created_at(rng)
+        attempts = int(rng.expovariate(1 / 20))
+        rows.append(copy_row([
+            FIXTURE_ID_BASE + index, created, created, fixture_email(index), password_hash, False, 0,
+            attempts, rng.randint(0, attempts), True
+        ]))
+    return "".join(rows).encode()
+
+
+def problem_chunk(chunk: int, seed: int, count: int, users: int, io_size: int,
+                  upload_folder: Optional[str]) -> Tuple[bytes, int]:
+    """COPY rows of one chunk of problems, plus the bytes of test files written for them"""
+    rng = chunk_rng(seed, "problems", chunk)
+    rows = []
+    file_bytes = 0
+    for index in range(chunk * CHUNK_SIZE, min((chunk + 1) * CHUNK_SIZE, count)):
+        problem_id = FIXTURE_ID_BASE + index
+        created = created_at(rng)
+        published = rng.random() < PUBLISHED_RATIO
+        words = max(5, int(rng.lognormvariate(math.log(STATEMENT_WORDS), 0.6)))
+        rows.append(copy_row([
+            problem_id, created, created, f"fixture problem {index + 1}",
+            " ".join(rng.choices(LOREM_WORDS, k=words)), published,
+            created + timedelta(seconds=rng.uniform(0, 3 * 86400)) if published else None,
+            rng.choice(TIME_LIMITS), rng.choice(MEMORY_LIMITS), FIXTURE_ID_BASE + rng.randrange(users), True
+        ]))
+        if upload_folder:
+            file_bytes += write_test_files(os.path.join(upload_folder, str(problem_id)),
+                                           random.Random(f"{seed}:files:{index}"), io_size)
+    return "".join(rows).encode(), file_bytes
+
+
+def write_test_files(problem_dir: str, rng: random.Random, io_size: int) -> int:
+    """input.txt of random integers and output.txt of their doubles, which go_corpus/ok.go solves"""
+    target = min(MAX_IO_SIZE, max(1, int(rng.lognormvariate(math.log(io_size), IO_SIZE_SIGMA))))
+    # Nine digit numbers average just under eleven bytes per line
+    numbers = [rng.randrange(1_000_000_000) for _ in range(max(1, target // 11))]
+    os.makedirs(problem_dir, exist_ok=True)
+    input_text = "\n".join(map(str, numbers))
+    output_text = "\n".join(str(2 * n) for n in numbers)
+    with open(os.path.join(problem_dir, "input.txt"), "w") as f:
+        f.write(input_text)
+    with open(os.path.join(problem_dir, "output.txt"), "w") as f:
+        f.write(output_text)
+    return len(input_text) + len(output_text)
+
+
+def psql(dsn: str, sql: str) -> str:
+    result = subprocess.run(["psql", dsn, "-v", "ON_ERROR_STOP=1", "-q", "-At", "-c", sql],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"psql failed: {result.stderr.strip()}")
+    return result.stdout
+
+
+def load_table(table: str, columns: List[str], chunks: Iterable[bytes], dsn: Optional[str],
+               out_dir: Optional[str]) -> int:
+    """Stream generated chunks into COPY through psql, or into DIR/<table>.copy; returns bytes written"""
+    process = None
+    if out_dir:
+        sink = open(os.path.join(out_dir, f"{table}.copy"), "wb")
+    else:
+        process = subprocess.Popen(
+            ["psql", dsn, "-v", "ON_ERROR_STOP=1", "-q", "-c", f"COPY {table} ({', '.join(columns)}) FROM STDIN"],
+            stdin=subprocess.PIPE)
+        sink = process.stdin
+    written = 0
+    try:
+        for data in chunks:
+            sink.write(data)
+            written += len(data)
+    finally:
+        sink.close()
+    if process is not None and process.wait() != 0:
+        raise RuntimeError(f"COPY into {table} failed")
+    return written
+
+
+def run_stage(name: str, rows: int, pool: Pool, task: Callable, load: Callable[[Iterable[bytes]], int]):
+    """Generate chunks in the worker pool, in order, and hand them to load"""
+    start_time = time.perf_counter()
+    chunks = pool.imap(task, range(math.ceil(rows / CHUNK_SIZE)))
+    written = load(chunks)
+    elapsed = time.perf_counter() - start_time
+    print(f"{name}: {rows} rows, {written / 1e6:.1f} MB of COPY data in {elapsed:.1f}s "
+          f"({rows / elapsed if elapsed else 0:.0f} rows/s)")
+
+
+async def signup_users(base_url: str, count: int, password: str, concurrency: int) -> int:
+    """Register fixture users through the judge's signup form; returns how many succeeded"""
+    client = HttpClient(base_url, pool_size=concurrency)
+    indexes = iter(range(count))
+    created = failed = 0
+    start_time = time.perf_counter()
+
+    async def worker():
+        nonlocal created, failed
+        for index in indexes:
+            try:
+                response = await client.post(SIGNUP_ENDPOINT, data={
+                    "email": fixture_email(index),
+                    "password": password,
+                    "confirm-password": password
+                })
+                ok = response.status_code == 302 and response.header("Location", "").startswith("/login")
+            except Exception:
+                ok = False
+            if ok:
+                created += 1
+            else:
+                failed += 1
+            if (created + failed) % 1000 == 0:
+                print(f"Signed up {created + failed}/{count} users ({failed} failed)")
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    finally:
+        await client.close()
+    elapsed = time.perf_counter() - start_time
+    print(f"users: {created} signed up, {failed} failed in {elapsed:.1f}s "
+          f"({(created + failed) / elapsed if elapsed else 0:.0f} signups/s)")
+    return created
+
+
+def erase_fixtures(dsn: str, upload_folder: Optional[str]):
+    """Delete every fixture row and problem folder (ids from FIXTURE_ID_BASE on)"""
+    psql(dsn, f"DELETE FROM submissions WHERE problem_id >= {FIXTURE_ID_BASE} OR owner_id >= {FIXTURE_ID_BASE}; "
+              f"DELETE FROM problems WHERE id >= {FIXTURE_ID_BASE}; "
+              f"DELETE FROM users WHERE id >= {FIXTURE_ID_BASE}")
+    removed = 0
+    if upload_folder and os.path.isdir(upload_folder):
+        for name in os.listdir(upload_folder):
+            if name.isdigit() and int(name) >= FIXTURE_ID_BASE:
+                shutil.rmtree(os.path.join(upload_folder, name))
+                removed += 1
+    print(f"Fixture rows deleted, {removed} problem folders removed")
+
+
+def default_dsn() -> Optional[str]:
+    """Connection string from the same variables the judge reads"""
+    if "POSTGRES_HOST" not in os.environ:
+        return None
+    return (f"host={os.environ['POSTGRES_HOST']} user={os.environ.get('POSTGRES_USER', '')} "
+            f"password={os.environ.get('POSTGRES_PASSWORD', '')} dbname={os.environ.get('POSTGRES_DB', '')} "
+            f"port=5432 sslmode=disable")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Generate users, problems and test files at production volume and load them into the judge',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=f"Rows are bulk loaded with COPY through psql (--dsn) or written as COPY files (--out).\n"
+               f"Fixture ids start at {FIXTURE_ID_BASE} and rows are marked is_test; remove them with --erase.\n"
+               f"The same --seed always produces the same rows and files, whatever the number of workers.")
+    parser.add_argument('--users', type=int, default=NUM_USERS, help=f'Users to create (default: {NUM_USERS})')
+    parser.add_argument('--problems', type=int, default=NUM_PROBLEMS,
+                      help=f'Problems to create (default: {NUM_PROBLEMS})')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed (default: 1)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                      help='Generator processes (default: number of CPUs)')
+    parser.add_argument('--dsn', default=default_dsn(),
+                      help='PostgreSQL connection string for psql (default: from POSTGRES_HOST, POSTGRES_USER, ...)')
+    parser.add_argument('--out', default=None, help='Write users.copy, problems.copy and load.sql here instead')
+    parser.add_argument('--signup', metavar='BASE_URL', default=None,
+                      help='Create users through the judge\'s /signup form instead of COPY (problems are skipped)')
+    parser.add_argument('--concurrency', type=int, default=SIGNUP_CONCURRENCY,
+                      help=f'Concurrent signup requests (default: {SIGNUP_CONCURRENCY})')
+    parser.add_argument('--password', default=DEFAULT_PASSWORD,
+                      help=f'Password of every fixture user (default: {DEFAULT_PASSWORD})')
+    parser.add_argument('--password-hash', default=None,
+                      help='bcrypt hash of --password to store, instead of hashing it here')
+    parser.add_argument('--upload-folder', default=os.environ.get("PROBLEM_UPLOAD_FOLDER_SRC"),
+                      help='Where problem folders with input.txt/output.txt go '
+                           '(default: $PROBLEM_UPLOAD_FOLDER_SRC; no files without it)')
+    parser.add_argument('--io-size', type=int, default=IO_SIZE,
+                      help=f'Median size of a test input file in bytes (default: {IO_SIZE})')
+    parser.add_argument('--users-file', default=USERS_FILE, help=f'Credentials file for the load tests '
+                                                                  f'(default: {USERS_FILE})')
+    parser.add_argument('--export-users', type=int, default=EXPORT_USERS,
+                      help=f'Users written to the credentials file (default: {EXPORT_USERS})')
+    parser.add_argument('--erase', action='store_true', help='Delete previously loaded fixtures and exit')
+
+    args = parser.parse_args()
+    if args.erase:
+        if not args.dsn:
+            parser.error("--erase needs --dsn")
+        erase_fixtures(args.dsn, args.upload_folder)
+        return
+    if args.signup and args.problems:
+        print("Problems need their owners' ids, so they are only loaded with COPY; skipping problems")
+        args.problems = 0
+    if not args.signup and not (args.dsn or args.out):
+        parser.error("give --dsn (or the POSTGRES_* variables), --out or --signup")
+    if args.problems and not args.users:
+        parser.error("problems need at least one user to own them")
+
+    print(f"Generating {args.users} users and {args.problems} problems with seed {args.seed}, "
+          f"{args.workers} workers")
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+
+    if args.signup:
+        asyncio.run(signup_users(args.signup, args.users, args.password, args.concurrency))
+    else:
+        password_hash = args.password_hash or hash_password(args.password)
+        load = partial(load_table, dsn=args.dsn, out_dir=args.out)
+        file_bytes = 0
+
+        def count_files(chunks: Iterable[Tuple[bytes, int]]) -> Iterable[bytes]:
+            nonlocal file_bytes
+            for data, size in chunks:
+                file_bytes += size
+                yield data
+
+        with Pool(args.workers) as pool:
+            run_stage("users", args.users, pool,
+                      partial(user_chunk, seed=args.seed, count=args.users, password_hash=password_hash),
+                      partial(load, "users", USER_COLUMNS))
+            if args.problems:
+                if not args.upload_folder:
+                    print("No --upload-folder: problems get no test files")
+                run_stage("problems", args.problems, pool,
+                          partial(problem_chunk, seed=args.seed, count=args.problems, users=args.users,
+                                  io_size=args.io_size, upload_folder=args.upload_folder),
+                          lambda chunks: load("problems", PROBLEM_COLUMNS, count_files(chunks)))
+                if args.upload_folder:
+                    print(f"Test files: {file_bytes / 1e6:.1f} MB under {args.upload_folder}")
+
+        if args.out:
+            with open(os.path.join(args.out, "load.sql"), "w") as f:
+                f.write(f"\\copy users ({', '.join(USER_COLUMNS)}) FROM 'users.copy'\n")
+                if args.problems:
+                    f.write(f"\\copy problems ({', '.join(PROBLEM_COLUMNS)}) FROM 'problems.copy'\n")
+            print(f"COPY files written to {args.out}; load them with: cd {args.out} && psql DSN -f load.sql")
+
+    exported = [{"email": fixture_email(i), "password": args.password}
+                for i in range(min(args.users, args.export_users))]
+    with open(args.users_file, 'w') as f:
+        json.dump(exported, f, indent=2)
+    print(f"Credentials of {len(exported)} fixture users saved to {args.users_file}")
+
+
+if __name__ == "__main__":
+    main()
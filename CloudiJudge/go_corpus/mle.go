@@ -0,0 +1,17 @@
+package main
+
+import "fmt"
+
+func main() {
+	var chunks [][]byte
+	for {
+		chunk := make([]byte, 16<<20)
+		for i := range chunk {
+			chunk[i] = byte(i)
+		}
+		chunks = append(chunks, chunk)
+		if len(chunks) < 0 {
+			fmt.Println(len(chunks))
+		}
+	}
+}
@@ -0,0 +1,15 @@
+package main
+
+import "fmt"
+
+func main() {
+	var values []int
+	var n int
+	for {
+		if _, err := fmt.Scan(&n); err != nil {
+			break
+		}
+		values = append(values, n)
+	}
+	fmt.Println(values[len(values)+1])
+}
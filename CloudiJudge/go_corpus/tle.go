@@ -0,0 +1,13 @@
+package main
+
+import "fmt"
+
+func main() {
+	x := 0
+	for {
+		x++
+		if x < 0 {
+			fmt.Println(x)
+		}
+	}
+}
@@ -0,0 +1,13 @@
+package main
+
+import "fmt"
+
+func main() {
+	var n int
+	for {
+		if _, err := fmt.Scan(&n); err != nil {
+			return
+		}
+		fmt.Println(n + 1)
+	}
+}
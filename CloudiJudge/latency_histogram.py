@@ -0,0 +1,148 @@
+import base64
+import math
+import zlib
+from array import array
+from typing import Any, Dict, List, Tuple
+
+# Configuration
+SUB_BUCKET_BITS = 7  # 128 sub-buckets per power of two, at most ~0.8% relative error
+HIGHEST_TRACKABLE_US = 3600 * 1000 * 1000  # one hour; larger samples land in the last bucket
+REPORTED_PERCENTILES = [50, 90, 99, 99.9]
+
+_SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+
+def _index_for(value_us: int) -> int:
+    if value_us < 2 * _SUB_BUCKETS:
+        return value_us
+    exponent = value_us.bit_length() - (SUB_BUCKET_BITS + 1)
+    return (exponent + 1) * _SUB_BUCKETS + (value_us >> exponent) - _SUB_BUCKETS
+
+
+def _highest_value_at(index: int) -> int:
+    if index < 2 * _SUB_BUCKETS:
+        return index
+    exponent = index // _SUB_BUCKETS - 1
+    sub_bucket = index % _SUB_BUCKETS + _SUB_BUCKETS
+    return ((sub_bucket + 1) << exponent) - 1
+
+
+_BUCKET_COUNT = _index_for(HIGHEST_TRACKABLE_US) + 1
+
+
+class LatencyHistogram:
+    """Fixed-memory, mergeable histogram of latencies with log-spaced buckets
+
+    Samples are recorded in milliseconds and stored with microsecond resolution,
+    so memory use does not depend on the number of samples.
+    """
+
+    def __init__(self):
+        self.counts = array('q', bytes(8 * _BUCKET_COUNT))
+        self.total_count = 0
+        self.total_ms = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def record(self, value_ms: float, count: int = 1):
+        value_ms = max(value_ms, 0.0)
+        index = min(_index_for(int(value_ms * 1000)), _BUCKET_COUNT - 1)
+        self.counts[index] += count
+        self.total_count += count
+        self.total_ms += value_ms * count
+        self.min = min(self.min, value_ms)
+        self.max = max(self.max, value_ms)
+
+    def merge(self, other: "LatencyHistogram"):
+        if not other.total_count:
+            return
+        counts = self.counts
+        for index, count in other.buckets():
+            counts[index] += count
+        self.total_count += other.total_count
+        self.total_ms += other.total_ms
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def buckets(self) -> List[Tuple[int, int]]:
+        """Non-empty buckets as (index, count) pairs"""
+        return [(index, count) for index, count in enumerate(self.counts) if count]
+
+    def mean(self) -> float:
+        return self.total_ms / self.total_count if self.total_count else 0
+
+    def percentile(self, percentile: float) -> float:
+        """Latency in ms below which the given percentage of samples fall"""
+        if not self.total_count:
+            return 0
+        threshold = max(1, math.ceil(self.total_count * percentile / 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= threshold:
+                value = _highest_value_at(index) / 1000
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        """Mean, reported percentiles and max, in ms"""
+        result = {"count": self.total_count, "mean": self.mean()}
+        for percentile in REPORTED_PERCENTILES:
+            result[f"p{percentile:g}"] = self.percentile(percentile)
+        result["max"] = self.max
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Compact encoding: zlib compressed varints of (index delta, count) pairs"""
+        encoded = bytearray()
+        previous = 0
+        for index, count in self.buckets():
+            _write_varint(encoded, index - previous)
+            _write_varint(encoded, count)
+            previous = index
+        return {
+            "encoding": f"log2-sub{SUB_BUCKET_BITS}-us",
+            "count": self.total_count,
+            "total_ms": self.total_ms,
+            "min": self.min if self.total_count else 0,
+            "max": self.max,
+            "buckets": base64.b64encode(zlib.compress(bytes(encoded))).decode()
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LatencyHistogram":
+        if data["encoding"] != f"log2-sub{SUB_BUCKET_BITS}-us":
+            raise ValueError(f"Unsupported histogram encoding: {data['encoding']}")
+        histogram = cls()
+        encoded = zlib.decompress(base64.b64decode(data["buckets"]))
+        position = 0
+        index = 0
+        while position < len(encoded):
+            delta, position = _read_varint(encoded, position)
+            count, position = _read_varint(encoded, position)
+            index += delta
+            histogram.counts[index] += count
+        histogram.total_count = data["count"]
+        histogram.total_ms = data["total_ms"]
+        histogram.min = data["min"] if histogram.total_count else math.inf
+        histogram.max = data["max"]
+        return histogram
+
+
+def _write_varint(buffer: bytearray, value: int):
+    while value >= 0x80:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _read_varint(data: bytes, position: int) -> Tuple[int, int]:
+    value = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
@@ -0,0 +1,217 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, TextIO
+
+from latency_histogram import LatencyHistogram
+
+if TYPE_CHECKING:
+    from load_engine import Stats
+
+# Configuration
+DEFAULT_INTERVAL = 1.0  # seconds per window
+WINDOW_PERCENTILES = [50, 90, 99]
+METRIC_PREFIX = "loadtest"
+
+
+class LiveMetrics:
+    """Per-interval windows of throughput, latency and status codes while a load test runs
+
+    The engine hands over every batch of results it collects (see Stats.drain);
+    results are assigned to the window in which they arrive. Each closed window is
+    printed, appended to an NDJSON file and exposed on a Prometheus text endpoint.
+    """
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL, path: Optional[str] = None,
+                 prometheus_port: Optional[int] = None, console: bool = True):
+        self.interval = interval
+        self.path = path
+        self.prometheus_port = prometheus_port
+        self.console = console
+        self.lock = threading.Lock()
+        self.window: Dict[str, Any] = {}
+        self.totals: Dict[str, Dict[str, Any]] = {}  # request type -> cumulative counters for Prometheus
+        self.last_rows: List[Dict[str, Any]] = []
+        self.gauges: Dict[str, float] = {}
+        self.gauge_points: Dict[str, Dict[int, float]] = {}  # summed across processes like Stats.series
+        self.file: Optional[TextIO] = None
+        self.server: Optional[ThreadingHTTPServer] = None
+        self.started = self.next_tick = 0.0
+
+    def start(self):
+        self.started = time.time()
+        self.next_tick = self.started + self.interval
+        if self.path:
+            self.file = open(self.path, "a")
+        if self.prometheus_port:
+            self.server = ThreadingHTTPServer(("0.0.0.0", self.prometheus_port), _handler_for(self))
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+            print(f"Prometheus metrics on http://0.0.0.0:{self.prometheus_port}/metrics")
+
+    def observe(self, delta: "Stats"):
+        """Add a batch of results drained from the engine's Stats"""
+        with self.lock:
+            for name, request_stats in delta.requests.items():
+                window = self.window.setdefault(name, {
+                    "successful": 0, "failed": 0, "latency": LatencyHistogram(), "status_codes": {}
+                })
+                window["successful"] += request_stats.successful
+                window["failed"] += request_stats.failed
+                window["latency"].merge(request_stats.latency)
+                total = self.totals.setdefault(name, {
+                    "successful": 0, "failed": 0, "latency_sum": 0.0, "status_codes": {}
+                })
+                total["successful"] += request_stats.successful
+                total["failed"] += request_stats.failed
+                total["latency_sum"] += request_stats.latency.total_ms
+                for code, count in request_stats.status_codes.items():
+                    window["status_codes"][code] = window["status_codes"].get(code, 0) + count
+                    total["status_codes"][code] = total["status_codes"].get(code, 0) + count
+            for name, points in delta.series.items():
+                series = self.gauge_points.setdefault(name, {})
+                for second, value in points.items():
+                    series[second] = series.get(second, 0) + value
+
+    def maybe_tick(self):
+        """Close the current window if its interval is over"""
+        if time.time() >= self.next_tick:
+            self.tick()
+
+    def tick(self):
+        now = time.time()
+        with self.lock:
+            window, self.window = self.window, {}
+            for name, series in self.gauge_points.items():
+                # Every process samples once per second; the last complete second has all of them
+                complete = [second for second in series if second < int(now)] or list(series)
+                if complete:
+                    latest = max(complete)
+                    self.gauges[name] = series[latest]
+                    self.gauge_points[name] = {s: v for s, v in series.items() if s >= latest}
+            gauges = dict(self.gauges)
+        length = max(now - (self.next_tick - self.interval), 1e-9)
+        while self.next_tick <= now:
+            self.next_tick += self.interval
+
+        rows = []
+        for name, counts in sorted(window.items()):
+            latency = counts["latency"]
+            row = {
+                "time": round(now, 3),
+                "elapsed": round(now - self.started, 3),
+                "type": name,
+                "requests": counts["successful"] + counts["failed"],
+                "failed": counts["failed"],
+                "rps": (counts["successful"] + counts["failed"]) / length,
+                "status_codes": counts["status_codes"]
+            }
+            for percentile in WINDOW_PERCENTILES:
+                row[f"p{percentile:g}"] = latency.percentile(percentile)
+            row["max"] = latency.max
+            rows.append(row)
+        with self.lock:
+            self.last_rows = rows
+
+        if self.console:
+            self._print(now, rows, gauges)
+        if self.file:
+            for row in rows:
+                self.file.write(json.dumps(row) + "\n")
+            if gauges:
+                self.file.write(json.dumps({"time": round(now, 3), "elapsed": round(now - self.started, 3),
+                                            "gauges": gauges}) + "\n")
+            self.file.flush()
+
+    def _print(self, now: float, rows: List[Dict[str, Any]], gauges: Dict[str, float]):
+        elapsed = f"[{now - self.started:6.1f}s]"
+        if not rows:
+            print(f"{elapsed} no completed requests")
+        for row in rows:
+            percentiles = " ".join(f"p{p:g} {row[f'p{p:g}']:.1f}" for p in WINDOW_PERCENTILES)
+            codes = " ".join(f"{code}={count}" for code, count in sorted(row["status_codes"].items()))
+            print(f"{elapsed} {row['type']}: {row['rps']:.1f} req/s, {row['failed']} failed | "
+                  f"{percentiles} ms | {codes}")
+        if gauges:
+            print(f"{elapsed} " + ", ".join(f"{name} {value:g}" for name, value in sorted(gauges.items())))
+
+    def close(self):
+        if self.window:
+            self.tick()
+        if self.file:
+            self.file.close()
+            self.file = None
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def prometheus_text(self) -> str:
+        """Cumulative counters plus the latest window, in the Prometheus text format"""
+        with self.lock:
+            totals = {name: dict(total) for name, total in self.totals.items()}
+            rows = list(self.last_rows)
+            gauges = dict(self.gauges)
+        lines = [
+            f"# HELP {METRIC_PREFIX}_requests_total Requests completed by the load generator",
+            f"# TYPE {METRIC_PREFIX}_requests_total counter"
+        ]
+        for name, total in sorted(totals.items()):
+            for code, count in sorted(total["status_codes"].items()):
+                lines.append(f'{METRIC_PREFIX}_requests_total{{type="{_escape(name)}",code="{code}"}} {count}')
+        lines += [
+            f"# HELP {METRIC_PREFIX}_failures_total Requests that did not meet the test's expectations",
+            f"# TYPE {METRIC_PREFIX}_failures_total counter"
+        ]
+        for name, total in sorted(totals.items()):
+            lines.append(f'{METRIC_PREFIX}_failures_total{{type="{_escape(name)}"}} {total["failed"]}')
+        lines += [
+            f"# HELP {METRIC_PREFIX}_latency_ms Response time over the last window",
+            f"# TYPE {METRIC_PREFIX}_latency_ms summary"
+        ]
+        for row in rows:
+            name = _escape(row["type"])
+            for percentile in WINDOW_PERCENTILES:
+                lines.append(f'{METRIC_PREFIX}_latency_ms{{type="{name}",quantile="{percentile / 100:g}"}} '
+                             f'{row[f"p{percentile:g}"]:.3f}')
+        for name, total in sorted(totals.items()):
+            lines.append(f'{METRIC_PREFIX}_latency_ms_sum{{type="{_escape(name)}"}} {total["latency_sum"]:.3f}')
+            lines.append(f'{METRIC_PREFIX}_latency_ms_count{{type="{_escape(name)}"}} '
+                         f'{total["successful"] + total["failed"]}')
+        lines += [
+            f"# HELP {METRIC_PREFIX}_window_rps Requests per second over the last window",
+            f"# TYPE {METRIC_PREFIX}_window_rps gauge"
+        ]
+        for row in rows:
+            lines.append(f'{METRIC_PREFIX}_window_rps{{type="{_escape(row["type"])}"}} {row["rps"]:.3f}')
+        if gauges:
+            lines += [
+                f"# HELP {METRIC_PREFIX}_gauge Values sampled by the test, e.g. pending verdicts",
+                f"# TYPE {METRIC_PREFIX}_gauge gauge"
+            ]
+            for name, value in sorted(gauges.items()):
+                lines.append(f'{METRIC_PREFIX}_gauge{{name="{_escape(name)}"}} {value:g}')
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _handler_for(metrics: LiveMetrics):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return MetricsHandler
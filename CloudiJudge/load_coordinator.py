@@ -0,0 +1,313 @@
+import importlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import argparse
+from datetime import datetime
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Connection, Listener, wait
+from typing import Any, Dict, List, Tuple
+
+import load_engine
+from load_engine import STREAM_INTERVAL, Stats
+
+# Configuration
+DEFAULT_PORT = 5557
+DEFAULT_AUTHKEY = "cloudijudge-load"  # set LOADTEST_AUTHKEY (or --authkey) when agents run on other hosts
+USERS_FILE = "test_users.json"
+QUESTIONS_FILE = "test_questions.json"
+START_DELAY = 2.0  # seconds between the start message and the synchronized start
+CONNECT_TIMEOUT = 120  # seconds to wait for every agent to connect
+
+# Scripts an agent can run: module with SCENARIO and scenario_data(), and the data files sharded across agents
+SCRIPTS = {
+    "login": ("load_test_login", ["users"]),
+    "questions": ("load_test_questions", ["users"]),
+    "submission": ("load_test_submission", ["users", "questions"]),
+    "verdict": ("load_test_verdict", ["users"])
+}
+
+
+def send(conn: Connection, message: Dict[str, Any]):
+    conn.send_bytes(json.dumps(message).encode())
+
+
+def receive(conn: Connection) -> Dict[str, Any]:
+    return json.loads(conn.recv_bytes())
+
+
+def parse_address(value: str) -> Tuple[str, int]:
+    host, _, port = value.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+class AgentStream:
+    """Engine observer that forwards every batch of results to the coordinator"""
+
+    def __init__(self, conn: Connection):
+        self.conn = conn
+
+    def observe(self, delta: Stats):
+        if delta.requests or delta.series or delta.schedule_lag.total_count or delta.cpu_time:
+            send(self.conn, {"type": "stats", "stats": delta.to_dict()})
+
+
+def run_agent(address: Tuple[str, int], authkey: bytes, name: str):
+    """Connect to the coordinator, run the shard it hands out and stream the results back"""
+    conn = Client(address, authkey=authkey)
+    send(conn, {"type": "hello", "name": name})
+    config = receive(conn)
+    try:
+        module = importlib.import_module(SCRIPTS[config["script"]][0])
+        data = module.scenario_data(**config["shard"])
+        rate_profile = load_engine.make_rate_profile(config["rate_profile"], config["rate"], config["duration"])
+        rate_profile = rate_profile and rate_profile.scaled(config["share"])
+    except Exception as e:
+        send(conn, {"type": "error", "message": f"setup failed: {e}"})
+        conn.close()
+        return
+    send(conn, {"type": "ready"})
+
+    start = receive(conn)
+    delay = start["at"] - time.time()
+    if delay > 0:
+        time.sleep(delay)
+    print(f"Agent {name}: starting {config['vus']} virtual users")
+    try:
+        stats = load_engine.run(module.SCENARIO, config["vus"], config["iterations"], config["base_url"], data,
+                                config["connections"], config["processes"], rate_profile,
+                                observers=[AgentStream(conn)], pool=config["pool"])
+        send(conn, {"type": "done", "total_time": stats.total_time})
+    except Exception as e:
+        send(conn, {"type": "error", "message": str(e)})
+    conn.close()
+
+
+def accept_agents(listener: Listener, count: int, timeout: float) -> List[Connection]:
+    connections: List[Connection] = []
+
+    def accept():
+        while len(connections) < count:
+            try:
+                connections.append(listener.accept())
+            except (AuthenticationError, OSError) as e:
+                print(f"Warning: rejected an agent connection: {e}")
+
+    thread = threading.Thread(target=accept, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if len(connections) < count:
+        raise TimeoutError(f"only {len(connections)} of {count} agents connected within {timeout:g} seconds")
+    return connections
+
+
+def load_json(path: str) -> List[Any]:
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        print(f"Error: {path} not found. Please run create_test_users.py / create_test_questions.py first.")
+        exit(1)
+
+
+def run_coordinator(args: argparse.Namespace, authkey: bytes):
+    module_name, shard_keys = SCRIPTS[args.script]
+    base_url = args.base_url or importlib.import_module(module_name).BASE_URL
+    files = {"users": args.users_file, "questions": args.questions_file}
+    datasets = {key: load_json(files[key]) for key in shard_keys}
+    count = args.agents + args.local_agents
+    if args.vus < count:
+        raise SystemExit(f"Error: {args.vus} virtual users cannot be split across {count} agents")
+    for key, values in datasets.items():
+        if len(values) < count:
+            raise SystemExit(f"Error: {len(values)} {key} cannot be split across {count} agents")
+
+    listen = args.listen or (f"0.0.0.0:{DEFAULT_PORT}" if args.agents else "127.0.0.1:0")
+    listener = Listener(parse_address(listen), authkey=authkey)
+    host, port = listener.address
+    print(f"Coordinator listening on {host}:{port}, waiting for {count} agents")
+    local = []
+    env = dict(os.environ, LOADTEST_AUTHKEY=authkey.decode())
+    for i in range(args.local_agents):
+        local.append(subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "agent", "--coordinator", f"127.0.0.1:{port}",
+             "--name", f"local-{i + 1}"],
+            env=env, stdout=subprocess.DEVNULL))
+    options = load_engine.options(args)
+    try:
+        connections = accept_agents(listener, count, CONNECT_TIMEOUT)
+        names = {conn: receive(conn)["name"] for conn in connections}
+        for i, conn in enumerate(connections):
+            share = args.vus // count + (1 if i < args.vus % count else 0)
+            send(conn, {
+                "type": "config",
+                "script": args.script,
+                "shard": {key: values[i::count] for key, values in datasets.items()},
+                "vus": share,
+                "share": share / args.vus,
+                "iterations": args.iterations,
+                "base_url": base_url,
+                "connections": args.connections,
+                "pool": options["pool"],
+                "processes": args.processes,
+                "rate_profile": args.rate_profile,
+                "rate": args.rate,
+                "duration": args.duration
+            })
+            print(f"Agent {names[conn]}: {share} virtual users, "
+                  + ", ".join(f"{len(values[i::count])} {key}" for key, values in datasets.items()))
+        for conn in connections:
+            message = receive(conn)
+            if message["type"] != "ready":
+                raise SystemExit(f"Error: agent {names[conn]}: {message.get('message')}")
+
+        start_at = time.time() + START_DELAY
+        for conn in connections:
+            send(conn, {"type": "start", "at": start_at})
+        time.sleep(max(0.0, start_at - time.time()))
+        stats, agents = merge_agents(connections, names, args, base_url, options)
+    finally:
+        listener.close()
+        for process in local:
+            process.wait(timeout=10) if process.poll() is None else None
+    report(args, stats, agents, count)
+
+
+def merge_agents(connections: List[Connection], names: Dict[Connection, str], args: argparse.Namespace,
+                 base_url: str, options: Dict[str, Any]) -> Tuple[Stats, Dict[str, Dict[str, Any]]]:
+    """Merge result batches from every agent as they arrive, feeding the live, record and profiling observers"""
+    live, results_log, profiler = options["live"], options["results_log"], options["profiler"]
+    rate_profile = options["rate_profile"]
+    observers = [observer for observer in (live, results_log, profiler) if observer]
+    if live:
+        live.start()
+    if results_log:
+        results_log.start({
+            "scenario": args.script, "vus": args.vus, "iterations": args.iterations, "base_url": base_url,
+            "processes": args.processes * len(connections), "agents": list(names.values()),
+            "rate_profile": rate_profile and rate_profile.describe()
+        })
+    if profiler:
+        profiler.start()
+    stats = Stats()
+    agents = {name: {"stats": Stats(), "total_time": None, "error": None} for name in names.values()}
+    pending = set(connections)
+    start_time = time.perf_counter()
+    finished = False
+    try:
+        while pending:
+            ready = wait(list(pending), timeout=STREAM_INTERVAL)
+            for conn in ready:
+                agent = agents[names[conn]]
+                try:
+                    message = receive(conn)
+                except EOFError:
+                    print(f"Warning: agent {names[conn]} disconnected before finishing")
+                    agent["error"] = "disconnected"
+                    pending.discard(conn)
+                    continue
+                if message["type"] == "stats":
+                    delta = Stats.from_dict(message["stats"])
+                    stats.merge(delta)
+                    agent["stats"].merge(delta)
+                    for observer in observers:
+                        observer.observe(delta)
+                elif message["type"] == "done":
+                    agent["total_time"] = message["total_time"]
+                    pending.discard(conn)
+                elif message["type"] == "error":
+                    print(f"Warning: agent {names[conn]} failed: {message['message']}")
+                    agent["error"] = message["message"]
+                    pending.discard(conn)
+            if live:
+                live.maybe_tick()
+        stats.total_time = time.perf_counter() - start_time
+        finished = True
+    finally:
+        if live:
+            live.close()
+        if results_log:
+            results_log.close(stats.total_time if finished else None)
+        if profiler:
+            profiler.close()
+    return stats, agents
+
+
+def report(args: argparse.Namespace, stats: Stats, agents: Dict[str, Dict[str, Any]], count: int):
+    print("\nLoad Test Results:")
+    print(f"Total time: {stats.total_time:.2f} seconds, {stats.total_requests} requests from {count} agents")
+    for name, agent in agents.items():
+        agent_stats = agent["stats"]
+        state = agent["error"] or f"finished in {agent['total_time']:.2f} s"
+        cpu = agent_stats.cpu_time / agent_stats.total_requests * 1000 if agent_stats.total_requests else 0
+        print(f"  {name}: {agent_stats.total_requests} requests, {cpu:.3f} ms CPU per request, {state}")
+    load_engine.print_report(stats)
+    load_engine.print_client_cpu(stats, args.processes * count)
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    results_file = f"distributed_{args.script}_results_{timestamp}.json"
+    with open(results_file, 'w') as f:
+        json.dump({
+            "timestamp": datetime.now().isoformat(),
+            "script": args.script,
+            "total_time": stats.total_time,
+            "agents": {
+                name: {
+                    "requests": agent["stats"].total_requests,
+                    "cpu_time": agent["stats"].cpu_time,
+                    "total_time": agent["total_time"],
+                    "error": agent["error"]
+                }
+                for name, agent in agents.items()
+            },
+            "requests": load_engine.report(stats),
+            "transport": load_engine.transport_report(stats)
+        }, f, indent=2)
+    print(f"\nDetailed results saved to {results_file}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Run a load test script on several generator hosts: one coordinator and any number of agents',
+        epilog="Local only: load_coordinator.py coordinator --script login --local-agents 4\n"
+               "Across hosts: start the coordinator with --agents N, then on each host run\n"
+               "  load_coordinator.py agent --coordinator COORDINATOR_HOST:PORT",
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--authkey', default=os.environ.get("LOADTEST_AUTHKEY", DEFAULT_AUTHKEY),
+                      help='Shared secret agents authenticate with (default: $LOADTEST_AUTHKEY)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    coordinator = commands.add_parser('coordinator', help='Hand out shards, start agents together and merge results')
+    coordinator.add_argument('--script', choices=list(SCRIPTS), required=True, help='Load test to run')
+    coordinator.add_argument('--agents', type=int, default=0, help='Remote agents to wait for (default: 0)')
+    coordinator.add_argument('--local-agents', type=int, default=0,
+                           help='Agents to start as local processes (default: 0)')
+    coordinator.add_argument('--listen', default=None,
+                           help=f'HOST:PORT to accept agents on (default: 0.0.0.0:{DEFAULT_PORT}, '
+                                f'or a free local port without remote agents)')
+    coordinator.add_argument('--base-url', default=None, help="Target URL (default: the script's BASE_URL)")
+    coordinator.add_argument('--users-file', default=USERS_FILE, help=f'Users to shard (default: {USERS_FILE})')
+    coordinator.add_argument('--questions-file', default=QUESTIONS_FILE,
+                           help=f'Questions to shard (default: {QUESTIONS_FILE})')
+    load_engine.add_arguments(coordinator)
+
+    agent = commands.add_parser('agent', help='Run the shard handed out by a coordinator')
+    agent.add_argument('--coordinator', required=True, help='Coordinator HOST:PORT')
+    agent.add_argument('--name', default=f"{socket.gethostname()}-{os.getpid()}", help='Name shown in reports')
+
+    args = parser.parse_args()
+    authkey = args.authkey.encode()
+    if args.command == 'agent':
+        run_agent(parse_address(args.coordinator), authkey, args.name)
+        return
+    if args.agents + args.local_agents < 1:
+        parser.error("give --agents and/or --local-agents")
+    run_coordinator(args, authkey)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,608 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import time
+from multiprocessing.connection import Connection, wait
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from async_http import DEFAULT_IDLE_TIMEOUT, ConnectionStats, HttpClient
+from latency_histogram import LatencyHistogram
+from live_metrics import DEFAULT_INTERVAL, LiveMetrics
+import profiling_hooks
+from profiling_hooks import ProfileCapture
+from rate_profile import PROFILE_HELP, RateProfile
+from results_log import ResultsLog
+
+# Configuration
+DEFAULT_VUS = 50
+DEFAULT_ITERATIONS = 10
+MAX_CONNECTIONS = 1000  # default upper bound for pooled connections per host
+STREAM_INTERVAL = 0.5  # seconds between stats deltas sent by worker processes
+DEFAULT_DURATION = 60  # seconds, for --rate without --rate-profile
+LAG_WARNING_MS = 10  # warn when open-loop iterations start this late (p99)
+CPU_WARNING = 0.8  # warn when the load generator keeps this share of its cores busy
+
+
+class RequestStats:
+    """Counters and latencies collected for one request type"""
+
+    def __init__(self):
+        self.successful = 0
+        self.failed = 0
+        self.latency = LatencyHistogram()
+        self.status_codes: Dict[str, int] = {}
+        self.timeline: Dict[int, List[int]] = {}  # unix second -> [successful, failed]
+
+    def add(self, result: Dict[str, Any]):
+        counts = self.timeline.setdefault(int(time.time()), [0, 0])
+        if result["success"]:
+            self.successful += 1
+            counts[0] += 1
+        else:
+            self.failed += 1
+            counts[1] += 1
+        self.latency.record(result["response_time"])
+        code = str(result.get("status_code", "error"))
+        self.status_codes[code] = self.status_codes.get(code, 0) + 1
+
+    def merge(self, other: "RequestStats"):
+        self.successful += other.successful
+        self.failed += other.failed
+        self.latency.merge(other.latency)
+        for code, count in other.status_codes.items():
+            self.status_codes[code] = self.status_codes.get(code, 0) + count
+        for second, (successful, failed) in other.timeline.items():
+            counts = self.timeline.setdefault(second, [0, 0])
+            counts[0] += successful
+            counts[1] += failed
+
+    @property
+    def total(self) -> int:
+        return self.successful + self.failed
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "successful": self.successful,
+            "failed": self.failed,
+            "latency": self.latency.to_dict(),
+            "status_codes": self.status_codes,
+            "timeline": self.timeline_list()
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RequestStats":
+        request_stats = cls()
+        request_stats.successful = data["successful"]
+        request_stats.failed = data["failed"]
+        request_stats.latency = LatencyHistogram.from_dict(data["latency"])
+        request_stats.status_codes = data["status_codes"]
+        request_stats.timeline = {second: [successful, failed] for second, successful, failed in data["timeline"]}
+        return request_stats
+
+    def timeline_list(self) -> List[List[int]]:
+        """[unix second, successful, failed] rows in time order, for results files"""
+        return [[second, successful, failed] for second, (successful, failed) in sorted(self.timeline.items())]
+
+    def average(self) -> float:
+        return self.latency.mean()
+
+    def p95(self) -> float:
+        return self.latency.percentile(95)
+
+
+class Stats:
+    """Per request type statistics of one load test run"""
+
+    def __init__(self):
+        self.requests: Dict[str, RequestStats] = {}
+        self.schedule_lag = LatencyHistogram()  # open-loop: actual minus intended iteration start
+        self.series: Dict[str, Dict[int, float]] = {}  # name -> {unix second: value}, summed across processes
+        self.total_time = 0.0
+        self.cpu_time = 0.0  # seconds of load generator CPU, summed across processes
+        self.transport = ConnectionStats()  # connection reuse, connect time and time to first byte
+
+    def add(self, name: str, result: Dict[str, Any]):
+        self.get(name).add(result)
+
+    def get(self, name: str) -> RequestStats:
+        if name not in self.requests:
+            self.requests[name] = RequestStats()
+        return self.requests[name]
+
+    def merge(self, other: "Stats"):
+        for name, request_stats in other.requests.items():
+            self.get(name).merge(request_stats)
+        self.schedule_lag.merge(other.schedule_lag)
+        self.cpu_time += other.cpu_time
+        self.transport.merge(other.transport)
+        for name, points in other.series.items():
+            series = self.series.setdefault(name, {})
+            for second, value in points.items():
+                series[second] = series.get(second, 0) + value
+
+    def sample(self, name: str, value: float, second: Optional[int] = None):
+        """Store a gauge reading (e.g. queue depth) for the current wall clock second"""
+        self.series.setdefault(name, {})[second if second is not None else int(time.time())] = value
+
+    def drain(self) -> "Stats":
+        """Move everything recorded so far into a new Stats object and start over"""
+        delta = Stats()
+        delta.requests, self.requests = self.requests, {}
+        delta.schedule_lag, self.schedule_lag = self.schedule_lag, LatencyHistogram()
+        delta.series, self.series = self.series, {}
+        delta.transport = self.transport.drain()  # the HTTP client keeps recording into self.transport
+        return delta
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": {name: r.to_dict() for name, r in self.requests.items()},
+            "schedule_lag": self.schedule_lag.to_dict(),
+            "series": self.series,
+            "cpu_time": self.cpu_time,
+            "transport": self.transport.to_dict()
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Stats":
+        stats = cls()
+        stats.requests = {name: RequestStats.from_dict(r) for name, r in data["requests"].items()}
+        stats.schedule_lag = LatencyHistogram.from_dict(data["schedule_lag"])
+        stats.series = {
+            name: {int(second): value for second, value in points.items()}
+            for name, points in data["series"].items()
+        }
+        stats.cpu_time = data.get("cpu_time", 0.0)
+        if "transport" in data:
+            stats.transport = ConnectionStats.from_dict(data["transport"])
+        return stats
+
+    def encode(self) -> bytes:
+        return json.dumps(self.to_dict()).encode()
+
+    @classmethod
+    def decode(cls, payload: bytes) -> "Stats":
+        return cls.from_dict(json.loads(payload))
+
+    @property
+    def total_requests(self) -> int:
+        return sum(r.total for r in self.requests.values())
+
+
+class VirtualUser:
+    """State of one simulated user; handed to every scenario iteration"""
+
+    def __init__(self, vu_id: int, client: HttpClient, data: Dict[str, Any], stats: Stats, shared: Dict[str, Any]):
+        self.id = vu_id
+        self.client = client
+        self.data = data
+        self.stats = stats
+        self.shared = shared  # state shared by all virtual users of this run in this process
+        self.iteration = 0
+        self.intended_start: Optional[float] = None
+
+    def clock(self) -> float:
+        """Start time for a request measurement
+
+        In open-loop mode the first call of an iteration returns the iteration's
+        intended start, so time spent waiting behind a slow server is counted
+        (coordinated omission correction). Otherwise this is time.perf_counter().
+        A login inside an iteration starts from clock() too, so it takes the
+        intended start and the requests after it are timed from when the session
+        was obtained, without the login.
+        """
+        if self.intended_start is not None:
+            start, self.intended_start = self.intended_start, None
+            return start
+        return time.perf_counter()
+
+    def record(self, name: str, result: Dict[str, Any]):
+        """Record the result of a request made by this virtual user"""
+        self.stats.add(name, result)
+
+    def start_background(self, coroutine: Awaitable[None]) -> asyncio.Future:
+        """Run a task beside the virtual users, e.g. a sampler; it is cancelled when the run ends"""
+        task = asyncio.ensure_future(coroutine)
+        self.shared.setdefault("background", []).append(task)
+        return task
+
+
+class Scenario:
+    """A named user journey; iteration is awaited once per request of a virtual user"""
+
+    def __init__(self, name: str, iteration: Callable[[VirtualUser], Awaitable[None]]):
+        self.name = name
+        self.iteration = iteration
+
+
+async def _run_iteration(scenario: Scenario, vu: VirtualUser):
+    try:
+        await scenario.iteration(vu)
+    except Exception as e:
+        vu.record(scenario.name, {"success": False, "response_time": 0, "error": str(e)})
+    vu.iteration += 1
+    vu.intended_start = None
+
+
+async def _run_virtual_user(scenario: Scenario, vu: VirtualUser, iterations: int):
+    for _ in range(iterations):
+        await _run_iteration(scenario, vu)
+
+
+async def _run_open_loop(scenario: Scenario, users: List[VirtualUser], profile: RateProfile, stats: Stats):
+    """Start iterations on the profile's fixed timeline; at most len(users) are in flight"""
+    idle: asyncio.Queue = asyncio.Queue()
+    for vu in users:
+        idle.put_nowait(vu)
+
+    async def iteration(vu: VirtualUser):
+        try:
+            await _run_iteration(scenario, vu)
+        finally:
+            idle.put_nowait(vu)
+
+    running = set()
+    start_time = time.perf_counter()
+    for offset in profile.arrivals():
+        intended = start_time + offset
+        delay = intended - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        vu = await idle.get()
+        stats.schedule_lag.record((time.perf_counter() - intended) * 1000)
+        vu.intended_start = intended
+        task = asyncio.create_task(iteration(vu))
+        running.add(task)
+        task.add_done_callback(running.discard)
+    if running:
+        await asyncio.wait(running)
+
+
+async def _stream_stats(stats: Stats, stream: Callable[[Stats], None]):
+    while True:
+        await asyncio.sleep(STREAM_INTERVAL)
+        stream(stats.drain())
+
+
+async def run_async(
+    scenario: Scenario,
+    vus: int,
+    iterations: int,
+    base_url: str,
+    data: Optional[Dict[str, Any]] = None,
+    connections: Optional[int] = None,
+    rate_profile: Optional[RateProfile] = None,
+    first_vu: int = 0,
+    stream: Optional[Callable[[Stats], None]] = None,
+    pool: Optional[Dict[str, Any]] = None,
+) -> Stats:
+    """Run vus concurrent virtual users, each performing iterations scenario iterations
+
+    With a rate_profile the run is open-loop instead: iterations start on the
+    profile's arrival timeline and vus only bounds how many run at once.
+    When stream is given, recorded results are periodically drained and passed to it
+    instead of being kept until the end of the run. pool holds further HttpClient
+    options (pool_size per host, pipeline, idle_timeout, max_requests).
+    """
+    stats = Stats()
+    connections = connections or min(vus, MAX_CONNECTIONS)
+    pool = dict(pool or {})
+    client = HttpClient(base_url, pool_size=pool.pop("pool_size", None) or connections,
+                        max_connections=connections, stats=stats.transport, **pool)
+    shared: Dict[str, Any] = {}
+    users = [VirtualUser(first_vu + i, client, data or {}, stats, shared) for i in range(vus)]
+    streamer = asyncio.create_task(_stream_stats(stats, stream)) if stream else None
+
+    start_time = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        if rate_profile:
+            await _run_open_loop(scenario, users, rate_profile, stats)
+        else:
+            await asyncio.gather(*(_run_virtual_user(scenario, vu, iterations) for vu in users))
+    finally:
+        stats.total_time = time.perf_counter() - start_time
+        stats.cpu_time = time.process_time() - cpu_start
+        if streamer:
+            streamer.cancel()
+        for task in shared.get("background", []):
+            task.cancel()
+        await client.close()
+    return stats
+
+
+def _process_main(conn: Connection, scenario: Scenario, vus: int, iterations: int, base_url: str,
+                  data: Optional[Dict[str, Any]], options: Dict[str, Any], first_vu: int):
+    stream = lambda delta: conn.send_bytes(delta.encode())
+    stats = asyncio.run(run_async(scenario, vus, iterations, base_url, data, first_vu=first_vu, stream=stream,
+                                  **options))
+    conn.send_bytes(stats.encode())
+    conn.send_bytes(b"")
+    conn.close()
+
+
+def _run_processes(
+    scenario: Scenario,
+    vus: int,
+    iterations: int,
+    base_url: str,
+    data: Optional[Dict[str, Any]],
+    processes: int,
+    connections: Optional[int] = None,
+    rate_profile: Optional[RateProfile] = None,
+    observe: Optional[Callable[[Stats], None]] = None,
+    pool: Optional[Dict[str, Any]] = None,
+) -> Stats:
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+    else:
+        context = multiprocessing.get_context()
+
+    stats = Stats()
+    workers = {}
+    first_vu = 0
+    start_time = time.perf_counter()
+    for i in range(processes):
+        share = vus // processes + (1 if i < vus % processes else 0)
+        if share == 0:
+            continue
+        options = {
+            "connections": connections and max(1, connections // processes),
+            "rate_profile": rate_profile and rate_profile.scaled(share / vus),
+            "pool": pool and dict(pool, pool_size=pool.get("pool_size") and max(1, pool["pool_size"] // processes))
+        }
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(
+            target=_process_main,
+            args=(sender, scenario, share, iterations, base_url, data, options, first_vu),
+            daemon=True
+        )
+        process.start()
+        sender.close()
+        workers[receiver] = process
+        first_vu += share
+
+    # Merge deltas as they arrive; an empty message marks the end of a worker
+    while workers:
+        ready = wait(list(workers), timeout=observe and STREAM_INTERVAL)
+        for conn in ready:
+            try:
+                payload = conn.recv_bytes()
+            except EOFError:
+                print(f"Warning: load worker process {workers[conn].pid} exited unexpectedly")
+                payload = b""
+            if payload:
+                delta = Stats.decode(payload)
+                stats.merge(delta)
+                if observe:
+                    observe(delta)
+                continue
+            workers.pop(conn).join()
+            conn.close()
+        if observe and not ready:
+            observe(Stats())  # lets interval based observers close their windows
+
+    stats.total_time = time.perf_counter() - start_time
+    return stats
+
+
+def run(
+    scenario: Scenario,
+    vus: int,
+    iterations: int,
+    base_url: str,
+    data: Optional[Dict[str, Any]] = None,
+    connections: Optional[int] = None,
+    processes: int = 1,
+    rate_profile: Optional[RateProfile] = None,
+    live: Optional[LiveMetrics] = None,
+    results_log: Optional[ResultsLog] = None,
+    observers: Optional[List[Any]] = None,
+    profiler: Optional[ProfileCapture] = None,
+    pool: Optional[Dict[str, Any]] = None,
+) -> Stats:
+    """Blocking entry point; with processes > 1 virtual users are split across worker processes
+
+    With live, results are also reported per interval while the run is in progress;
+    with results_log they are appended to a record file as they arrive; with profiler
+    server profiles are captured at its offsets into the run. Any other observers get
+    every batch of results through their observe(delta) method. connections bounds
+    the open connections in total, pool holds the other connection pool settings
+    (see run_async).
+    """
+    if rate_profile:
+        print(f"Open-loop arrivals: {rate_profile.describe()} "
+              f"({rate_profile.total_arrivals} iterations, at most {vus} in flight)")
+    observers = [observer for observer in (live, results_log, profiler) if observer] + (observers or [])
+
+    def observe(delta: Stats):
+        for observer in observers:
+            observer.observe(delta)
+        if live:
+            live.maybe_tick()
+
+    if live:
+        live.start()
+    if results_log:
+        results_log.start({
+            "scenario": scenario.name, "vus": vus, "iterations": iterations, "base_url": base_url,
+            "processes": processes, "rate_profile": rate_profile and rate_profile.describe()
+        })
+    if profiler:
+        profiler.start()
+    stats = None
+    try:
+        if processes > 1:
+            stats = _run_processes(scenario, vus, iterations, base_url, data, processes, connections, rate_profile,
+                                   observe if observers else None, pool)
+        elif observers:
+            collected = Stats()
+
+            def collect(delta: Stats):
+                collected.merge(delta)
+                observe(delta)
+
+            rest = asyncio.run(run_async(scenario, vus, iterations, base_url, data, connections, rate_profile,
+                                         stream=collect, pool=pool))
+            collect(rest)
+            collected.total_time = rest.total_time
+            stats = collected
+        else:
+            stats = asyncio.run(run_async(scenario, vus, iterations, base_url, data, connections, rate_profile,
+                                          pool=pool))
+    finally:
+        if live:
+            live.close()
+        if results_log:
+            results_log.close(stats and stats.total_time)
+        if profiler:
+            profiler.close()
+    if rate_profile:
+        print(f"Iteration start lag behind schedule: {format_percentiles(stats.schedule_lag)}")
+        if stats.schedule_lag.percentile(99) > LAG_WARNING_MS:
+            print("Warning: iterations started late; raise --vus or --processes so the generator keeps up "
+                  "(latencies are still measured from the intended start)")
+    print_client_cpu(stats, max(1, min(processes, vus)))
+    return stats
+
+
+def print_client_cpu(stats: Stats, processes: int):
+    """Report the load generator's own CPU cost, to tell whether it limited the measurement"""
+    if not stats.total_requests or not stats.total_time:
+        return
+    busy = stats.cpu_time / (stats.total_time * processes)
+    print(f"Load generator CPU: {stats.cpu_time / stats.total_requests * 1000:.3f} ms per request, "
+          f"{busy:.0%} of {processes} core{'s' if processes > 1 else ''} busy")
+    if busy > CPU_WARNING:
+        print("Warning: the load generator is close to CPU bound, so latencies include client overhead; "
+              "raise --processes")
+
+
+def report(stats: Stats) -> Dict[str, Any]:
+    """JSON friendly summary of every request type, for results files"""
+    return {
+        name: {
+            "successful": r.successful,
+            "failed": r.failed,
+            "requests_per_second": r.total / stats.total_time if stats.total_time else 0,
+            "latency_percentiles": r.latency.summary(),
+            "latency_histogram": r.latency.to_dict(),
+            "status_codes": r.status_codes,
+            "timeline": r.timeline_list()
+        }
+        for name, r in stats.requests.items()
+    }
+
+
+def transport_report(stats: Stats) -> Dict[str, Any]:
+    """JSON friendly summary of the connection pool, for results files"""
+    transport = stats.transport
+    return {
+        "requests": transport.requests,
+        "reuse_rate": transport.reuse_rate,
+        "connections_opened": transport.opened,
+        "pipelined": transport.pipelined,
+        "expired": transport.expired,
+        "evicted": transport.evicted,
+        "connect_percentiles": transport.connect.summary(),
+        "ttfb_percentiles": transport.ttfb.summary()
+    }
+
+
+def print_report(stats: Stats):
+    """Print one block per request type, then the connection pool's own numbers"""
+    for name, r in stats.requests.items():
+        print(f"\n{name}:")
+        print(f"  Successful: {r.successful}")
+        print(f"  Failed: {r.failed}")
+        print(f"  Average response time: {r.average():.2f} ms")
+        print(f"  Latency percentiles: {format_percentiles(r.latency)}")
+        print(f"  Status codes: {', '.join(f'{code}={count}' for code, count in sorted(r.status_codes.items()))}")
+    print_transport(stats)
+
+
+def print_transport(stats: Stats):
+    """Connection reuse, connect time and time to first byte, apart from the request latencies"""
+    transport = stats.transport
+    if transport.requests:
+        print("\nConnections:")
+        print(f"  {transport.opened} opened for {transport.requests} requests, reuse rate {transport.reuse_rate:.1%}"
+              + (f", {transport.pipelined} pipelined" if transport.pipelined else "")
+              + (f", {transport.expired} closed idle" if transport.expired else ""))
+        if transport.connect.total_count:
+            print(f"  Connect time: {format_percentiles(transport.connect)}")
+        print(f"  Time to first byte: {format_percentiles(transport.ttfb)}")
+
+
+def format_percentiles(histogram: LatencyHistogram) -> str:
+    """One line rendering of the reported latency percentiles"""
+    summary = histogram.summary()
+    keys = [key for key in summary if key.startswith("p")] + ["max"]
+    return " | ".join(f"{key} {summary[key]:.2f} ms" for key in keys)
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """Add the engine options shared by every load test script"""
+    parser.add_argument('--vus', '--threads', dest='vus', type=int, default=DEFAULT_VUS,
+                      help=f'Number of concurrent virtual users; --threads is kept for compatibility (default: {DEFAULT_VUS})')
+    parser.add_argument('--iterations', '--requests', dest='iterations', type=int, default=DEFAULT_ITERATIONS,
+                      help=f'Number of iterations per virtual user; --requests is kept for compatibility (default: {DEFAULT_ITERATIONS})')
+    parser.add_argument('--connections', type=int, default=None,
+                      help=f'Max open keep-alive connections in total (default: number of virtual users, at most {MAX_CONNECTIONS})')
+    parser.add_argument('--connections-per-host', type=int, default=None,
+                      help='Max open connections to one host (default: --connections)')
+    parser.add_argument('--pipeline', type=int, default=1,
+                      help='Requests written to a connection before reading responses, once every connection '
+                           'is busy (HTTP/1.1 pipelining; default: 1, off)')
+    parser.add_argument('--idle-timeout', type=float, default=DEFAULT_IDLE_TIMEOUT,
+                      help=f'Close pooled connections idle for this many seconds (default: {DEFAULT_IDLE_TIMEOUT})')
+    parser.add_argument('--max-requests-per-connection', type=int, default=None,
+                      help='Close a connection after this many requests (default: no limit)')
+    parser.add_argument('--processes', type=int, default=1,
+                      help='Number of load generator processes to split virtual users across (default: 1)')
+    parser.add_argument('--rate', type=float, default=None,
+                      help='Open-loop mode: start this many iterations per second, --vus caps how many run at once')
+    parser.add_argument('--duration', type=float, default=DEFAULT_DURATION,
+                      help=f'Seconds to run at --rate (default: {DEFAULT_DURATION})')
+    parser.add_argument('--rate-profile', default=None,
+                      help=PROFILE_HELP.replace("%", "%%"))
+    parser.add_argument('--live', nargs='?', type=float, const=DEFAULT_INTERVAL, default=None, metavar='SECONDS',
+                      help=f'Print throughput, latency and status codes every SECONDS while running (default: {DEFAULT_INTERVAL:g})')
+    parser.add_argument('--live-file', default=None,
+                      help='Append the live windows to this NDJSON file (implies --live)')
+    parser.add_argument('--prometheus-port', type=int, default=None,
+                      help='Serve the live metrics at http://0.0.0.0:PORT/metrics (implies --live)')
+    parser.add_argument('--results-log', default=None,
+                      help='Append results to this record file while running; read it back with results_log.py')
+    profiling_hooks.add_arguments(parser)
+
+
+def make_rate_profile(spec: Optional[str], rate: Optional[float], duration: float) -> Optional[RateProfile]:
+    """Open-loop profile of --rate-profile, or of --rate for --duration; None when closed-loop"""
+    if spec:
+        return RateProfile.parse(spec)
+    if rate:
+        return RateProfile.constant(rate, duration)
+    return None
+
+
+def options(args: argparse.Namespace) -> Dict[str, Any]:
+    """Engine keyword arguments taken from parsed command line arguments"""
+    rate_profile = make_rate_profile(args.rate_profile, args.rate, args.duration)
+    live = None
+    if args.live or args.live_file or args.prometheus_port:
+        live = LiveMetrics(args.live or DEFAULT_INTERVAL, args.live_file, args.prometheus_port)
+    return {
+        "connections": args.connections,
+        "processes": args.processes,
+        "rate_profile": rate_profile,
+        "live": live,
+        "results_log": ResultsLog(args.results_log) if args.results_log else None,
+        "profiler": profiling_hooks.from_args(args, rate_profile),
+        "pool": {
+            "pool_size": args.connections_per_host,
+            "pipeline": args.pipeline,
+            "idle_timeout": args.idle_timeout,
+            "max_requests": args.max_requests_per_connection
+        }
+    }
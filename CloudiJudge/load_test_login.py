@@ -1,26 +1,19 @@
-import requests
-import threading
 import time
 import random
 import json
 from datetime import datetime
-import statistics
-import queue
 import argparse
 from typing import List, Dict, Any
 
+import load_engine
+from load_engine import Scenario, VirtualUser
+from payload_pool import Payload, PayloadPool
+
 # Configuration
 BASE_URL = "http://localhost:8000"
 LOGIN_ENDPOINT = f"{BASE_URL}/api/auth/login"
 USERS_FILE = "test_users.json"
 
-# Global variables for statistics
-successful_logins = 0
-failed_logins = 0
-response_times = []
-lock = threading.Lock()
-results_queue = queue.Queue()
-
 def load_test_users() -> List[Dict[str, str]]:
     """Load test users from JSON file"""
     try:
@@ -30,19 +23,16 @@ def load_test_users() -> List[Dict[str, str]]:
         print(f"Error: {USERS_FILE} not found. Please run create_test_users.py first.")
         exit(1)
 
-def login_user(user: Dict[str, str]) -> Dict[str, Any]:
-    """Attempt to login a single user"""
-    start_time = time.time()
+async def login_user(vu: VirtualUser, user: Dict[str, str], credentials: Payload) -> Dict[str, Any]:
+    """Attempt to login a single user with its pre-encoded credentials"""
+    start_time = vu.clock()
     try:
-        response = requests.post(
+        response = await vu.client.post(
             LOGIN_ENDPOINT,
-            json={
-                "email": user["email"],
-                "password": user["password"]
-            },
-            timeout=10
+            body=credentials.body,
+            content_type=credentials.content_type
         )
-        end_time = time.time()
+        end_time = time.perf_counter()
         response_time = (end_time - start_time) * 1000  # Convert to milliseconds
         
         result = {
@@ -57,7 +47,7 @@ def login_user(user: Dict[str, str]) -> Dict[str, Any]:
         
         return result
     except Exception as e:
-        end_time = time.time()
+        end_time = time.perf_counter()
         return {
             "success": False,
             "response_time": (end_time - start_time) * 1000,
@@ -65,55 +55,39 @@ def login_user(user: Dict[str, str]) -> Dict[str, Any]:
             "user": user["email"]
         }
 
-def worker(users: List[Dict[str, str]], num_requests: int):
-    """Worker thread function to perform login attempts"""
-    for _ in range(num_requests):
-        user = random.choice(users)
-        result = login_user(user)
-        results_queue.put(result)
+async def worker(vu: VirtualUser):
+    """Virtual user iteration: perform one login attempt"""
+    users = vu.data["users"]
+    index = random.randrange(len(users))
+    result = await login_user(vu, users[index], vu.data["credentials"][index])
+    vu.record("login", result)
 
-def run_load_test(num_threads: int, requests_per_thread: int, users: List[Dict[str, str]]):
-    """Run the load test with specified number of threads"""
-    global successful_logins, failed_logins, response_times
-    
-    print(f"\nStarting load test with {num_threads} threads, {requests_per_thread} requests per thread")
+SCENARIO = Scenario("login", worker)
+
+def scenario_data(users: List[Dict[str, str]]) -> Dict[str, Any]:
+    """Data for SCENARIO; login bodies are encoded once, in the same order as users"""
+    credentials = PayloadPool.json({"email": user["email"], "password": user["password"]} for user in users)
+    return {"users": users, "credentials": credentials}
+
+def run_load_test(num_threads: int, requests_per_thread: int, users: List[Dict[str, str]], **options):
+    """Run the load test with the specified number of virtual users"""
+    print(f"\nStarting load test with {num_threads} virtual users, {requests_per_thread} requests per user")
     print(f"Total requests: {num_threads * requests_per_thread}")
     print(f"Test users available: {len(users)}")
     
-    threads = []
-    start_time = time.time()
-    
-    # Create and start threads
-    for _ in range(num_threads):
-        thread = threading.Thread(
-            target=worker,
-            args=(users, requests_per_thread)
-        )
-        threads.append(thread)
-        thread.start()
-    
-    # Wait for all threads to complete
-    for thread in threads:
-        thread.join()
-    
-    end_time = time.time()
-    total_time = end_time - start_time
-    
-    # Process results
-    while not results_queue.empty():
-        result = results_queue.get()
-        with lock:
-            if result["success"]:
-                successful_logins += 1
-            else:
-                failed_logins += 1
-            response_times.append(result["response_time"])
+    stats = load_engine.run(SCENARIO, num_threads, requests_per_thread, BASE_URL,
+                            data=scenario_data(users), **options)
+    logins = stats.get("login")
+    total_time = stats.total_time
+    successful_logins = logins.successful
+    failed_logins = logins.failed
+    latency = logins.latency
     
     # Calculate statistics
     total_requests = successful_logins + failed_logins
     requests_per_second = total_requests / total_time
-    avg_response_time = statistics.mean(response_times) if response_times else 0
-    p95_response_time = statistics.quantiles(response_times, n=20)[18] if len(response_times) >= 20 else 0
+    avg_response_time = logins.average()
+    p95_response_time = logins.p95()
     
     # Print results
     print("\nLoad Test Results:")
@@ -124,6 +98,9 @@ def run_load_test(num_threads: int, requests_per_thread: int, users: List[Dict[s
     print(f"Requests per second: {requests_per_second:.2f}")
     print(f"Average response time: {avg_response_time:.2f} ms")
     print(f"95th percentile response time: {p95_response_time:.2f} ms")
+    print(f"Latency percentiles: {load_engine.format_percentiles(latency)}")
+    
+    load_engine.print_transport(stats)
     
     # Save results to file
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -133,12 +110,15 @@ def run_load_test(num_threads: int, requests_per_thread: int, users: List[Dict[s
         "timestamp": datetime.now().isoformat(),
         "total_time": total_time,
         "total_requests": total_requests,
+        "transport": load_engine.transport_report(stats),
         "successful_logins": successful_logins,
         "failed_logins": failed_logins,
         "requests_per_second": requests_per_second,
         "average_response_time": avg_response_time,
         "p95_response_time": p95_response_time,
-        "response_times": response_times
+        "latency_percentiles": latency.summary(),
+        "latency_histogram": latency.to_dict(),
+        "timeline": logins.timeline_list()
     }
     
     with open(results_file, 'w') as f:
@@ -148,15 +128,12 @@ def run_load_test(num_threads: int, requests_per_thread: int, users: List[Dict[s
 
 def main():
     parser = argparse.ArgumentParser(description='Run login load test')
-    parser.add_argument('--threads', type=int, default=50,
-                      help='Number of concurrent threads (default: 50)')
-    parser.add_argument('--requests', type=int, default=10,
-                      help='Number of requests per thread (default: 10)')
+    load_engine.add_arguments(parser)
     
     args = parser.parse_args()
     
     users = load_test_users()
-    run_load_test(args.threads, args.requests, users)
+    run_load_test(args.vus, args.iterations, users, **load_engine.options(args))
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
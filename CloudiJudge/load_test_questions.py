@@ -1,26 +1,39 @@
-import requests
-import threading
 import time
 import random
 import json
 from datetime import datetime
-import statistics
-import queue
 import argparse
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+
+import load_engine
+from load_engine import Scenario, VirtualUser
+from payload_pool import DEFAULT_PAYLOADS, Payload, PayloadPool
+from session_cache import Session, SessionCache, is_logged_out
 
 # Configuration
 BASE_URL = "http://localhost:8000"
 LOGIN_ENDPOINT = f"{BASE_URL}/api/auth/login"
 SUBMIT_QUESTION_ENDPOINT = f"{BASE_URL}/api/questions/submit"
 USERS_FILE = "test_users.json"
+QUESTION_POOL_SIZE = DEFAULT_PAYLOADS  # questions encoded before the test starts
+
+# Sample question templates
+QUESTION_TEMPLATES = [
+    "What is the time complexity of {algorithm}?",
+    "Explain how {concept} works in {language}.",
+    "What are the main differences between {tech1} and {tech2}?",
+    "How would you implement {feature} in {language}?",
+    "What are the best practices for {topic} in {context}?"
+]
 
-# Global variables for statistics
-successful_submissions = 0
-failed_submissions = 0
-response_times = []
-lock = threading.Lock()
-results_queue = queue.Queue()
+# Sample fillers for templates
+ALGORITHMS = ["quicksort", "mergesort", "binary search", "Dijkstra's algorithm", "BFS", "DFS"]
+CONCEPTS = ["inheritance", "polymorphism", "recursion", "closures", "async/await", "promises"]
+LANGUAGES = ["Python", "JavaScript", "Java", "C++", "Go", "Rust"]
+TECHNOLOGIES = ["REST", "GraphQL", "WebSocket", "gRPC", "RPC", "SOAP"]
+TOPICS = ["error handling", "logging", "testing", "deployment", "security", "performance"]
+CONTEXTS = ["web applications", "microservices", "mobile apps", "desktop apps", "cloud services"]
+FEATURES = ["authentication", "authorization", "caching", "rate limiting", "logging", "monitoring"]
 
 def load_test_users() -> List[Dict[str, str]]:
     """Load test users from JSON file"""
@@ -31,145 +44,134 @@ def load_test_users() -> List[Dict[str, str]]:
         print(f"Error: {USERS_FILE} not found. Please run create_test_users.py first.")
         exit(1)
 
-def login_user(user: Dict[str, str]) -> str:
-    """Login a user and return the token"""
+async def login_user(vu: VirtualUser, user: Dict[str, str]) -> Optional[Session]:
+    """Login a user, record it as a "login" request and return the session"""
+    start_time = vu.clock()
     try:
-        response = requests.post(
+        response = await vu.client.post(
             LOGIN_ENDPOINT,
             json={
                 "email": user["email"],
                 "password": user["password"]
-            },
-            timeout=10
+            }
         )
+        vu.record("login", {
+            "success": response.status_code == 200,
+            "response_time": (time.perf_counter() - start_time) * 1000,
+            "status_code": response.status_code
+        })
         if response.status_code == 200:
-            return response.json().get("token")
+            return Session(token=response.json().get("token"), cookies=response.cookies)
         return None
-    except Exception:
+    except Exception as e:
+        vu.record("login", {
+            "success": False,
+            "response_time": (time.perf_counter() - start_time) * 1000,
+            "error": str(e)
+        })
         return None
 
-def generate_question() -> Dict[str, Any]:
+def generate_question(rng: random.Random) -> Dict[str, Any]:
     """Generate a random question"""
-    # Sample question templates
-    templates = [
-        "What is the time complexity of {algorithm}?",
-        "Explain how {concept} works in {language}.",
-        "What are the main differences between {tech1} and {tech2}?",
-        "How would you implement {feature} in {language}?",
-        "What are the best practices for {topic} in {context}?"
-    ]
-    
-    # Sample fillers
-    algorithms = ["quicksort", "mergesort", "binary search", "Dijkstra's algorithm", "BFS", "DFS"]
-    concepts = ["inheritance", "polymorphism", "recursion", "closures", "async/await", "promises"]
-    languages = ["Python", "JavaScript", "Java", "C++", "Go", "Rust"]
-    technologies = ["REST", "GraphQL", "WebSocket", "gRPC", "RPC", "SOAP"]
-    topics = ["error handling", "logging", "testing", "deployment", "security", "performance"]
-    contexts = ["web applications", "microservices", "mobile apps", "desktop apps", "cloud services"]
-    
-    template = random.choice(templates)
+    template = rng.choice(QUESTION_TEMPLATES)
     question_text = template.format(
-        algorithm=random.choice(algorithms),
-        concept=random.choice(concepts),
-        language=random.choice(languages),
-        tech1=random.choice(technologies),
-        tech2=random.choice(technologies),
-        topic=random.choice(topics),
-        context=random.choice(contexts)
+        algorithm=rng.choice(ALGORITHMS),
+        concept=rng.choice(CONCEPTS),
+        language=rng.choice(LANGUAGES),
+        tech1=rng.choice(TECHNOLOGIES),
+        tech2=rng.choice(TECHNOLOGIES),
+        topic=rng.choice(TOPICS),
+        context=rng.choice(CONTEXTS),
+        feature=rng.choice(FEATURES)
     )
     
     return {
         "text": question_text,
-        "category": random.choice(["algorithms", "system design", "language-specific", "general"]),
-        "difficulty": random.choice(["easy", "medium", "hard"]),
-        "tags": random.sample(["programming", "algorithms", "data-structures", "system-design", "testing"], k=random.randint(1, 3))
+        "category": rng.choice(["algorithms", "system design", "language-specific", "general"]),
+        "difficulty": rng.choice(["easy", "medium", "hard"]),
+        "tags": rng.sample(["programming", "algorithms", "data-structures", "system-design", "testing"], k=rng.randint(1, 3))
     }
 
-def submit_question(token: str, question: Dict[str, Any]) -> Dict[str, Any]:
-    """Submit a question"""
-    start_time = time.time()
+async def submit_question(vu: VirtualUser, session: Session, question: Payload) -> Dict[str, Any]:
+    """Submit a pre-encoded question"""
+    start_time = vu.clock()
     try:
-        headers = {"Authorization": f"Bearer {token}"}
-        response = requests.post(
+        response = await vu.client.post(
             SUBMIT_QUESTION_ENDPOINT,
-            json=question,
-            headers=headers,
-            timeout=10
+            body=question.body,
+            content_type=question.content_type,
+            headers=session.headers()
         )
-        end_time = time.time()
+        end_time = time.perf_counter()
         response_time = (end_time - start_time) * 1000  # Convert to milliseconds
         
         return {
             "success": response.status_code == 201,
             "response_time": response_time,
-            "status_code": response.status_code
+            "status_code": response.status_code,
+            "logged_out": is_logged_out(response)
         }
     except Exception as e:
-        end_time = time.time()
+        end_time = time.perf_counter()
         return {
             "success": False,
             "response_time": (end_time - start_time) * 1000,
             "error": str(e)
         }
 
-def worker(users: List[Dict[str, str]], num_requests: int):
-    """Worker thread function to perform question submission attempts"""
-    for _ in range(num_requests):
-        # Select random user
-        user = random.choice(users)
-        
-        # Login to get token
-        token = login_user(user)
-        if not token:
-            continue
-        
-        # Generate and submit question
-        question = generate_question()
-        result = submit_question(token, question)
-        results_queue.put(result)
+async def worker(vu: VirtualUser):
+    """Virtual user iteration: perform one question submission attempt"""
+    # Select random user
+    user = random.choice(vu.data["users"])
+    
+    # Reuse the cached session; only log in when there is none yet
+    sessions = SessionCache.of(vu, login_user)
+    session = await sessions.get(vu, user)
+    if not session:
+        return
+    
+    # Submit one of the questions generated before the test started
+    question = vu.data["questions"].next()
+    result = await submit_question(vu, session, question)
+    if result.get("logged_out"):
+        # The judge dropped the session: log in again and retry once
+        sessions.invalidate(user, session)
+        session = await sessions.get(vu, user)
+        if session:
+            result = await submit_question(vu, session, question)
+    vu.record("submission", result)
 
-def run_load_test(num_threads: int, requests_per_thread: int, users: List[Dict[str, str]]):
-    """Run the load test with specified number of threads"""
-    global successful_submissions, failed_submissions, response_times
-    
-    print(f"\nStarting load test with {num_threads} threads, {requests_per_thread} requests per thread")
+SCENARIO = Scenario("submission", worker)
+
+def scenario_data(users: List[Dict[str, str]], seed: Optional[int] = None) -> Dict[str, Any]:
+    """Data for SCENARIO; questions are generated and encoded before the test starts"""
+    rng = random.Random(seed)
+    questions = PayloadPool.json(generate_question(rng) for _ in range(QUESTION_POOL_SIZE))
+    return {"users": users, "questions": questions}
+
+def run_load_test(num_threads: int, requests_per_thread: int, users: List[Dict[str, str]], seed: Optional[int] = None,
+                  **options):
+    """Run the load test with the specified number of virtual users"""
+    print(f"\nStarting load test with {num_threads} virtual users, {requests_per_thread} requests per user")
     print(f"Total requests: {num_threads * requests_per_thread}")
     print(f"Test users available: {len(users)}")
     
-    threads = []
-    start_time = time.time()
-    
-    # Create and start threads
-    for _ in range(num_threads):
-        thread = threading.Thread(
-            target=worker,
-            args=(users, requests_per_thread)
-        )
-        threads.append(thread)
-        thread.start()
-    
-    # Wait for all threads to complete
-    for thread in threads:
-        thread.join()
-    
-    end_time = time.time()
-    total_time = end_time - start_time
+    data = scenario_data(users, seed)
+    print(f"Questions generated: {len(data['questions'])} ({data['questions'].nbytes / 1024:.0f} KiB encoded)")
     
-    # Process results
-    while not results_queue.empty():
-        result = results_queue.get()
-        with lock:
-            if result["success"]:
-                successful_submissions += 1
-            else:
-                failed_submissions += 1
-            response_times.append(result["response_time"])
+    stats = load_engine.run(SCENARIO, num_threads, requests_per_thread, BASE_URL, data=data, **options)
+    submissions = stats.get("submission")
+    logins = stats.get("login")
+    total_time = stats.total_time
+    successful_submissions = submissions.successful
+    failed_submissions = submissions.failed
+    latency = submissions.latency
     
     # Calculate statistics
     total_requests = successful_submissions + failed_submissions
     requests_per_second = total_requests / total_time
-    avg_response_time = statistics.mean(response_times) if response_times else 0
-    p95_response_time = statistics.quantiles(response_times, n=20)[18] if len(response_times) >= 20 else 0
+    avg_response_time = submissions.average()
+    p95_response_time = submissions.p95()
     
     # Print results
     print("\nLoad Test Results:")
@@ -179,7 +181,12 @@ def run_load_test(num_threads: int, requests_per_thread: int, users: List[Dict[s
     print(f"Failed submissions: {failed_submissions}")
     print(f"Average response time: {avg_response_time:.2f} ms")
     print(f"95th percentile response time: {p95_response_time:.2f} ms")
+    print(f"Latency percentiles: {load_engine.format_percentiles(latency)}")
     print(f"Requests per second: {requests_per_second:.2f}")
+    print(f"Logins (not included above): {logins.successful} successful, {logins.failed} failed, "
+          f"average {logins.average():.2f} ms")
+    
+    load_engine.print_transport(stats)
     
     # Save results to file
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -189,12 +196,21 @@ def run_load_test(num_threads: int, requests_per_thread: int, users: List[Dict[s
         "timestamp": datetime.now().isoformat(),
         "total_time": total_time,
         "total_requests": total_requests,
+        "transport": load_engine.transport_report(stats),
         "successful_submissions": successful_submissions,
         "failed_submissions": failed_submissions,
         "average_response_time": avg_response_time,
         "p95_response_time": p95_response_time,
-        "response_times": response_times,
-        "requests_per_second": requests_per_second
+        "latency_percentiles": latency.summary(),
+        "latency_histogram": latency.to_dict(),
+        "timeline": submissions.timeline_list(),
+        "requests_per_second": requests_per_second,
+        "logins": {
+            "successful": logins.successful,
+            "failed": logins.failed,
+            "average_response_time": logins.average(),
+            "latency_percentiles": logins.latency.summary()
+        }
     }
     
     with open(results_file, 'w') as f:
@@ -204,15 +220,13 @@ def run_load_test(num_threads: int, requests_per_thread: int, users: List[Dict[s
 
 def main():
     parser = argparse.ArgumentParser(description='Run question submission load test')
-    parser.add_argument('--threads', type=int, default=50,
-                      help='Number of concurrent threads (default: 50)')
-    parser.add_argument('--requests', type=int, default=10,
-                      help='Number of requests per thread (default: 10)')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed for the generated questions')
+    load_engine.add_arguments(parser)
     
     args = parser.parse_args()
     
     users = load_test_users()
-    run_load_test(args.threads, args.requests, users)
+    run_load_test(args.vus, args.iterations, users, args.seed, **load_engine.options(args))
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,60 @@
+import json
+from datetime import datetime
+import argparse
+
+import load_engine
+from scenario_dsl import ScenarioDefinition
+
+# Configuration
+BASE_URL = "http://localhost:80"
+
+def run_load_test(definition: ScenarioDefinition, num_users: int, iterations: int, base_url: str, **options):
+    """Run a declarative scenario and report every step separately"""
+    data = definition.load_data()
+    print(f"\nStarting scenario '{definition.name}' with {num_users} virtual users, {iterations} journeys per user")
+    print("Journeys: " + ", ".join(f"{j.name} (weight {j.weight:g})" for j in definition.journeys))
+    print(f"Test users available: {len(data.get('users', []))}")
+    
+    stats = load_engine.run(definition.scenario(), num_users, iterations, base_url, data=data, **options)
+    
+    # Print results
+    print("\nLoad Test Results:")
+    print(f"Total time: {stats.total_time:.2f} seconds")
+    print(f"Total requests: {stats.total_requests}")
+    print(f"Requests per second: {stats.total_requests / stats.total_time:.2f}")
+    load_engine.print_report(stats)
+    
+    # Save results to file
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    results_file = f"{definition.name}_load_test_results_{timestamp}.json"
+    
+    results = {
+        "timestamp": datetime.now().isoformat(),
+        "scenario": definition.name,
+        "total_time": stats.total_time,
+        "total_requests": stats.total_requests,
+        "requests_per_second": stats.total_requests / stats.total_time,
+        "steps": load_engine.report(stats),
+        "transport": load_engine.transport_report(stats)
+    }
+    
+    with open(results_file, 'w') as f:
+        json.dump(results, f, indent=2)
+    
+    print(f"\nDetailed results saved to {results_file}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a declarative (YAML/JSON) scenario load test')
+    parser.add_argument('scenario', help='Scenario file, e.g. scenarios/contest.yaml')
+    parser.add_argument('--base-url', default=None,
+                      help=f'Judge URL (default: the scenario base_url, else {BASE_URL})')
+    load_engine.add_arguments(parser)
+    
+    args = parser.parse_args()
+    
+    definition = ScenarioDefinition.load(args.scenario)
+    base_url = args.base_url or definition.base_url or BASE_URL
+    run_load_test(definition, args.vus, args.iterations, base_url, **load_engine.options(args))
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,14 @@
-import requests
-import threading
 import time
 import random
 import json
 from datetime import datetime
-import statistics
-import queue
 import argparse
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+
+import load_engine
+from load_engine import Scenario, VirtualUser
+from payload_pool import Payload, PayloadPool
+from session_cache import Session, SessionCache, is_logged_out
 
 # Configuration
 BASE_URL = "http://localhost:8000"
@@ -17,16 +18,6 @@ GET_ANSWER_ENDPOINT = f"{BASE_URL}/api/answers"  # This will need the answer ID
 USERS_FILE = "test_users.json"
 QUESTIONS_FILE = "test_questions.json"
 
-# Global variables for statistics
-successful_submissions = 0
-failed_submissions = 0
-successful_retrievals = 0
-failed_retrievals = 0
-submission_times = []
-retrieval_times = []
-lock = threading.Lock()
-results_queue = queue.Queue()
-
 def load_test_users() -> List[Dict[str, str]]:
     """Load test users from JSON file"""
     try:
@@ -45,45 +36,52 @@ def load_test_questions() -> List[Dict[str, Any]]:
         print(f"Error: {QUESTIONS_FILE} not found. Please create test questions first.")
         exit(1)
 
-def login_user(user: Dict[str, str]) -> str:
-    """Login a user and return the token"""
+async def login_user(vu: VirtualUser, user: Dict[str, str]) -> Optional[Session]:
+    """Login a user, record it as a "login" request and return the session"""
+    start_time = vu.clock()
     try:
-        response = requests.post(
+        response = await vu.client.post(
             LOGIN_ENDPOINT,
             json={
                 "email": user["email"],
                 "password": user["password"]
-            },
-            timeout=10
+            }
         )
+        vu.record("login", {
+            "success": response.status_code == 200,
+            "response_time": (time.perf_counter() - start_time) * 1000,
+            "status_code": response.status_code
+        })
         if response.status_code == 200:
-            return response.json().get("token")
+            return Session(token=response.json().get("token"), cookies=response.cookies)
         return None
-    except Exception:
+    except Exception as e:
+        vu.record("login", {
+            "success": False,
+            "response_time": (time.perf_counter() - start_time) * 1000,
+            "error": str(e)
+        })
         return None
 
-def submit_answer(token: str, question: Dict[str, Any]) -> Dict[str, Any]:
-    """Submit an answer for a question"""
-    start_time = time.time()
+async def submit_answer(vu: VirtualUser, session: Session, answer: Payload) -> Dict[str, Any]:
+    """Submit a pre-encoded answer for a question"""
+    start_time = vu.clock()
     try:
-        headers = {"Authorization": f"Bearer {token}"}
-        response = requests.post(
+        response = await vu.client.post(
             SUBMIT_ANSWER_ENDPOINT,
-            json={
-                "question_id": question["id"],
-                "answer": question["sample_answer"]
-            },
-            headers=headers,
-            timeout=10
+            body=answer.body,
+            content_type=answer.content_type,
+            headers=session.headers()
         )
-        end_time = time.time()
+        end_time = time.perf_counter()
         response_time = (end_time - start_time) * 1000  # Convert to milliseconds
         
         result = {
             "type": "submission",
             "success": response.status_code == 201,
             "response_time": response_time,
-            "status_code": response.status_code
+            "status_code": response.status_code,
+            "logged_out": is_logged_out(response)
         }
         
         if response.status_code == 201:
@@ -91,7 +89,7 @@ def submit_answer(token: str, question: Dict[str, Any]) -> Dict[str, Any]:
         
         return result
     except Exception as e:
-        end_time = time.time()
+        end_time = time.perf_counter()
         return {
             "type": "submission",
             "success": False,
@@ -99,17 +97,15 @@ def submit_answer(token: str, question: Dict[str, Any]) -> Dict[str, Any]:
             "error": str(e)
         }
 
-def get_answer(token: str, answer_id: str) -> Dict[str, Any]:
+async def get_answer(vu: VirtualUser, session: Session, answer_id: str) -> Dict[str, Any]:
     """Retrieve an answer by ID"""
-    start_time = time.time()
+    start_time = vu.clock()
     try:
-        headers = {"Authorization": f"Bearer {token}"}
-        response = requests.get(
+        response = await vu.client.get(
             f"{GET_ANSWER_ENDPOINT}/{answer_id}",
-            headers=headers,
-            timeout=10
+            headers=session.headers()
         )
-        end_time = time.time()
+        end_time = time.perf_counter()
         response_time = (end_time - start_time) * 1000  # Convert to milliseconds
         
         return {
@@ -119,7 +115,7 @@ def get_answer(token: str, answer_id: str) -> Dict[str, Any]:
             "status_code": response.status_code
         }
     except Exception as e:
-        end_time = time.time()
+        end_time = time.perf_counter()
         return {
             "type": "retrieval",
             "success": False,
@@ -127,72 +123,63 @@ def get_answer(token: str, answer_id: str) -> Dict[str, Any]:
             "error": str(e)
         }
 
-def worker(users: List[Dict[str, str]], questions: List[Dict[str, Any]], num_requests: int):
-    """Worker thread function to perform submission and retrieval attempts"""
-    for _ in range(num_requests):
-        # Select random user and question
-        user = random.choice(users)
-        question = random.choice(questions)
-        
-        # Login to get token
-        token = login_user(user)
-        if not token:
-            continue
-        
-        # Submit answer
-        submission_result = submit_answer(token, question)
-        results_queue.put(submission_result)
-        
-        # If submission was successful, try to retrieve the answer
-        if submission_result.get("success") and "answer_id" in submission_result:
-            retrieval_result = get_answer(token, submission_result["answer_id"])
-            results_queue.put(retrieval_result)
-
-def run_load_test(num_threads: int, requests_per_thread: int, users: List[Dict[str, str]], questions: List[Dict[str, Any]]):
-    """Run the load test with specified number of threads"""
-    global successful_submissions, failed_submissions, successful_retrievals, failed_retrievals
-    global submission_times, retrieval_times
+async def worker(vu: VirtualUser):
+    """Virtual user iteration: perform one submission and retrieval attempt"""
+    # Select random user and the answer to a random question
+    user = random.choice(vu.data["users"])
+    answer = vu.data["answers"].choice()
     
-    print(f"\nStarting load test with {num_threads} threads, {requests_per_thread} requests per thread")
+    # Reuse the cached session; only log in when there is none yet
+    sessions = SessionCache.of(vu, login_user)
+    session = await sessions.get(vu, user)
+    if not session:
+        return
+    
+    # Submit answer
+    submission_result = await submit_answer(vu, session, answer)
+    if submission_result.get("logged_out"):
+        # The judge dropped the session: log in again and retry once
+        sessions.invalidate(user, session)
+        session = await sessions.get(vu, user)
+        if not session:
+            vu.record("submission", submission_result)
+            return
+        submission_result = await submit_answer(vu, session, answer)
+    vu.record("submission", submission_result)
+    
+    # If submission was successful, try to retrieve the answer
+    if submission_result.get("success") and "answer_id" in submission_result:
+        retrieval_result = await get_answer(vu, session, submission_result["answer_id"])
+        vu.record("retrieval", retrieval_result)
+
+SCENARIO = Scenario("submission", worker)
+
+def scenario_data(users: List[Dict[str, str]], questions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Data for SCENARIO; answer bodies are encoded once instead of on every iteration"""
+    answers = PayloadPool.json({"question_id": question["id"], "answer": question["sample_answer"]}
+                               for question in questions)
+    return {"users": users, "answers": answers}
+
+def run_load_test(num_threads: int, requests_per_thread: int, users: List[Dict[str, str]], questions: List[Dict[str, Any]],
+                  **options):
+    """Run the load test with the specified number of virtual users"""
+    print(f"\nStarting load test with {num_threads} virtual users, {requests_per_thread} requests per user")
     print(f"Total requests: {num_threads * requests_per_thread}")
     print(f"Test users available: {len(users)}")
     print(f"Test questions available: {len(questions)}")
     
-    threads = []
-    start_time = time.time()
-    
-    # Create and start threads
-    for _ in range(num_threads):
-        thread = threading.Thread(
-            target=worker,
-            args=(users, questions, requests_per_thread)
-        )
-        threads.append(thread)
-        thread.start()
-    
-    # Wait for all threads to complete
-    for thread in threads:
-        thread.join()
-    
-    end_time = time.time()
-    total_time = end_time - start_time
-    
-    # Process results
-    while not results_queue.empty():
-        result = results_queue.get()
-        with lock:
-            if result["type"] == "submission":
-                if result["success"]:
-                    successful_submissions += 1
-                else:
-                    failed_submissions += 1
-                submission_times.append(result["response_time"])
-            else:  # retrieval
-                if result["success"]:
-                    successful_retrievals += 1
-                else:
-                    failed_retrievals += 1
-                retrieval_times.append(result["response_time"])
+    stats = load_engine.run(SCENARIO, num_threads, requests_per_thread, BASE_URL,
+                            data=scenario_data(users, questions), **options)
+    submissions = stats.get("submission")
+    retrievals = stats.get("retrieval")
+    logins = stats.get("login")
+    total_time = stats.total_time
+    successful_submissions = submissions.successful
+    failed_submissions = submissions.failed
+    successful_retrievals = retrievals.successful
+    failed_retrievals = retrievals.failed
+    submission_latency = submissions.latency
+    retrieval_latency = retrievals.latency
     
     # Calculate statistics
     total_submissions = successful_submissions + failed_submissions
@@ -200,11 +187,11 @@ def run_load_test(num_threads: int, requests_per_thread: int, users: List[Dict[s
     total_requests = total_submissions + total_retrievals
     
     requests_per_second = total_requests / total_time
-    avg_submission_time = statistics.mean(submission_times) if submission_times else 0
-    avg_retrieval_time = statistics.mean(retrieval_times) if retrieval_times else 0
+    avg_submission_time = submissions.average()
+    avg_retrieval_time = retrievals.average()
     
-    p95_submission_time = statistics.quantiles(submission_times, n=20)[18] if len(submission_times) >= 20 else 0
-    p95_retrieval_time = statistics.quantiles(retrieval_times, n=20)[18] if len(retrieval_times) >= 20 else 0
+    p95_submission_time = submissions.p95()
+    p95_retrieval_time = retrievals.p95()
     
     # Print results
     print("\nLoad Test Results:")
@@ -215,13 +202,21 @@ def run_load_test(num_threads: int, requests_per_thread: int, users: List[Dict[s
     print(f"  Failed: {failed_submissions}")
     print(f"  Average response time: {avg_submission_time:.2f} ms")
     print(f"  95th percentile response time: {p95_submission_time:.2f} ms")
+    print(f"  Latency percentiles: {load_engine.format_percentiles(submission_latency)}")
     print("\nRetrievals:")
     print(f"  Successful: {successful_retrievals}")
     print(f"  Failed: {failed_retrievals}")
     print(f"  Average response time: {avg_retrieval_time:.2f} ms")
     print(f"  95th percentile response time: {p95_retrieval_time:.2f} ms")
+    print(f"  Latency percentiles: {load_engine.format_percentiles(retrieval_latency)}")
+    print("\nLogins (not included above):")
+    print(f"  Successful: {logins.successful}")
+    print(f"  Failed: {logins.failed}")
+    print(f"  Average response time: {logins.average():.2f} ms")
     print(f"\nOverall requests per second: {requests_per_second:.2f}")
     
+    load_engine.print_transport(stats)
+    
     # Save results to file
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     results_file = f"submission_load_test_results_{timestamp}.json"
@@ -230,19 +225,30 @@ def run_load_test(num_threads: int, requests_per_thread: int, users: List[Dict[s
         "timestamp": datetime.now().isoformat(),
         "total_time": total_time,
         "total_requests": total_requests,
+        "transport": load_engine.transport_report(stats),
         "submissions": {
             "successful": successful_submissions,
             "failed": failed_submissions,
             "average_response_time": avg_submission_time,
             "p95_response_time": p95_submission_time,
-            "response_times": submission_times
+            "latency_percentiles": submission_latency.summary(),
+            "latency_histogram": submission_latency.to_dict(),
+            "timeline": submissions.timeline_list()
         },
         "retrievals": {
             "successful": successful_retrievals,
             "failed": failed_retrievals,
             "average_response_time": avg_retrieval_time,
             "p95_response_time": p95_retrieval_time,
-            "response_times": retrieval_times
+            "latency_percentiles": retrieval_latency.summary(),
+            "latency_histogram": retrieval_latency.to_dict(),
+            "timeline": retrievals.timeline_list()
+        },
+        "logins": {
+            "successful": logins.successful,
+            "failed": logins.failed,
+            "average_response_time": logins.average(),
+            "latency_percentiles": logins.latency.summary()
         },
         "requests_per_second": requests_per_second
     }
@@ -254,16 +260,13 @@ def run_load_test(num_threads: int, requests_per_thread: int, users: List[Dict[s
 
 def main():
     parser = argparse.ArgumentParser(description='Run submission load test')
-    parser.add_argument('--threads', type=int, default=50,
-                      help='Number of concurrent threads (default: 50)')
-    parser.add_argument('--requests', type=int, default=10,
-                      help='Number of requests per thread (default: 10)')
+    load_engine.add_arguments(parser)
     
     args = parser.parse_args()
     
     users = load_test_users()
     questions = load_test_questions()
-    run_load_test(args.threads, args.requests, users, questions)
+    run_load_test(args.vus, args.iterations, users, questions, **load_engine.options(args))
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,232 @@
+import time
+import random
+import re
+import json
+from datetime import datetime
+import argparse
+from itertools import accumulate
+from typing import List, Dict, Any
+
+import load_engine
+from code_corpus import CORPUS_DIR, REJECTED, SIZE_CLASSES, CorpusEntry, MappedCorpus, load_corpus, parse_mix
+from load_engine import Scenario, VirtualUser
+from load_test_verdict import (VerdictTracker, fetch_submissions, load_test_users, login_user, problem_ids,
+                               wait_for_verdict)
+from session_cache import Session, SessionCache, is_logged_out
+
+# Configuration
+BASE_URL = "http://localhost:80"
+DEFAULT_PROGRAMS = "ok=50,wrong_answer=15,compile_error=10,runtime_error=10,tle=10,mle=5"
+DEFAULT_SIZES = "small=85,large=12,pathological=2,oversized=1"
+DOWNLOAD_ENDPOINT = "/user/{user_id}/submissions/dl/{submission_id}"
+SIZE_LIMIT_MESSAGE = "lower than 10Mb"  # shown on the problem page when an upload is too large
+
+SUBMISSIONS_LOCATION = re.compile(r"/user/(\d+)/submissions")
+
+async def upload_code(vu: VirtualUser, session: Session, problem_id: str, entry: CorpusEntry) -> Dict[str, Any]:
+    """Post a corpus program through the problem page's upload form"""
+    start_time = vu.clock()
+    try:
+        response = await vu.client.post(
+            f"/problemset/{problem_id}",
+            body=entry.upload.body,
+            content_type=entry.upload.content_type,
+            headers=session.headers()
+        )
+        end_time = time.perf_counter()
+        location = SUBMISSIONS_LOCATION.search(response.header("Location", ""))
+        if entry.expected == REJECTED:
+            success = response.status_code == 200 and SIZE_LIMIT_MESSAGE in response.text
+        else:
+            success = response.status_code == 302 and location is not None
+        return {
+            "success": success,
+            "response_time": (end_time - start_time) * 1000,
+            "status_code": response.status_code,
+            "logged_out": is_logged_out(response),
+            "user_id": location and location.group(1),
+            "start_time": start_time
+        }
+    except Exception as e:
+        end_time = time.perf_counter()
+        return {
+            "success": False,
+            "response_time": (end_time - start_time) * 1000,
+            "error": str(e),
+            "start_time": start_time
+        }
+
+async def download_code(vu: VirtualUser, session: Session, user_id: str, submission_id: int, entry: CorpusEntry):
+    """Fetch the stored file back from PROBLEM_UPLOAD_FOLDER and check it is what was uploaded"""
+    start_time = time.perf_counter()
+    try:
+        response = await vu.client.get(
+            DOWNLOAD_ENDPOINT.format(user_id=user_id, submission_id=submission_id),
+            headers=session.headers()
+        )
+        vu.record("download", {
+            "success": response.status_code == 200 and entry.source == response.content,
+            "response_time": (time.perf_counter() - start_time) * 1000,
+            "status_code": response.status_code
+        })
+    except Exception as e:
+        vu.record("download", {
+            "success": False,
+            "response_time": (time.perf_counter() - start_time) * 1000,
+            "error": str(e)
+        })
+
+async def worker(vu: VirtualUser):
+    """Virtual user iteration: upload a corpus program, then optionally download it and check its verdict"""
+    users = vu.data["users"]
+    user = users[vu.id % len(users)]  # one account per virtual user keeps submission ids unambiguous
+    sessions = SessionCache.of(vu, login_user)
+    session = await sessions.get(vu, user)
+    if not session:
+        return
+    follow_up = vu.data["download"] or vu.data["verdicts"]
+    tracker = VerdictTracker.of(vu)
+    if follow_up and user["email"] not in tracker.seen:
+        # Submissions that existed before this run are not ours to track
+        tracker.seen[user["email"]] = {submission_id for submission_id, _ in await fetch_submissions(vu, session) or []}
+
+    problems = await problem_ids(vu, session)
+    if not problems:
+        vu.record("upload", {"success": False, "response_time": 0, "error": "no published problems found"})
+        return
+    entry = random.choices(vu.data["entries"], cum_weights=vu.data["cum_weights"])[0]
+    result = await upload_code(vu, session, random.choice(problems), entry)
+    if result.get("logged_out"):
+        sessions.invalidate(user, session)
+    vu.record(f"upload: {entry.size_class}", result)
+    if not result["success"] or entry.expected == REJECTED or not follow_up:
+        return
+
+    submission_id = tracker.claim(user["email"], await fetch_submissions(vu, session) or [])
+    if submission_id is None:
+        vu.record("download", {"success": False, "response_time": 0, "error": "upload not in the submissions list"})
+        return
+    if vu.data["download"]:
+        await download_code(vu, session, result["user_id"], submission_id, entry)
+    if vu.data["verdicts"]:
+        status = await wait_for_verdict(vu, session, user, result["start_time"], submission_id)
+        if status is not None:
+            vu.record("verdict check", {
+                "success": status == entry.expected,
+                "response_time": 0,
+                "status_code": f"{entry.program}: {status}"
+            })
+
+SCENARIO = Scenario("upload", worker)
+
+def run_load_test(num_users: int, iterations: int, users: List[Dict[str, str]], problems: List[str],
+                  corpus: MappedCorpus, weights: Dict[str, float], base_url: str, download: bool, verdicts: bool,
+                  **options):
+    """Run the code upload load test"""
+    print(f"\nStarting upload test with {num_users} virtual users, {iterations} uploads per user")
+    print(f"Corpus: {len(corpus.entries)} uploads, {corpus.nbytes / 1024 / 1024:.1f} MiB memory-mapped")
+
+    entries = [entry for entry in corpus.entries.values() if weights.get(entry.name)]
+    stats = load_engine.run(SCENARIO, num_users, iterations, base_url, data={
+        "users": users,
+        "problems": problems,
+        "entries": entries,
+        "cum_weights": list(accumulate(weights[entry.name] for entry in entries)),
+        "download": download,
+        "verdicts": verdicts
+    }, **options)
+
+    # Uploaded bytes follow from the mix: the average size of each class times its successful uploads
+    total_weight = {}
+    class_bytes = {}
+    for entry in entries:
+        total_weight[entry.size_class] = total_weight.get(entry.size_class, 0) + weights[entry.name]
+        class_bytes[entry.size_class] = class_bytes.get(entry.size_class, 0) + weights[entry.name] * len(entry.upload.body)
+
+    print("\nLoad Test Results:")
+    print(f"Total time: {stats.total_time:.2f} seconds")
+    by_class = {}
+    uploaded = 0
+    for size_class in SIZE_CLASSES:
+        uploads = stats.requests.get(f"upload: {size_class}")
+        if uploads is None:
+            continue
+        average_size = class_bytes[size_class] / total_weight[size_class]
+        uploaded += uploads.successful * average_size
+        by_class[size_class] = {
+            "successful": uploads.successful,
+            "failed": uploads.failed,
+            "average_size": average_size,
+            "latency_percentiles": uploads.latency.summary()
+        }
+        print(f"Uploads ({size_class}, ~{average_size / 1024:.1f} KiB): {uploads.successful} ok, "
+              f"{uploads.failed} failed | {load_engine.format_percentiles(uploads.latency)}")
+    throughput = uploaded / stats.total_time / 1024 / 1024 if stats.total_time else 0
+    print(f"Upload throughput: {throughput:.2f} MiB/s")
+    downloads = stats.requests.get("download")
+    if downloads:
+        print(f"Downloads: {downloads.successful} matched the upload, {downloads.failed} failed or differed | "
+              f"{load_engine.format_percentiles(downloads.latency)}")
+    checks = stats.requests.get("verdict check")
+    if checks:
+        print(f"Verdicts: {checks.successful} as expected, {checks.failed} unexpected")
+        for outcome, count in sorted(checks.status_codes.items()):
+            print(f"  {outcome}: {count}")
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    results_file = f"upload_load_test_results_{timestamp}.json"
+
+    results = {
+        "timestamp": datetime.now().isoformat(),
+        "total_time": stats.total_time,
+        "mix": weights,
+        "uploads": by_class,
+        "upload_throughput_mib_s": throughput,
+        "requests": load_engine.report(stats),
+        "transport": load_engine.transport_report(stats)
+    }
+
+    with open(results_file, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print(f"\nDetailed results saved to {results_file}")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Upload Go programs of known verdict through the problem page form',
+        epilog=f"Size classes: {', '.join(SIZE_CLASSES)}. The corpus verdicts hold for problems whose output "
+               f"doubles every input number, like the ones generate_fixtures.py creates.")
+    parser.add_argument('--base-url', default=BASE_URL,
+                      help=f'Judge URL (default: {BASE_URL})')
+    parser.add_argument('--problems', default=None,
+                      help='Comma separated published problem ids (default: read from /problemset)')
+    parser.add_argument('--corpus', default=CORPUS_DIR, help='Directory of .go programs (default: go_corpus)')
+    parser.add_argument('--programs', default=DEFAULT_PROGRAMS,
+                      help=f'Program weights (default: {DEFAULT_PROGRAMS})')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help=f'Size class weights (default: {DEFAULT_SIZES})')
+    parser.add_argument('--download', action='store_true',
+                      help='Download every accepted upload again and compare it with what was sent')
+    parser.add_argument('--verdicts', action='store_true',
+                      help='Wait for the verdict of every upload and compare it with the expected one')
+    load_engine.add_arguments(parser)
+
+    args = parser.parse_args()
+
+    programs = load_corpus(args.corpus)
+    try:
+        program_weights = parse_mix(args.programs, list(programs))
+        size_weights = parse_mix(args.sizes, list(SIZE_CLASSES))
+    except ValueError as e:
+        parser.error(str(e))
+    corpus = MappedCorpus({name: programs[name] for name in program_weights}, list(size_weights))
+    weights = {f"{program}/{size_class}": program_weight * size_weight
+               for program, program_weight in program_weights.items()
+               for size_class, size_weight in size_weights.items()}
+
+    users = load_test_users()
+    problems = args.problems.split(",") if args.problems else []
+    run_load_test(args.vus, args.iterations, users, problems, corpus, weights, args.base_url, args.download,
+                  args.verdicts, **load_engine.options(args))
+
+if __name__ == "__main__":
+    main()
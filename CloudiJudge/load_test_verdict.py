@@ -0,0 +1,316 @@
+import asyncio
+import time
+import random
+import re
+import json
+from datetime import datetime
+import argparse
+from typing import List, Dict, Any, Optional, Set, Tuple
+
+import load_engine
+from load_engine import Scenario, Stats, VirtualUser
+from payload_pool import Payload, PayloadPool
+from session_cache import Session, SessionCache, is_logged_out
+
+# Configuration
+BASE_URL = "http://localhost:80"
+LOGIN_ENDPOINT = "/login"
+PROBLEMSET_ENDPOINT = "/problemset?limit=100"
+SUBMISSIONS_ENDPOINT = "/user/submissions?limit=20"
+USERS_FILE = "test_users.json"
+WAITING_STATUS = "waiting"
+POLL_INITIAL = 0.1  # seconds before the first status check
+POLL_MAX = 2.0  # adaptive polling backs off up to this interval
+POLL_BACKOFF = 1.5
+VERDICT_TIMEOUT = 300  # seconds
+DEFAULT_SOLUTION = """package main
+
+import "fmt"
+
+func main() {
+	var n int
+	for {
+		if _, err := fmt.Scan(&n); err != nil {
+			return
+		}
+		fmt.Println(2 * n)
+	}
+}
+"""
+
+PROBLEM_PATTERN = re.compile(r'href="/problemset/(\d+)"')
+SUBMISSION_PATTERN = re.compile(r'submission-status[^"]*">\s*([^<]*?)\s*</div>.*?/submissions/dl/(\d+)', re.S)
+
+def load_test_users() -> List[Dict[str, str]]:
+    """Load test users from JSON file"""
+    try:
+        with open(USERS_FILE, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        print(f"Error: {USERS_FILE} not found. Please run create_test_users.py first.")
+        exit(1)
+
+class VerdictTracker:
+    """Submissions of this process that are still waiting for a verdict"""
+
+    def __init__(self, vu: VirtualUser):
+        self.pending = 0  # submissions accepted but without a verdict yet
+        self.seen: Dict[str, Set[int]] = {}  # user email -> submission ids already accounted for
+        self.sampler = vu.start_background(self._sample_queue_depth(vu.stats))
+
+    @classmethod
+    def of(cls, vu: VirtualUser) -> "VerdictTracker":
+        tracker = vu.shared.get("verdicts")
+        if tracker is None:
+            tracker = vu.shared["verdicts"] = cls(vu)
+        return tracker
+
+    async def _sample_queue_depth(self, stats: Stats):
+        while True:
+            await asyncio.sleep(1 - time.time() % 1)
+            stats.sample("pending_verdicts", self.pending)
+
+    def claim(self, email: str, submissions: List[Tuple[int, str]]) -> Optional[int]:
+        """Oldest submission of the user on the page that nobody has claimed yet"""
+        seen = self.seen.setdefault(email, set())
+        new_ids = sorted(submission_id for submission_id, _ in submissions if submission_id not in seen)
+        if not new_ids:
+            return None
+        seen.add(new_ids[0])
+        return new_ids[0]
+
+async def login_user(vu: VirtualUser, user: Dict[str, str]) -> Optional[Session]:
+    """Login a user with the judge's login form, record it and return the session cookie"""
+    start_time = vu.clock()
+    try:
+        response = await vu.client.post(
+            LOGIN_ENDPOINT,
+            data={
+                "email": user["email"],
+                "password": user["password"]
+            }
+        )
+        success = response.status_code == 302 and response.header("Location", "").startswith("/problemset")
+        vu.record("login", {
+            "success": success,
+            "response_time": (time.perf_counter() - start_time) * 1000,
+            "status_code": response.status_code
+        })
+        return Session(cookies=response.cookies) if success else None
+    except Exception as e:
+        vu.record("login", {
+            "success": False,
+            "response_time": (time.perf_counter() - start_time) * 1000,
+            "error": str(e)
+        })
+        return None
+
+async def fetch_submissions(vu: VirtualUser, session: Session) -> Optional[List[Tuple[int, str]]]:
+    """Return (submission id, status) pairs from the newest page of the user's submissions"""
+    start_time = time.perf_counter()
+    try:
+        response = await vu.client.get(SUBMISSIONS_ENDPOINT, headers=session.headers())
+    except Exception as e:
+        vu.record("submissions_page", {
+            "success": False,
+            "response_time": (time.perf_counter() - start_time) * 1000,
+            "error": str(e)
+        })
+        return None
+    vu.record("submissions_page", {
+        "success": response.status_code == 200,
+        "response_time": (time.perf_counter() - start_time) * 1000,
+        "status_code": response.status_code
+    })
+    if response.status_code != 200:
+        return None
+    return [(int(submission_id), status) for status, submission_id in SUBMISSION_PATTERN.findall(response.text)]
+
+async def problem_ids(vu: VirtualUser, session: Session) -> List[str]:
+    """Published problem ids, given on the command line or read from the problemset page until it lists some"""
+    if vu.data.get("problems"):
+        return vu.data["problems"]
+    if not vu.shared.get("problem_ids"):
+        response = await vu.client.get(PROBLEMSET_ENDPOINT, headers=session.headers())
+        vu.shared["problem_ids"] = sorted(set(PROBLEM_PATTERN.findall(response.text)))
+    return vu.shared["problem_ids"]
+
+async def submit_code(vu: VirtualUser, session: Session, problem_id: str, upload: Payload) -> Dict[str, Any]:
+    """Upload a solution the way the problem page form does"""
+    start_time = vu.clock()
+    try:
+        response = await vu.client.post(
+            f"/problemset/{problem_id}",
+            body=upload.body,
+            content_type=upload.content_type,
+            headers=session.headers()
+        )
+        end_time = time.perf_counter()
+        location = response.header("Location", "")
+        return {
+            "success": response.status_code == 302 and "/submissions" in location,
+            "response_time": (end_time - start_time) * 1000,
+            "status_code": response.status_code,
+            "logged_out": is_logged_out(response),
+            "start_time": start_time
+        }
+    except Exception as e:
+        end_time = time.perf_counter()
+        return {
+            "success": False,
+            "response_time": (end_time - start_time) * 1000,
+            "error": str(e),
+            "start_time": start_time
+        }
+
+async def wait_for_verdict(vu: VirtualUser, session: Session, user: Dict[str, str], start_time: float,
+                           submission_id: Optional[int] = None) -> Optional[str]:
+    """Poll the submissions page with growing intervals until our submission has a verdict, and return it"""
+    tracker = VerdictTracker.of(vu)
+    interval = POLL_INITIAL
+    deadline = start_time + VERDICT_TIMEOUT
+    tracker.pending += 1
+    try:
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(interval)
+            submissions = await fetch_submissions(vu, session)
+            interval = min(interval * POLL_BACKOFF, POLL_MAX)
+            if submissions is None:
+                continue
+            if submission_id is None:
+                submission_id = tracker.claim(user["email"], submissions)
+                if submission_id is None:
+                    continue
+            status = dict(submissions).get(submission_id)
+            if status is None or status == WAITING_STATUS:
+                continue
+            verdict_time = (time.perf_counter() - start_time) * 1000
+            vu.record("verdict", {"success": True, "response_time": verdict_time})
+            vu.record(f"verdict: {status}", {"success": True, "response_time": verdict_time})
+            return status
+        vu.record("verdict", {
+            "success": False,
+            "response_time": (time.perf_counter() - start_time) * 1000,
+            "error": f"no verdict within {VERDICT_TIMEOUT} seconds"
+        })
+        return None
+    finally:
+        tracker.pending -= 1
+
+async def worker(vu: VirtualUser):
+    """Virtual user iteration: submit a solution and wait until the judge shows its verdict"""
+    users = vu.data["users"]
+    user = users[vu.id % len(users)]  # one account per virtual user keeps submission ids unambiguous
+    sessions = SessionCache.of(vu, login_user)
+    session = await sessions.get(vu, user)
+    if not session:
+        return
+    tracker = VerdictTracker.of(vu)
+    if user["email"] not in tracker.seen:
+        # Submissions that existed before this run are not ours to track
+        tracker.seen[user["email"]] = {submission_id for submission_id, _ in await fetch_submissions(vu, session) or []}
+
+    problems = await problem_ids(vu, session)
+    if not problems:
+        vu.record("submit", {"success": False, "response_time": 0, "error": "no published problems found"})
+        return
+    result = await submit_code(vu, session, random.choice(problems), vu.data["upload"])
+    if result.get("logged_out"):
+        sessions.invalidate(user, session)
+    vu.record("submit", result)
+    if result["success"]:
+        await wait_for_verdict(vu, session, user, result["start_time"])
+
+SCENARIO = Scenario("verdict", worker)
+
+def scenario_data(users: List[Dict[str, str]], problems: Optional[List[str]] = None,
+                  solution: bytes = DEFAULT_SOLUTION.encode()) -> Dict[str, Any]:
+    """Data for SCENARIO; the multipart upload is the same for every submission, so it is encoded once"""
+    upload = PayloadPool.multipart([({}, {"submit_file": ("main.go", solution, "text/x-go")})])[0]
+    return {"users": users, "problems": problems or [], "upload": upload}
+
+def run_load_test(num_users: int, iterations: int, users: List[Dict[str, str]], problems: List[str], solution: bytes,
+                  base_url: str, **options):
+    """Run the end-to-end verdict latency test"""
+    print(f"\nStarting verdict test with {num_users} virtual users, {iterations} submissions per user")
+    print(f"Test users available: {len(users)}")
+    if num_users > len(users):
+        print("Warning: virtual users share accounts; verdicts may be attributed to the wrong submission")
+
+    stats = load_engine.run(SCENARIO, num_users, iterations, base_url,
+                            data=scenario_data(users, problems, solution), **options)
+    submits = stats.get("submit")
+    verdicts = stats.get("verdict")
+    pending = sorted(stats.series.get("pending_verdicts", {}).items())
+
+    # Print results
+    print("\nLoad Test Results:")
+    print(f"Total time: {stats.total_time:.2f} seconds")
+    print(f"Submissions: {submits.successful} accepted by the judge, {submits.failed} failed")
+    print(f"Submit response time: {load_engine.format_percentiles(submits.latency)}")
+    print(f"\nVerdicts received: {verdicts.successful} (timed out: {verdicts.failed})")
+    print(f"Verdict latency: {load_engine.format_percentiles(verdicts.latency)}")
+    print(f"  (upper bound: polling backs off to one check every {POLL_MAX:g} s)")
+    print("\nPer verdict:")
+    breakdown = {}
+    for name, request_stats in sorted(stats.requests.items()):
+        if name.startswith("verdict: "):
+            verdict = name[len("verdict: "):]
+            breakdown[verdict] = request_stats.latency.summary()
+            print(f"  {verdict}: {request_stats.successful} | {load_engine.format_percentiles(request_stats.latency)}")
+    if pending:
+        print(f"\nPending verdicts (client side queue depth): peak {max(v for _, v in pending):g}, "
+              f"final {pending[-1][1]:g}")
+
+    # Save results to file
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    results_file = f"verdict_load_test_results_{timestamp}.json"
+
+    results = {
+        "timestamp": datetime.now().isoformat(),
+        "total_time": stats.total_time,
+        "submissions": {
+            "successful": submits.successful,
+            "failed": submits.failed,
+            "latency_percentiles": submits.latency.summary()
+        },
+        "verdicts": {
+            "received": verdicts.successful,
+            "timed_out": verdicts.failed,
+            "latency_percentiles": verdicts.latency.summary(),
+            "latency_histogram": verdicts.latency.to_dict(),
+            "timeline": verdicts.timeline_list(),
+            "by_verdict": breakdown
+        },
+        "pending_verdicts": [[second, value] for second, value in pending],
+        "requests": load_engine.report(stats),
+        "transport": load_engine.transport_report(stats)
+    }
+
+    with open(results_file, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print(f"\nDetailed results saved to {results_file}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure time from code submission until its verdict is visible')
+    parser.add_argument('--base-url', default=BASE_URL,
+                      help=f'Judge URL (default: {BASE_URL})')
+    parser.add_argument('--problems', default=None,
+                      help='Comma separated published problem ids (default: read from /problemset)')
+    parser.add_argument('--solution', default=None,
+                      help='Go file to submit (default: a program that doubles every input number)')
+    load_engine.add_arguments(parser)
+
+    args = parser.parse_args()
+
+    users = load_test_users()
+    problems = args.problems.split(",") if args.problems else []
+    solution = DEFAULT_SOLUTION.encode()
+    if args.solution:
+        with open(args.solution, 'rb') as f:
+            solution = f.read()
+    run_load_test(args.vus, args.iterations, users, problems, solution, args.base_url, **load_engine.options(args))
+
+if __name__ == "__main__":
+    main()
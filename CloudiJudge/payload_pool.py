@@ -0,0 +1,78 @@
+import json
+import random
+from typing import Any, Dict, Iterable, List, Tuple, Union
+from urllib.parse import urlencode
+
+from async_http import encode_multipart
+
+# Configuration
+DEFAULT_PAYLOADS = 1024  # distinct bodies generated for a pool
+
+
+class Payload:
+    """A request body encoded once; body is a view into its pool's buffer"""
+
+    __slots__ = ("body", "content_type")
+
+    def __init__(self, body: memoryview, content_type: str):
+        self.body = body
+        self.content_type = content_type
+
+
+class PayloadPool:
+    """Request bodies generated and encoded at startup, so an iteration only picks one
+
+    All bodies share one bytes buffer and are handed out as memoryview slices, which
+    the HTTP client writes to the socket as they are; nothing is formatted, encoded
+    or copied while the test runs. Pools are built before worker processes fork, so
+    every process shares the same pages.
+    """
+
+    def __init__(self, bodies: List[bytes], content_types: Union[str, List[str]]):
+        self.buffer = b"".join(bodies)
+        if isinstance(content_types, str):
+            content_types = [content_types] * len(bodies)
+        view = memoryview(self.buffer)
+        self.payloads: List[Payload] = []
+        offset = 0
+        for body, content_type in zip(bodies, content_types):
+            self.payloads.append(Payload(view[offset:offset + len(body)], content_type))
+            offset += len(body)
+        self.position = 0
+
+    @classmethod
+    def json(cls, values: Iterable[Any]) -> "PayloadPool":
+        return cls([json.dumps(value).encode() for value in values], "application/json")
+
+    @classmethod
+    def form(cls, values: Iterable[Dict[str, Any]]) -> "PayloadPool":
+        return cls([urlencode(value).encode() for value in values], "application/x-www-form-urlencoded")
+
+    @classmethod
+    def multipart(cls, parts: Iterable[Tuple[Dict[str, str], Dict[str, Tuple[str, bytes, str]]]]) -> "PayloadPool":
+        """One body per (fields, files) pair, as taken by async_http.encode_multipart"""
+        bodies, content_types = [], []
+        for fields, files in parts:
+            body, content_type = encode_multipart(fields, files)
+            bodies.append(body)
+            content_types.append(content_type)
+        return cls(bodies, content_types)
+
+    def __len__(self) -> int:
+        return len(self.payloads)
+
+    def __getitem__(self, index: int) -> Payload:
+        return self.payloads[index]
+
+    def next(self) -> Payload:
+        """Bodies in turn, starting over after the last one"""
+        payload = self.payloads[self.position]
+        self.position = (self.position + 1) % len(self.payloads)
+        return payload
+
+    def choice(self) -> Payload:
+        return random.choice(self.payloads)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.buffer)
@@ -0,0 +1,310 @@
+import json
+import os
+import subprocess
+import threading
+import time
+import argparse
+import urllib.request
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from load_engine import Stats
+    from rate_profile import RateProfile
+
+# Configuration
+DEFAULT_WINDOW = 10.0  # seconds each capture covers, also the length of the pprof CPU profile
+DOCKER_INTERVAL = 2.0  # seconds between docker stats samples inside a window
+TOP_STATEMENTS = 20  # pg_stat_statements entries kept per window, by execution time
+SHOWN_STATEMENTS = 3  # printed after each window
+PPROF_PROFILES = {  # file name -> path under the Go services' /debug/pprof (see PPROF_ENABLED in the README)
+    "cpu.pprof": "/debug/pprof/profile?seconds={seconds}",
+    "heap.pprof": "/debug/pprof/heap",
+    "goroutine.txt": "/debug/pprof/goroutine?debug=1"
+}
+STATEMENTS_QUERY = ("SELECT queryid, calls, total_exec_time, rows, shared_blks_hit, shared_blks_read, "
+                    "regexp_replace(query, '\\s+', ' ', 'g') FROM pg_stat_statements WHERE queryid IS NOT NULL")
+
+
+def parse_phases(spec: str, window: float, rate_profile: Optional["RateProfile"] = None) -> List[float]:
+    """Capture window start offsets in seconds: "30,90", or "segments" to center one in every rate profile segment"""
+    if spec == "segments":
+        if not rate_profile:
+            raise ValueError("--profile-at segments needs --rate or --rate-profile")
+        offsets, start = [], 0.0
+        for _, _, duration in rate_profile.segments:
+            offsets.append(start + max(0.0, (duration - window) / 2))
+            start += duration
+        return offsets
+    try:
+        return sorted(float(value) for value in spec.split(","))
+    except ValueError:
+        raise ValueError(f"Invalid --profile-at: {spec!r}")
+
+
+def parse_targets(values: List[str]) -> Dict[str, str]:
+    """NAME=URL pairs of Go services serving /debug/pprof"""
+    targets = {}
+    for value in values:
+        name, _, url = value.partition("=")
+        if not url:
+            raise ValueError(f"Invalid --pprof {value!r}, expected NAME=URL")
+        targets[name] = url.rstrip("/")
+    return targets
+
+
+class ProfileCapture:
+    """Server side profiles taken at set points of a load test, stored with the load they were taken under
+
+    Every window collects pprof CPU/heap/goroutine profiles of the Go services, docker
+    stats samples of matching containers and the pg_stat_statements difference
+    between its start and end. Captures run in a background thread; the engine
+    hands over every batch of results, so each window also records the throughput
+    and latency the server saw meanwhile. manifest.json ties the files of every
+    window to its wall clock interval and offset into the run.
+    """
+
+    def __init__(self, offsets: List[float], window: float = DEFAULT_WINDOW, directory: Optional[str] = None,
+                 pprof: Optional[Dict[str, str]] = None, containers: Optional[List[str]] = None,
+                 dsn: Optional[str] = None):
+        self.offsets = offsets
+        self.window = window
+        self.directory = directory or f"profiles_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        self.pprof = pprof or {}
+        self.containers = containers or []
+        self.dsn = dsn
+        self.lock = threading.Lock()
+        self.stop = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.current: Optional["Stats"] = None
+        self.phases: List[Dict[str, Any]] = []
+        self.started = 0.0
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        if self.dsn:
+            try:
+                psql(self.dsn, "CREATE EXTENSION IF NOT EXISTS pg_stat_statements")
+            except RuntimeError as e:
+                print(f"Warning: pg_stat_statements is not available, skipping query snapshots ({e})")
+                self.dsn = None
+        if not (self.pprof or self.containers or self.dsn):
+            print("Warning: profiling enabled without --pprof, --docker-stats or --pg-dsn; only load is recorded")
+        self.started = time.time()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        print(f"Profiling {len(self.offsets)} windows of {self.window:g} s into {self.directory}/")
+
+    def observe(self, delta: "Stats"):
+        with self.lock:
+            if self.current is not None:
+                self.current.merge(delta)
+
+    def close(self):
+        """Skip windows that have not started yet and wait for the one in progress"""
+        self.stop.set()
+        if self.thread:
+            self.thread.join()
+        self.write_manifest()
+
+    def _run(self):
+        for index, offset in enumerate(self.offsets):
+            if self.stop.wait(max(0.0, self.started + offset - time.time())):
+                return
+            self.capture(f"phase{index + 1}_{offset:g}s", offset)
+
+    def capture(self, name: str, offset: float) -> Dict[str, Any]:
+        from load_engine import Stats
+
+        directory = os.path.join(self.directory, name)
+        os.makedirs(directory, exist_ok=True)
+        phase: Dict[str, Any] = {"phase": name, "offset": offset, "files": [], "errors": []}
+        with self.lock:
+            self.current = Stats()
+        phase["start"] = time.time()
+        before = self.statements(phase)
+        workers = [threading.Thread(target=self.fetch_pprof, args=(target, url, directory, phase))
+                   for target, url in self.pprof.items()]
+        if self.containers:
+            workers.append(threading.Thread(target=self.sample_docker, args=(directory, phase)))
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        # Without pprof nothing blocks for the window, so wait it out unless the run ends first
+        self.stop.wait(max(0.0, phase["start"] + self.window - time.time()))
+        after = self.statements(phase)
+        phase["end"] = time.time()
+        with self.lock:
+            load, self.current = self.current, None
+
+        phase["window"] = f"{datetime.fromtimestamp(phase['start']).isoformat()} - " \
+                          f"{datetime.fromtimestamp(phase['end']).isoformat()}"
+        phase["load"] = load_summary(load, phase["end"] - phase["start"])
+        if before is not None and after is not None:
+            statements = statements_delta(before, after)[:TOP_STATEMENTS]
+            with open(os.path.join(directory, "pg_stat_statements.json"), "w") as f:
+                json.dump(statements, f, indent=2)
+            phase["files"].append(f"{name}/pg_stat_statements.json")
+            phase["top_statements"] = statements[:SHOWN_STATEMENTS]
+        with self.lock:
+            self.phases.append(phase)
+        self.write_manifest()
+        print_phase(phase)
+        return phase
+
+    def fetch_pprof(self, target: str, url: str, directory: str, phase: Dict[str, Any]):
+        for file_name, path in PPROF_PROFILES.items():
+            file_name = f"{target}-{file_name}"
+            try:
+                with urllib.request.urlopen(url + path.format(seconds=int(self.window)),
+                                            timeout=self.window + 30) as response:
+                    content = response.read()
+                with open(os.path.join(directory, file_name), "wb") as f:
+                    f.write(content)
+                phase["files"].append(f"{phase['phase']}/{file_name}")
+            except Exception as e:
+                phase["errors"].append(f"{target} {path}: {e}")
+
+    def sample_docker(self, directory: str, phase: Dict[str, Any]):
+        path = os.path.join(directory, "docker_stats.ndjson")
+        end = phase["start"] + self.window
+        with open(path, "w") as f:
+            while True:
+                try:
+                    result = subprocess.run(["docker", "stats", "--no-stream", "--format", "{{json .}}"],
+                                            capture_output=True, text=True, timeout=DOCKER_INTERVAL * 5)
+                except (OSError, subprocess.TimeoutExpired) as e:
+                    phase["errors"].append(f"docker stats: {e}")
+                    return
+                now = time.time()
+                for line in result.stdout.splitlines():
+                    sample = json.loads(line)
+                    if any(container in sample.get("Name", "") for container in self.containers):
+                        sample["time"] = now
+                        f.write(json.dumps(sample) + "\n")
+                if now + DOCKER_INTERVAL > end or self.stop.wait(DOCKER_INTERVAL):
+                    break
+        phase["files"].append(f"{phase['phase']}/docker_stats.ndjson")
+
+    def statements(self, phase: Dict[str, Any]) -> Optional[Dict[str, List[Any]]]:
+        if not self.dsn:
+            return None
+        try:
+            return statements_snapshot(self.dsn)
+        except RuntimeError as e:
+            phase["errors"].append(f"pg_stat_statements: {e}")
+            return None
+
+    def write_manifest(self):
+        with self.lock:
+            manifest = {"started": self.started, "window": self.window, "phases": self.phases}
+        with open(os.path.join(self.directory, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+
+def psql(dsn: str, sql: str) -> str:
+    try:
+        result = subprocess.run(["psql", dsn, "-v", "ON_ERROR_STOP=1", "-q", "-At", "-F", "\t", "-c", sql],
+                                capture_output=True, text=True)
+    except OSError as e:
+        raise RuntimeError(f"cannot run psql: {e}")
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip())
+    return result.stdout
+
+
+def statements_snapshot(dsn: str) -> Dict[str, List[Any]]:
+    """queryid -> [calls, total ms, rows, shared blocks hit, shared blocks read, query]"""
+    snapshot = {}
+    for line in psql(dsn, STATEMENTS_QUERY).splitlines():
+        queryid, calls, total_time, rows, hit, read, query = line.split("\t", 6)
+        snapshot[queryid] = [int(calls), float(total_time), int(rows), int(hit), int(read), query]
+    return snapshot
+
+
+def statements_delta(before: Dict[str, List[Any]], after: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """Statements executed between two snapshots, slowest first"""
+    delta = []
+    for queryid, (calls, total_time, rows, hit, read, query) in after.items():
+        previous = before.get(queryid, [0, 0.0, 0, 0, 0, query])
+        if calls > previous[0]:
+            delta.append({
+                "query": query,
+                "calls": calls - previous[0],
+                "total_ms": total_time - previous[1],
+                "mean_ms": (total_time - previous[1]) / (calls - previous[0]),
+                "rows": rows - previous[2],
+                "shared_blks_hit": hit - previous[3],
+                "shared_blks_read": read - previous[4]
+            })
+    return sorted(delta, key=lambda statement: statement["total_ms"], reverse=True)
+
+
+def load_summary(stats: "Stats", seconds: float) -> Dict[str, Any]:
+    """Throughput and latency of every request type while a window was open"""
+    return {
+        name: {
+            "requests": r.total,
+            "failed": r.failed,
+            "rps": r.total / seconds if seconds else 0,
+            "p50": r.latency.percentile(50),
+            "p99": r.latency.percentile(99)
+        }
+        for name, r in stats.requests.items()
+    }
+
+
+def print_phase(phase: Dict[str, Any]):
+    print(f"\nProfile {phase['phase']} ({phase['window']}): {len(phase['files'])} files")
+    for name, load in phase["load"].items():
+        print(f"  {name}: {load['rps']:.1f} req/s, p50 {load['p50']:.2f} ms, p99 {load['p99']:.2f} ms, "
+              f"{load['failed']} failed")
+    for statement in phase.get("top_statements", []):
+        print(f"  pg: {statement['total_ms']:.1f} ms in {statement['calls']} calls "
+              f"({statement['mean_ms']:.2f} ms each): {statement['query'][:120]}")
+    for error in phase["errors"]:
+        print(f"  Warning: {error}")
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--profile-at', default=None, metavar='SECONDS,...|segments',
+                      help='Capture server profiles at these offsets into the run, or in the middle of every '
+                           'rate profile segment')
+    parser.add_argument('--profile-window', type=float, default=DEFAULT_WINDOW,
+                      help=f'Seconds each capture covers (default: {DEFAULT_WINDOW:g})')
+    parser.add_argument('--profile-dir', default=None, help='Where captures go (default: profiles_<timestamp>)')
+    parser.add_argument('--pprof', action='append', default=[], metavar='NAME=URL',
+                      help='Go service with PPROF_ENABLED=true, e.g. judge=http://localhost:80 (repeatable)')
+    parser.add_argument('--docker-stats', action='append', default=[], metavar='NAME',
+                      help='Sample docker stats of containers whose name contains NAME, e.g. code-runner (repeatable)')
+    parser.add_argument('--pg-dsn', default=None,
+                      help='PostgreSQL connection string for psql to snapshot pg_stat_statements')
+
+
+def from_args(args: argparse.Namespace, rate_profile: Optional["RateProfile"] = None) -> Optional[ProfileCapture]:
+    """ProfileCapture configured by add_arguments' options, None without --profile-at"""
+    if not args.profile_at:
+        return None
+    return ProfileCapture(parse_phases(args.profile_at, args.profile_window, rate_profile), args.profile_window,
+                          args.profile_dir, parse_targets(args.pprof), args.docker_stats, args.pg_dsn)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Capture profiling windows now (or --profile-at seconds from now), e.g. while reproducing '
+                    'a latency cliff by hand')
+    add_arguments(parser)
+    args = parser.parse_args()
+    args.profile_at = args.profile_at or "0"
+    try:
+        capture = from_args(args)
+    except ValueError as e:
+        parser.error(str(e))
+    capture.start()
+    capture.thread.join()
+    capture.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import math
+from typing import Iterator, List, Tuple
+
+# A profile is a list of (start_rate, end_rate, duration) segments; the rate
+# changes linearly inside a segment. Rates are iterations per second.
+Segment = Tuple[float, float, float]
+
+PROFILE_HELP = """Rate profile, either piecewise segments or a named shape:
+  RATE@SECONDS             hold RATE for SECONDS        e.g. 200@60
+  FROM->TO@SECONDS         linear ramp from FROM to TO  e.g. 0->500@30
+  segments joined by commas run one after another       e.g. 0->500@30,500@120
+  ramp:FROM:TO:SECONDS[:HOLD]
+  step:RATE1/RATE2/...:SECONDS_PER_STEP
+  spike:BASE:PEAK:AT:WIDTH:TOTAL   (contest start: BASE load, PEAK for WIDTH seconds at AT)"""
+
+
+class RateProfile:
+    """Arrival timeline for open-loop load generation"""
+
+    def __init__(self, segments: List[Segment]):
+        if not segments:
+            raise ValueError("A rate profile needs at least one segment")
+        for start_rate, end_rate, duration in segments:
+            if start_rate < 0 or end_rate < 0 or duration <= 0:
+                raise ValueError(f"Invalid rate profile segment: {start_rate}->{end_rate}@{duration}")
+        self.segments = segments
+
+    @classmethod
+    def constant(cls, rate: float, duration: float) -> "RateProfile":
+        return cls([(rate, rate, duration)])
+
+    @classmethod
+    def parse(cls, spec: str) -> "RateProfile":
+        """Build a profile from the syntax described in PROFILE_HELP"""
+        spec = spec.strip()
+        shape, _, args = spec.partition(":")
+        try:
+            if shape == "ramp":
+                values = [float(v) for v in args.split(":")]
+                segments = [(values[0], values[1], values[2])]
+                if len(values) > 3:
+                    segments.append((values[1], values[1], values[3]))
+                return cls(segments)
+            if shape == "step":
+                rates, seconds = args.split(":")
+                return cls([(float(r), float(r), float(seconds)) for r in rates.split("/")])
+            if shape == "spike":
+                base, peak, at, width, total = (float(v) for v in args.split(":"))
+                segments = [(base, base, at), (peak, peak, width)]
+                if total > at + width:
+                    segments.append((base, base, total - at - width))
+                return cls(segments)
+
+            segments = []
+            for part in spec.split(","):
+                rates, duration = part.split("@")
+                start_rate, _, end_rate = rates.partition("->")
+                segments.append((float(start_rate), float(end_rate or start_rate), float(duration)))
+            return cls(segments)
+        except (ValueError, IndexError):
+            raise ValueError(f"Invalid rate profile: {spec!r}")
+
+    @property
+    def duration(self) -> float:
+        return sum(duration for _, _, duration in self.segments)
+
+    @property
+    def total_arrivals(self) -> int:
+        return int(sum((start + end) * duration / 2 for start, end, duration in self.segments))
+
+    @property
+    def peak_rate(self) -> float:
+        return max(max(start, end) for start, end, _ in self.segments)
+
+    def scaled(self, factor: float) -> "RateProfile":
+        """Same shape with every rate multiplied by factor (used to split load between processes)"""
+        return RateProfile([(start * factor, end * factor, duration) for start, end, duration in self.segments])
+
+    def rate_at(self, offset: float) -> float:
+        for start_rate, end_rate, duration in self.segments:
+            if offset <= duration:
+                return start_rate + (end_rate - start_rate) * offset / duration
+            offset -= duration
+        return 0.0
+
+    def arrivals(self) -> Iterator[float]:
+        """Intended start offsets in seconds, evenly spaced according to the rate"""
+        segment_start = 0.0
+        count_before = 0.0  # expected arrivals before the current segment
+        arrival = 1
+        for start_rate, end_rate, duration in self.segments:
+            # Arrivals inside a segment: count(t) = start_rate * t + slope * t^2 / 2
+            slope = (end_rate - start_rate) / duration
+            segment_count = (start_rate + end_rate) * duration / 2
+            while arrival - count_before <= segment_count + 1e-9:
+                target = arrival - count_before
+                if slope == 0:
+                    offset = target / start_rate
+                else:
+                    discriminant = max(start_rate * start_rate + 2 * slope * target, 0.0)
+                    offset = (math.sqrt(discriminant) - start_rate) / slope
+                yield segment_start + min(max(offset, 0.0), duration)
+                arrival += 1
+            segment_start += duration
+            count_before += segment_count
+
+    def describe(self) -> str:
+        parts = []
+        for start_rate, end_rate, duration in self.segments:
+            rate = f"{start_rate:g}" if start_rate == end_rate else f"{start_rate:g}->{end_rate:g}"
+            parts.append(f"{rate}/s for {duration:g}s")
+        return ", ".join(parts)
@@ -0,0 +1,145 @@
+import json
+import os
+import time
+import argparse
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, BinaryIO, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from load_engine import Stats
+
+# Configuration
+MAX_BUFFER_BYTES = 1 << 20  # write out buffered records once they reach this size
+FLUSH_INTERVAL = 1.0  # seconds between writes of buffered records
+FSYNC_INTERVAL = 5.0  # seconds between fsyncs; at most this much of a run is lost on a crash
+FORMAT_VERSION = 1
+
+
+class ResultsLog:
+    """Append-only NDJSON record file of a load test, written while the test runs
+
+    Records are a "start" header, one "stats" record per batch of results drained
+    from the engine (histograms, not individual requests, so the file grows with
+    run length but not with request rate) and an "end" record on a clean finish.
+    """
+
+    def __init__(self, path: str, max_buffer_bytes: int = MAX_BUFFER_BYTES,
+                 flush_interval: float = FLUSH_INTERVAL, fsync_interval: float = FSYNC_INTERVAL):
+        self.path = path
+        self.max_buffer_bytes = max_buffer_bytes
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.file: Optional[BinaryIO] = None
+        self.buffer: List[bytes] = []
+        self.buffered = 0
+        self.last_flush = self.last_fsync = 0.0
+        self.records = 0
+
+    def start(self, header: Dict[str, Any]):
+        self.file = open(self.path, "ab")
+        self.last_flush = self.last_fsync = time.monotonic()
+        self._append({"record": "start", "version": FORMAT_VERSION, "time": time.time(), **header})
+        self.flush(sync=True)
+
+    def observe(self, delta: "Stats"):
+        if delta.requests or delta.series or delta.schedule_lag.total_count:
+            self._append({"record": "stats", "time": time.time(), "stats": delta.to_dict()})
+        now = time.monotonic()
+        if self.buffered >= self.max_buffer_bytes or now - self.last_flush >= self.flush_interval:
+            self.flush(sync=now - self.last_fsync >= self.fsync_interval)
+
+    def _append(self, record: Dict[str, Any]):
+        line = json.dumps(record, separators=(",", ":")).encode() + b"\n"
+        self.buffer.append(line)
+        self.buffered += len(line)
+        self.records += 1
+
+    def flush(self, sync: bool = False):
+        if self.file is None:
+            return
+        if self.buffer:
+            self.file.write(b"".join(self.buffer))
+            self.buffer.clear()
+            self.buffered = 0
+            self.file.flush()
+        self.last_flush = time.monotonic()
+        if sync:
+            os.fsync(self.file.fileno())
+            self.last_fsync = self.last_flush
+
+    def close(self, total_time: Optional[float] = None):
+        """Write out everything; total_time is given only when the run finished normally"""
+        if self.file is None:
+            return
+        if total_time is not None:
+            self._append({"record": "end", "time": time.time(), "total_time": total_time})
+        self.flush(sync=True)
+        self.file.close()
+        self.file = None
+
+
+def replay(path: str) -> Tuple[Dict[str, Any], "Stats", bool]:
+    """Rebuild the Stats of a (possibly unfinished) run from its record file
+
+    Returns the start header, the merged stats and whether the run finished.
+    A torn last line, as left by a crash, is ignored.
+    """
+    from load_engine import Stats  # load_engine imports this module
+
+    header: Dict[str, Any] = {}
+    stats = Stats()
+    finished = False
+    first_time = last_time = None
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            kind = record.get("record")
+            if kind == "start":
+                header = record
+                first_time = record["time"]
+            elif kind == "stats":
+                stats.merge(Stats.from_dict(record["stats"]))
+                last_time = record["time"]
+            elif kind == "end":
+                stats.total_time = record["total_time"]
+                finished = True
+    if not finished and first_time is not None and last_time is not None:
+        stats.total_time = last_time - first_time
+    return header, stats, finished
+
+
+def main():
+    import load_engine
+
+    parser = argparse.ArgumentParser(description='Summarize a load test record file, including unfinished runs')
+    parser.add_argument('path', help='File written with --results-log')
+    parser.add_argument('--json', default=None, help='Also write the summary as a results JSON file')
+
+    args = parser.parse_args()
+    header, stats, finished = replay(args.path)
+    if header:
+        started = datetime.fromtimestamp(header["time"]).isoformat(timespec="seconds")
+        print(f"Scenario {header.get('scenario')} started {started}: {header.get('vus')} virtual users, "
+              f"{header.get('processes')} processes against {header.get('base_url')}")
+    state = "finished" if finished else "did not finish (partial results)"
+    print(f"Run {state}, {stats.total_time:.1f} seconds and {stats.total_requests} requests recorded")
+    load_engine.print_report(stats)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                "timestamp": datetime.now().isoformat(),
+                "source": args.path,
+                "finished": finished,
+                "total_time": stats.total_time,
+                "requests": load_engine.report(stats),
+                "transport": load_engine.transport_report(stats)
+            }, f, indent=2)
+        print(f"\nSummary saved to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+import asyncio
+import json
+import os
+import random
+import re
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from async_http import Response, encode_multipart
+from load_engine import Scenario, VirtualUser
+from session_cache import Session, SessionCache, is_logged_out
+
+try:
+    import yaml
+except ImportError:  # JSON scenarios still work without PyYAML
+    yaml = None
+
+_TEMPLATE = re.compile(r"\{([A-Za-z_][\w.:-]*)\}")
+_METHODS = {"GET", "POST", "PUT", "DELETE", "HEAD"}
+
+
+class ScenarioError(ValueError):
+    """Raised for an invalid scenario definition"""
+
+
+class StepError(Exception):
+    """Raised when a step can not be built, e.g. a variable was never extracted"""
+
+
+def _lookup(variables: Dict[str, Any], name: str) -> Any:
+    value: Any = variables
+    for part in name.split("."):
+        if isinstance(value, dict) and part in value:
+            value = value[part]
+        else:
+            raise StepError(f"Unknown variable {name!r}")
+    return value
+
+
+def render(template: str, variables: Dict[str, Any]) -> str:
+    """Substitute {name}, {a.b}, {random:LOW:HIGH} and {choice:list_name} placeholders"""
+    def substitute(match: re.Match) -> str:
+        expression = match.group(1)
+        function, _, argument = expression.partition(":")
+        if function == "random":
+            low, high = argument.split(":")
+            return str(random.randint(int(low), int(high)))
+        if function == "choice":
+            values = _lookup(variables, argument)
+            if not values:
+                raise StepError(f"No values extracted for {argument!r}")
+            return str(random.choice(values))
+        return str(_lookup(variables, expression))
+    return _TEMPLATE.sub(substitute, template)
+
+
+def _parse_think(value: Any) -> Tuple[float, float]:
+    if value is None:
+        return 0.0, 0.0
+    if isinstance(value, (int, float)):
+        return float(value), float(value)
+    low, _, high = str(value).partition("-")
+    return float(low), float(high or low)
+
+
+class Extractor:
+    """Pull values out of a response body (or header) with a regular expression"""
+
+    def __init__(self, name: str, spec: Dict[str, Any]):
+        self.name = name
+        self.pattern = re.compile(spec["regex"])
+        self.all = spec.get("all", False)
+        self.header = spec.get("header")
+        self.group = spec.get("group", 1)
+        self.keep = spec.get("keep", False)  # carried into the next iterations of the virtual user
+
+    def apply(self, response: Response, variables: Dict[str, Any]):
+        source = response.header(self.header, "") if self.header else response.text
+        if self.all:
+            variables[self.name] = [m.group(self.group) for m in self.pattern.finditer(source)]
+            return
+        match = self.pattern.search(source)
+        if match:
+            variables[self.name] = match.group(self.group)
+        else:
+            variables.pop(self.name, None)
+
+
+class Step:
+    """One request of a journey"""
+
+    def __init__(self, spec: Dict[str, Any], base_dir: str):
+        request = spec.get("request") or {}
+        self.method = request.get("method", "GET").upper()
+        if self.method not in _METHODS:
+            raise ScenarioError(f"Unsupported method {self.method}")
+        if "path" not in request:
+            raise ScenarioError(f"Step {spec.get('name')!r} has no request path")
+        self.path = request["path"]
+        self.name = spec.get("name") or f"{self.method} {self.path}"
+        self.headers = request.get("headers", {})
+        self.form = request.get("form")
+        self.json = request.get("json")
+        self.files = {}
+        for field, file_spec in (request.get("multipart") or {}).items():
+            if isinstance(file_spec, dict) and ("content" in file_spec or "file" in file_spec):
+                if "file" in file_spec:
+                    with open(os.path.join(base_dir, file_spec["file"]), "rb") as f:
+                        content = f.read()
+                else:
+                    content = file_spec["content"].encode()
+                self.files[field] = (
+                    file_spec.get("filename", os.path.basename(file_spec.get("file", field))),
+                    content,
+                    file_spec.get("content_type", "application/octet-stream")
+                )
+            else:
+                self.form = dict(self.form or {}, **{field: file_spec})
+
+        expect = spec.get("expect") or {}
+        status = expect.get("status", [200])
+        self.expect_status = status if isinstance(status, list) else [status]
+        self.expect_location = expect.get("location")
+        self.expect_contains = expect.get("contains")
+        self.extractors = [Extractor(name, e) for name, e in (spec.get("extract") or {}).items()]
+        self.think = _parse_think(spec.get("think"))
+        self.abort_on_failure = spec.get("on_failure", "abort") == "abort"
+
+    def build(self, variables: Dict[str, Any]) -> Dict[str, Any]:
+        """Keyword arguments for HttpClient.request"""
+        kwargs: Dict[str, Any] = {"headers": {k: render(str(v), variables) for k, v in self.headers.items()}}
+        form = {k: render(str(v), variables) for k, v in (self.form or {}).items()}
+        if self.files:
+            kwargs["body"], kwargs["content_type"] = encode_multipart(form, self.files)
+        elif self.form is not None:
+            kwargs["data"] = form
+        elif self.json is not None:
+            kwargs["json"] = json.loads(render(json.dumps(self.json), variables))
+        return kwargs
+
+    def check(self, response: Response) -> Optional[str]:
+        """Return why the response does not meet the expectations, or None"""
+        if response.status_code not in self.expect_status:
+            return f"unexpected status {response.status_code}"
+        if self.expect_location and not (response.header("Location") or "").startswith(self.expect_location):
+            return f"unexpected redirect to {response.header('Location')}"
+        if self.expect_contains and self.expect_contains not in response.text:
+            return f"response does not contain {self.expect_contains!r}"
+        return None
+
+
+class Journey:
+    """A weighted sequence of steps performed by one virtual user"""
+
+    def __init__(self, spec: Dict[str, Any], base_dir: str):
+        self.name = spec.get("name", "journey")
+        self.weight = float(spec.get("weight", 1))
+        self.steps = [Step(step, base_dir) for step in spec.get("steps") or []]
+        if not self.steps:
+            raise ScenarioError(f"Journey {self.name!r} has no steps")
+
+
+class ScenarioDefinition:
+    """A declarative traffic mix loaded from a YAML or JSON file"""
+
+    def __init__(self, spec: Dict[str, Any], base_dir: str = "."):
+        self.name = spec.get("name", "scenario")
+        self.base_url = spec.get("base_url")
+        self.variables = spec.get("vars") or {}
+        self.data_files = spec.get("data") or {}
+        self.base_dir = base_dir
+        self.login = Step(spec["login"], base_dir) if spec.get("login") else None
+        self.journeys = [Journey(journey, base_dir) for journey in spec.get("journeys") or []]
+        if not self.journeys:
+            raise ScenarioError("A scenario needs at least one journey")
+        self.weights = [journey.weight for journey in self.journeys]
+        self.kept: Dict[int, Dict[str, Any]] = {}  # virtual user id -> values of keep extractors
+
+    @classmethod
+    def load(cls, path: str) -> "ScenarioDefinition":
+        with open(path, "r") as f:
+            if path.endswith((".yaml", ".yml")):
+                if yaml is None:
+                    raise ScenarioError("PyYAML is required for YAML scenarios; install it or use JSON")
+                spec = yaml.safe_load(f)
+            else:
+                spec = json.load(f)
+        return cls(spec, os.path.dirname(os.path.abspath(path)))
+
+    def load_data(self) -> Dict[str, Any]:
+        """Read the data files (e.g. users) the scenario refers to"""
+        data = {}
+        for name, path in self.data_files.items():
+            with open(os.path.join(self.base_dir, path), "r") as f:
+                data[name] = json.load(f)
+        return data
+
+    def scenario(self) -> Scenario:
+        return Scenario(self.name, self.iteration)
+
+    async def _login(self, vu: VirtualUser, user: Dict[str, Any]) -> Optional[Session]:
+        variables = dict(self.variables, user=user)
+        start_time = vu.clock()
+        try:
+            response = await vu.client.request(self.login.method, render(self.login.path, variables),
+                                               **self.login.build(variables))
+        except Exception as e:
+            vu.record(self.login.name, {
+                "success": False, "response_time": (time.perf_counter() - start_time) * 1000, "error": str(e)
+            })
+            return None
+        error = self.login.check(response)
+        vu.record(self.login.name, {
+            "success": error is None,
+            "response_time": (time.perf_counter() - start_time) * 1000,
+            "status_code": response.status_code
+        })
+        return Session(cookies=response.cookies) if error is None else None
+
+    async def iteration(self, vu: VirtualUser):
+        journey = random.choices(self.journeys, self.weights)[0]
+        users = vu.data.get("users") or [{}]
+        user = users[vu.id % len(users)]  # a virtual user keeps acting as the same account
+        kept = self.kept.setdefault(vu.id, {})
+        variables = dict(self.variables, **kept, user=user, vu=vu.id, iteration=vu.iteration, **vu.data)
+
+        sessions = SessionCache.of(vu, self._login) if self.login else None
+        session = await sessions.get(vu, user) if sessions else Session()
+        if session is None:
+            return
+
+        for step in journey.steps:
+            ok, session = await self._run_step(vu, step, variables, session, user, sessions)
+            if not ok and step.abort_on_failure:
+                return
+            if step.think[1]:
+                await asyncio.sleep(random.uniform(*step.think))
+
+    async def _run_step(self, vu: VirtualUser, step: Step, variables: Dict[str, Any], session: Session,
+                        user: Dict[str, Any], sessions: Optional[SessionCache]) -> Tuple[bool, Session]:
+        try:
+            path = render(step.path, variables)
+            kwargs = step.build(variables)
+        except StepError as e:
+            vu.record(step.name, {"success": False, "response_time": 0, "error": str(e)})
+            return False, session
+
+        for attempt in range(2):
+            headers = dict(session.headers(), **kwargs["headers"])
+            start_time = vu.clock()
+            try:
+                response = await vu.client.request(step.method, path, **dict(kwargs, headers=headers))
+            except Exception as e:
+                vu.record(step.name, {
+                    "success": False, "response_time": (time.perf_counter() - start_time) * 1000, "error": str(e)
+                })
+                return False, session
+            response_time = (time.perf_counter() - start_time) * 1000
+
+            if sessions and not attempt and is_logged_out(response) and step.check(response):
+                # Session was dropped by the judge: log in again and retry once
+                sessions.invalidate(user, session)
+                new_session = await sessions.get(vu, user)
+                if new_session:
+                    session = new_session
+                    continue
+            break
+
+        session.cookies.update(response.cookies)
+        error = step.check(response)
+        result = {"success": error is None, "response_time": response_time, "status_code": response.status_code}
+        if error:
+            result["error"] = error
+        vu.record(step.name, result)
+        for extractor in step.extractors:
+            extractor.apply(response, variables)
+            if extractor.keep:
+                # Without a match the next iteration starts from the scenario's vars again
+                kept = self.kept.setdefault(vu.id, {})
+                if extractor.name in variables:
+                    kept[extractor.name] = variables[extractor.name]
+                else:
+                    kept.pop(extractor.name, None)
+        return error is None, session
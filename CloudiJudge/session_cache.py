@@ -0,0 +1,89 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from async_http import Response
+from load_engine import VirtualUser
+
+# Configuration
+SESSION_TTL = 3600  # seconds a cached session is trusted before logging in again
+
+
+class Session:
+    """Credentials of a logged-in user: a bearer token and/or session cookies"""
+
+    def __init__(self, token: Optional[str] = None, cookies: Optional[Dict[str, str]] = None, ttl: float = SESSION_TTL):
+        self.token = token
+        self.cookies = cookies or {}
+        self.expires_at = time.monotonic() + ttl
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def headers(self) -> Dict[str, str]:
+        """Request headers that authenticate as this session"""
+        headers = {}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        if self.cookies:
+            headers["Cookie"] = "; ".join(f"{name}={value}" for name, value in self.cookies.items())
+        return headers
+
+
+LoginFunction = Callable[[VirtualUser, Dict[str, str]], Awaitable[Optional[Session]]]
+
+
+def is_logged_out(response: Response) -> bool:
+    """True when the judge rejected a request because the session is missing or expired"""
+    if response.status_code == 401:
+        return True
+    location = response.header("Location") or ""
+    return 300 <= response.status_code < 400 and location.split("?")[0].endswith("/login")
+
+
+class SessionCache:
+    """Logged-in sessions keyed by user email, shared by all virtual users of a process
+
+    login is called at most once at a time per user; it is expected to record its
+    own timing (as a separate "login" request type) so that login cost does not
+    leak into the latency of the requests that use the session.
+    """
+
+    def __init__(self, login: LoginFunction):
+        self.login = login
+        self.sessions: Dict[str, Session] = {}
+        self.locks: Dict[str, asyncio.Lock] = {}
+
+    @classmethod
+    def of(cls, vu: VirtualUser, login: LoginFunction) -> "SessionCache":
+        """The cache shared by every virtual user of the current run in this process"""
+        cache = vu.shared.get("sessions")
+        if cache is None:
+            cache = vu.shared["sessions"] = cls(login)
+        return cache
+
+    async def get(self, vu: VirtualUser, user: Dict[str, str]) -> Optional[Session]:
+        key = user["email"]
+        session = self.sessions.get(key)
+        if session and not session.expired:
+            return session
+
+        lock = self.locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            # Another virtual user may have logged in while we waited
+            session = self.sessions.get(key)
+            if session and not session.expired:
+                return session
+            session = await self.login(vu, user)
+            if session:
+                self.sessions[key] = session
+            else:
+                self.sessions.pop(key, None)
+            return session
+
+    def invalidate(self, user: Dict[str, str], session: Optional[Session] = None):
+        """Forget a session the server no longer accepts"""
+        key = user["email"]
+        if session is None or self.sessions.get(key) is session:
+            self.sessions.pop(key, None)
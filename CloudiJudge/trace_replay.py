@@ -0,0 +1,408 @@
+import asyncio
+import csv
+import gzip
+import json
+import re
+import time
+import argparse
+from datetime import datetime
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple
+
+import load_engine
+from async_http import HttpClient
+from generate_fixtures import DEFAULT_PASSWORD, FIXTURE_ID_BASE, fixture_email
+from live_metrics import DEFAULT_INTERVAL, LiveMetrics
+from load_engine import MAX_CONNECTIONS, STREAM_INTERVAL, Stats, VirtualUser
+from load_test_verdict import login_user, scenario_data
+from results_log import ResultsLog
+from session_cache import SessionCache, is_logged_out
+
+# Configuration
+BASE_URL = "http://localhost:80"
+USERS_FILE = "test_users.json"
+MAX_IN_FLIGHT = 1000  # replayed requests waiting for a response at once; later ones start late
+DAY = 24 * 3600
+
+# Fiber's logger middleware with its default format:
+# "15:04:05 | 200 |  1.234ms |  172.18.0.1 | GET     | /problemset | -"
+FIBER_LINE = re.compile(
+    r"^\s*(?P<time>[^|]+?)\s*\|\s*(?P<status>\d{3})\s*\|[^|]*\|\s*(?P<source>[^|]+?)\s*\|\s*(?P<method>[A-Z]+)\s*"
+    r"\|\s*(?P<path>\S+)")
+
+# Judge routes the replay knows: method, path pattern, request name and the path it sends.
+# {problem} and {user} are remapped ids, {query} is the original query string.
+ROUTES = [
+    ("GET", re.compile(r"^/problemset/?$"), "problemset", "/problemset{query}"),
+    ("GET", re.compile(r"^/problemset/(?P<problem>\d+)/?$"), "show_problem", "/problemset/{problem}"),
+    ("POST", re.compile(r"^/problemset/(?P<problem>\d+)/?$"), "submit", "/problemset/{problem}"),
+    ("GET", re.compile(r"^/problemset/(?P<problem>\d+)/dl/(?P<file>[\w.]+)$"), "problem_download",
+     "/problemset/{problem}/dl/{file}"),
+    ("GET", re.compile(r"^/user/submissions/?$"), "my_submissions", "/user/submissions{query}"),
+    ("GET", re.compile(r"^/user/(?P<user>\d+)/submissions/?$"), "user_submissions", "/user/{user}/submissions{query}"),
+    ("GET", re.compile(r"^/user/?$"), "profile", "/user"),
+    ("GET", re.compile(r"^/user/(?P<user>\d+)/?$"), "profile", "/user/{user}"),
+    ("POST", re.compile(r"^/login/?$"), "login", "/login"),
+    ("GET", re.compile(r"^/(login|signup)?$"), "page", "{path}"),
+    ("GET", re.compile(r"^/static/"), "static", "{path}")
+]
+# Anything else (logout, signup, problem edits, publishing, role changes, callbacks) would change the
+# state the rest of the trace depends on, or needs a body the log does not have, so it is skipped.
+
+
+class TraceEntry:
+    """One request of an access log"""
+
+    __slots__ = ("time", "method", "path", "source", "status")
+
+    def __init__(self, time: float, method: str, path: str, source: str, status: Optional[int] = None):
+        self.time = time
+        self.method = method
+        self.path = path
+        self.source = source  # client address or user; every source replays as one test account
+        self.status = status
+
+
+def open_log(path: str) -> TextIO:
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", errors="replace")
+    return open(path, "r", errors="replace")
+
+
+def parse_time(value: str) -> float:
+    """Unix seconds, ISO 8601, or Fiber's default HH:MM:SS (seconds into the day)"""
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    if len(value) <= 8 and value.count(":") == 2:
+        hours, minutes, seconds = value.split(":")
+        return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+def read_fiber_log(lines: Iterator[str]) -> Iterator[TraceEntry]:
+    """Entries of a Fiber logger file, one line at a time
+
+    Fiber's default time format has neither a date nor sub-second digits: a time
+    earlier than the one before starts the next day, and the entries that share
+    a second are spread evenly across it.
+    """
+    day = 0.0
+    previous = None
+    second: List[TraceEntry] = []
+    for line in lines:
+        match = FIBER_LINE.match(line)
+        if not match:
+            continue
+        try:
+            timestamp = parse_time(match.group("time"))
+        except ValueError:
+            continue
+        if previous is not None and timestamp + day < previous - DAY / 2:
+            day += DAY
+        timestamp += day
+        previous = timestamp
+        if second and timestamp != second[0].time:
+            yield from _spread(second)
+            second = []
+        second.append(TraceEntry(timestamp, match.group("method"), match.group("path"), match.group("source"),
+                                 int(match.group("status"))))
+    yield from _spread(second)
+
+
+def _spread(entries: List[TraceEntry]) -> List[TraceEntry]:
+    for index, entry in enumerate(entries):
+        if entry.time == int(entry.time):
+            entry.time += index / len(entries)
+    return entries
+
+
+def read_csv_log(lines: Iterator[str]) -> Iterator[TraceEntry]:
+    """Entries of a normalized CSV with time, method and path columns, and optionally user (or ip) and status"""
+    for row in csv.DictReader(lines):
+        try:
+            timestamp = parse_time(row["time"])
+        except (KeyError, ValueError):
+            continue
+        status = row.get("status")
+        yield TraceEntry(timestamp, row.get("method", "GET").upper(), row["path"],
+                         row.get("user") or row.get("ip") or "", int(status) if status else None)
+
+
+class IdMap:
+    """Maps ids of the trace onto ids of the test stack, first seen first, so hot ids stay hot"""
+
+    def __init__(self, targets: Optional[List[int]]):
+        self.targets = targets
+        self.mapping: Dict[str, int] = {}
+
+    def map(self, original: str) -> str:
+        if not self.targets:
+            return original
+        target = self.mapping.get(original)
+        if target is None:
+            target = self.mapping[original] = self.targets[len(self.mapping) % len(self.targets)]
+        return str(target)
+
+
+def parse_ids(spec: Optional[str]) -> Optional[List[int]]:
+    """"7,8,9" or a range "1000000000-1000049999" """
+    if not spec:
+        return None
+    if "-" in spec:
+        first, last = spec.split("-")
+        return list(range(int(first), int(last) + 1))
+    return [int(value) for value in spec.split(",")]
+
+
+class Replay:
+    """Sends trace entries at their original offsets (divided by speedup) as test accounts"""
+
+    def __init__(self, base_url: str, accounts: List[Dict[str, str]], problems: IdMap, users: Optional[IdMap],
+                 speedup: float, max_in_flight: int, connections: int):
+        self.accounts = accounts
+        self.problems = problems
+        self.users = users  # None scrubs user ids: /user/N pages become the acting account's own
+        self.speedup = speedup
+        self.sources = IdMap(list(range(len(accounts))))
+        self.stats = Stats()
+        self.client = HttpClient(base_url, pool_size=connections, max_connections=connections,
+                                 stats=self.stats.transport)
+        self.vu = VirtualUser(0, self.client, scenario_data(accounts),
+                              self.stats, {})
+        self.sessions = SessionCache.of(self.vu, login_user)
+        self.slots = asyncio.Semaphore(max_in_flight)
+        self.read = 0
+        self.sent = 0
+        self.skipped: Dict[str, int] = {}
+        self.trace_span = 0.0
+
+    def route(self, entry: TraceEntry) -> Optional[Tuple[str, str]]:
+        """Request name and path to send, or None for routes that are not replayed"""
+        path, _, query = entry.path.partition("?")
+        for method, pattern, name, template in ROUTES:
+            match = pattern.match(path)
+            if method != entry.method or not match:
+                continue
+            values = match.groupdict()
+            if "problem" in values:
+                values["problem"] = self.problems.map(values["problem"])
+            if "user" in values:
+                if self.users is None:
+                    return name, template.replace("/{user}", "").format(query=f"?{query}" if query else "")
+                values["user"] = self.users.map(values["user"])
+            return name, template.format(query=f"?{query}" if query else "", path=path, **values)
+        return None
+
+    async def run(self, entries: Iterator[TraceEntry]):
+        running = set()
+        first = None
+        start_time = time.perf_counter()
+        for entry in entries:
+            self.read += 1
+            route = self.route(entry)
+            if route is None:
+                key = f"{entry.method} {entry.path.split('?')[0].rstrip('0123456789/') or '/'}"
+                self.skipped[key] = self.skipped.get(key, 0) + 1
+                continue
+            if first is None:
+                first = entry.time
+            self.trace_span = entry.time - first
+            intended = start_time + self.trace_span / self.speedup
+            delay = intended - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self.slots.acquire()
+            self.stats.schedule_lag.record((time.perf_counter() - intended) * 1000)
+            task = asyncio.create_task(self.send(entry, route, intended))
+            running.add(task)
+            task.add_done_callback(running.discard)
+        if running:
+            await asyncio.wait(running)
+        await self.client.close()
+
+    async def send(self, entry: TraceEntry, route: Tuple[str, str], intended: float):
+        name, path = route
+        account = self.accounts[int(self.sources.map(entry.source))]
+        try:
+            if name == "login":
+                # A login in the trace is a fresh login of the same account, recorded by login_user
+                self.sessions.invalidate(account)
+                await self.sessions.get(self.vu, account)
+                return
+            session = await self.sessions.get(self.vu, account)
+            if not session:
+                return
+            self.sent += 1
+            try:
+                if name == "submit":
+                    upload = self.vu.data["upload"]
+                    response = await self.client.post(path, body=upload.body, content_type=upload.content_type,
+                                                      headers=session.headers())
+                else:
+                    response = await self.client.get(path, headers=session.headers())
+            except Exception as e:
+                self.vu.record(name, {
+                    "success": False,
+                    "response_time": (time.perf_counter() - intended) * 1000,
+                    "error": str(e)
+                })
+                return
+            if is_logged_out(response):
+                self.sessions.invalidate(account, session)
+            # An error the original request got too is faithful replay, not a failure
+            self.vu.record(name, {
+                "success": response.status_code < 400 or response.status_code == entry.status,
+                "response_time": (time.perf_counter() - intended) * 1000,
+                "status_code": response.status_code
+            })
+        finally:
+            self.slots.release()
+
+
+async def stream_stats(replay: Replay, collected: Stats, observers: List[Any], live: Optional[LiveMetrics]):
+    while True:
+        await asyncio.sleep(STREAM_INTERVAL)
+        delta = replay.stats.drain()
+        collected.merge(delta)
+        for observer in observers:
+            observer.observe(delta)
+        if live:
+            live.maybe_tick()
+
+
+async def run_replay(replay: Replay, entries: Iterator[TraceEntry], live: Optional[LiveMetrics],
+                     results_log: Optional[ResultsLog]) -> Stats:
+    collected = Stats()
+    observers = [observer for observer in (live, results_log) if observer]
+    streamer = asyncio.create_task(stream_stats(replay, collected, observers, live))
+    start_time = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        await replay.run(entries)
+    finally:
+        streamer.cancel()
+        rest = replay.stats.drain()
+        rest.cpu_time = time.process_time() - cpu_start
+        collected.merge(rest)
+        for observer in observers:
+            observer.observe(rest)
+        collected.total_time = time.perf_counter() - start_time
+    return collected
+
+
+def load_accounts(args: argparse.Namespace) -> List[Dict[str, str]]:
+    if args.fixture_users:
+        return [{"email": fixture_email(index), "password": args.password} for index in range(args.fixture_users)]
+    try:
+        with open(args.users_file, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        print(f"Error: {args.users_file} not found. Please run create_test_users.py first, or use --fixture-users.")
+        exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Replay an access log against a test stack, keeping its timing, bursts and hot problems',
+        epilog="Log formats: fiber (the logger middleware's default line format) or csv with the columns\n"
+               "time (unix seconds or ISO 8601), method, path and optionally user or ip, and status.\n"
+               "Every distinct client in the log replays as one test account; logs may be gzipped.",
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('log', help='Access log to replay (.gz is read compressed)')
+    parser.add_argument('--format', choices=['fiber', 'csv'], default=None,
+                      help='Log format (default: csv for .csv files, fiber otherwise)')
+    parser.add_argument('--base-url', default=BASE_URL, help=f'Test stack URL (default: {BASE_URL})')
+    parser.add_argument('--speedup', type=float, default=1.0,
+                      help='Replay this many times faster than recorded (default: 1, original timing)')
+    parser.add_argument('--limit', type=int, default=None, help='Stop after this many log lines')
+    parser.add_argument('--users-file', default=USERS_FILE,
+                      help=f'Accounts the clients of the log act as (default: {USERS_FILE})')
+    parser.add_argument('--fixture-users', type=int, default=None,
+                      help='Act as the first N generate_fixtures.py users instead, and remap /user/ID pages '
+                           'onto them')
+    parser.add_argument('--password', default=DEFAULT_PASSWORD,
+                      help=f'Password of the fixture users (default: {DEFAULT_PASSWORD})')
+    parser.add_argument('--problem-ids', default=None,
+                      help='Problem ids to remap the log onto, "1,2,3" or "FIRST-LAST" (default: keep the ids)')
+    parser.add_argument('--fixture-problems', type=int, default=None,
+                      help='Remap problems onto the first N generate_fixtures.py problems')
+    parser.add_argument('--max-in-flight', type=int, default=MAX_IN_FLIGHT,
+                      help=f'Requests awaiting a response at once (default: {MAX_IN_FLIGHT})')
+    parser.add_argument('--connections', type=int, default=None,
+                      help=f'Max open keep-alive connections (default: --max-in-flight, at most {MAX_CONNECTIONS})')
+    parser.add_argument('--live', nargs='?', type=float, const=DEFAULT_INTERVAL, default=None, metavar='SECONDS',
+                      help=f'Print throughput, latency and status codes every SECONDS (default: {DEFAULT_INTERVAL:g})')
+    parser.add_argument('--results-log', default=None,
+                      help='Append results to this record file while replaying; read it back with results_log.py')
+
+    args = parser.parse_args()
+    if args.speedup <= 0:
+        parser.error("--speedup must be positive")
+    problem_ids = parse_ids(args.problem_ids)
+    if args.fixture_problems:
+        problem_ids = list(range(FIXTURE_ID_BASE, FIXTURE_ID_BASE + args.fixture_problems))
+    user_ids = None
+    if args.fixture_users:
+        user_ids = IdMap(list(range(FIXTURE_ID_BASE, FIXTURE_ID_BASE + args.fixture_users)))
+
+    accounts = load_accounts(args)
+    replay = Replay(args.base_url, accounts, IdMap(problem_ids), user_ids, args.speedup, args.max_in_flight,
+                    args.connections or min(args.max_in_flight, MAX_CONNECTIONS))
+    log_format = args.format or ("csv" if args.log.endswith((".csv", ".csv.gz")) else "fiber")
+    live = LiveMetrics(args.live) if args.live else None
+    results_log = ResultsLog(args.results_log) if args.results_log else None
+
+    print(f"Replaying {args.log} ({log_format}) against {args.base_url} at {args.speedup:g}x "
+          f"as {len(accounts)} accounts")
+    stats = None
+    with open_log(args.log) as f:
+        lines = islice(f, args.limit) if args.limit else f
+        entries = read_csv_log(lines) if log_format == "csv" else read_fiber_log(lines)
+        if live:
+            live.start()
+        if results_log:
+            results_log.start({"scenario": "trace replay", "log": args.log, "speedup": args.speedup,
+                               "base_url": args.base_url})
+        try:
+            stats = asyncio.run(run_replay(replay, entries, live, results_log))
+        finally:
+            if live:
+                live.close()
+            if results_log:
+                results_log.close(stats and stats.total_time)
+
+    print("\nReplay Results:")
+    print(f"Log entries read: {replay.read}, replayed: {replay.sent}, skipped: {sum(replay.skipped.values())}")
+    for route, count in sorted(replay.skipped.items(), key=lambda item: -item[1])[:10]:
+        print(f"  skipped {route}: {count}")
+    print(f"Trace span: {replay.trace_span:.1f} s, replayed in {stats.total_time:.1f} s")
+    print(f"Request start lag behind the trace: {load_engine.format_percentiles(stats.schedule_lag)}")
+    if replay.problems.mapping:
+        print(f"Problems remapped: {len(replay.problems.mapping)} distinct ids")
+    load_engine.print_report(stats)
+    load_engine.print_client_cpu(stats, 1)
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    results_file = f"trace_replay_results_{timestamp}.json"
+    with open(results_file, 'w') as f:
+        json.dump({
+            "timestamp": datetime.now().isoformat(),
+            "log": args.log,
+            "speedup": args.speedup,
+            "entries_read": replay.read,
+            "replayed": replay.sent,
+            "skipped": replay.skipped,
+            "trace_span": replay.trace_span,
+            "total_time": stats.total_time,
+            "schedule_lag": stats.schedule_lag.summary(),
+            "requests": load_engine.report(stats),
+            "transport": load_engine.transport_report(stats)
+        }, f, indent=2)
+    print(f"\nDetailed results saved to {results_file}")
+
+
+if __name__ == "__main__":
+    main()